@@ -3,7 +3,7 @@ NCA Toolkit Web Server
 Flask-basierter Backend-Server für die Web-Oberfläche mit LLM-Integration
 """
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
 import requests
 import os
@@ -15,11 +15,27 @@ import logging
 from werkzeug.utils import secure_filename
 
 # Import unserer Services
-from llm_service import extract_intent_and_params
-from file_handler import handle_upload, init_upload_folder, cleanup_old_files, UPLOAD_FOLDER
+from llm_service import resolve_intent, extract_intents_batch, get_intent_stats, get_llm_deadline_stats, init_llm_client, LLM_BATCH_DEADLINE
+from intent_cache import intent_cache
+from derivation_cache import derivation_cache
+from ffmpeg_capabilities import get_capabilities, init_ffmpeg_capabilities
+from browser_pool import get_browser_pool, init_browser_pool
+from screenshots import screenshot_cache
+from youtube_service import youtube_cache_stats
+from ffmpeg_scheduler import get_scheduler
+from intent_rules import validate_repeat, is_audio_url
+from media_probe import probe_media
+from file_handler import handle_upload, lookup_upload, send_upload, upload_index, init_upload_folder, cleanup_old_files, UPLOAD_FOLDER
 from version import VERSION
 from utils import get_lan_ip
 import local_processor  # Local FFmpeg support
+import job_runner
+import upload_sessions
+from upload_sessions import UploadSessionError
+import job_events
+from nca_client import get_nca_client, NCA_API_URL, NCA_API_KEY, NCA_PROXY_READ_TIMEOUT
+from job_store import create_job_store, project_fields, SUMMARY_FIELDS, DEFAULT_PAGE_SIZE, JOB_FLUSH_INTERVAL
+from job_runner import ASYNC_PROCESSING
 
 # Logging konfigurieren
 logging.basicConfig(
@@ -32,13 +48,18 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__, static_folder='../web', static_url_path='')
 CORS(app)
 
-# Konfiguration
-NCA_API_URL = os.getenv('NCA_API_URL', 'http://localhost:8080')
-NCA_API_KEY = os.getenv('NCA_API_KEY', '343534sfklsjf343423')
-
 # Upload-Ordner initialisieren
 init_upload_folder()
 
+# LLM-Client einmalig erstellen (Modell + System-Prompt), optional mit Warm-up
+init_llm_client()
+
+# FFmpeg/ffprobe einmalig proben (Version, Encoder, Filter, Muxer)
+init_ffmpeg_capabilities()
+
+# ChromeDriver einmalig auflösen (Screenshots nutzen den Browser-Pool)
+init_browser_pool()
+
 # Build Number (increment on each significant change)
 BUILD_NUMBER = "2026.01.08.030"
 
@@ -50,9 +71,11 @@ logger.info(f"🌐 Running on Host IP: {HOST_IP}")
 # Start Time für Uptime
 START_TIME = time.time()
 
-# Job Queue für Tracking
-jobs = {}
-job_lock = __import__('threading').Lock()
+# Job Store für Tracking (JOB_STORE=memory|sqlite)
+job_store = create_job_store()
+if job_store.backend == 'sqlite':
+    # Mehrere Server-Prozesse: Fortschritt aus anderen Prozessen kommt über den Store
+    job_events.start_store_poller(job_store, lag=2 * JOB_FLUSH_INTERVAL + 1)
 
 # API Endpoint Definitionen
 API_ENDPOINTS = {
@@ -149,8 +172,8 @@ def index():
 
 @app.route('/uploads/<path:filename>')
 def serve_uploads(filename):
-    """Serve files from the upload directory"""
-    return send_from_directory(UPLOAD_FOLDER, filename)
+    """Serve files from the upload directory (Range, ETag/304, optional X-Accel-Redirect/X-Sendfile)"""
+    return send_upload(filename)
 
 
 @app.route('/api/endpoints', methods=['GET'])
@@ -190,7 +213,7 @@ def proxy_request():
             logger.info("Test-Mode: Checking available tools...")
             try:
                 # Versuch 1: Tools List
-                resp = requests.get(f"{NCA_API_URL}/v1/tools/list", timeout=5)
+                resp = get_nca_client().get('/v1/tools/list')
                 if resp.ok:
                     return jsonify({
                         'success': True, 
@@ -209,21 +232,12 @@ def proxy_request():
                 }
             })
 
-        # Request an NCA Toolkit API
-        url = f"{NCA_API_URL}{endpoint}"
-        headers = {
-            'x-api-key': NCA_API_KEY,
-            'Content-Type': 'application/json'
-        }
-        
-        logger.info(f"Calling NCA API: {url} [POST]")
+        # Request an NCA Toolkit API (Timeouts pro Endpunkt, siehe nca_client; mindestens NCA_PROXY_READ_TIMEOUT)
+        logger.info(f"Calling NCA API: {NCA_API_URL}{endpoint} [POST]")
         
-        response = requests.post(
-            url,
-            headers=headers,
-            json=params,
-            timeout=600  # 10 Minuten Timeout (war 300)
-        )
+        client = get_nca_client()
+        read_timeout = max(client.timeout_for(endpoint)[1], NCA_PROXY_READ_TIMEOUT)
+        response = client.post(endpoint, json=params, read_timeout=read_timeout)
         
         # Log Response
         logger.info(f"Response Status: {response.status_code}")
@@ -250,7 +264,7 @@ def proxy_request():
         logger.error("Request timeout")
         return jsonify({
             'success': False,
-            'error': 'Request timeout (>5 Min)'
+            'error': f'Request timeout (>{NCA_PROXY_READ_TIMEOUT / 60:g} Min)'
         }), 504
         
     except requests.exceptions.ConnectionError:
@@ -271,8 +285,7 @@ def proxy_request():
 @app.route('/api/jobs/<job_id>', methods=['GET'])
 def get_job_status(job_id):
     """Get status of a job"""
-    with job_lock:
-        job = jobs.get(job_id)
+    job = job_store.get(job_id)
     
     if not job:
         return jsonify({
@@ -286,19 +299,102 @@ def get_job_status(job_id):
     })
 
 
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def stream_job_events(job_id):
+    """Server-Sent Events: Fortschritt eines Jobs bis zum Endzustand"""
+    # Erst abonnieren, dann Snapshot lesen - so geht kein Update dazwischen verloren
+    q = job_events.subscribe(job_id)
+    snapshot = job_store.get(job_id)
+    
+    if snapshot is None:
+        job_events.unsubscribe(q, job_id)
+        return jsonify({
+            'success': False,
+            'error': 'Job not found'
+        }), 404
+    
+    return _sse_response(job_events.stream(q, job_id, initial=snapshot))
+
+
+@app.route('/api/jobs/events', methods=['GET'])
+def stream_all_job_events():
+    """Server-Sent Events: Updates aller Jobs (z.B. für das Monitoring)"""
+    q = job_events.subscribe()
+    return _sse_response(job_events.stream(q))
+
+
+def _sse_response(generator):
+    """Erstellt eine ungepufferte text/event-stream Response"""
+    return Response(generator, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # nginx: Events nicht puffern
+    })
+
+
 @app.route('/api/jobs', methods=['GET'])
 def list_jobs():
-    """List all jobs"""
-    with job_lock:
-        job_list = list(jobs.values())
+    """
+    Listet Jobs seitenweise (neueste zuerst)
+    
+    Query-Parameter:
+        status: Status-Filter, kommagetrennt (z.B. 'processing,queued')
+        endpoint: Nur Jobs für diesen Endpunkt (z.B. '/media-to-mp3')
+        since / until: created_at-Bereich (Unix-Timestamp oder ISO-8601)
+        limit: Seitengröße (Default 50, max. 500)
+        cursor: next_cursor der vorherigen Seite
+        fields: Kommagetrennte Feldliste oder 'all' (Default: Zusammenfassung ohne 'result')
+    """
+    try:
+        status = [s for s in request.args.get('status', '').split(',') if s] or None
+        since = _parse_time_arg(request.args.get('since'))
+        until = _parse_time_arg(request.args.get('until'))
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+        
+        job_list, next_cursor = job_store.list_jobs(
+            status=status,
+            endpoint=request.args.get('endpoint') or None,
+            since=since,
+            until=until,
+            cursor=request.args.get('cursor') or None,
+            limit=limit
+        )
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    fields_arg = request.args.get('fields', '')
+    if fields_arg == 'all':
+        fields = None
+    elif fields_arg:
+        fields = [f for f in fields_arg.split(',') if f]
+    else:
+        fields = SUMMARY_FIELDS
     
     return jsonify({
         'success': True,
-        'jobs': job_list,
-        'count': len(job_list)
+        'jobs': [project_fields(job, fields) for job in job_list],
+        'count': len(job_list),
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None
     })
 
 
+def _parse_time_arg(value):
+    """Parst Unix-Timestamp oder ISO-8601 zu einem Timestamp (None wenn leer)"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        raise ValueError(f"Ungültige Zeitangabe: {value}")
+
+
 @app.route('/api/process', methods=['POST'])
 def process_request():
     """
@@ -307,6 +403,8 @@ def process_request():
     Form Data:
         message: User-Nachricht (string)
         files: Hochgeladene Dateien (optional, multiple)
+        async: '1' = Job im Worker-Pool ausführen und sofort 202 zurückgeben
+               (Default über ASYNC_PROCESSING)
     
     Returns:
         {
@@ -320,37 +418,40 @@ def process_request():
             'uploaded_files': [...],
             'result': {...}
         }
+        
+        Im Async-Modus (202):
+        {
+            'success': True,
+            'job_id': '...',
+            'status': 'queued',
+            'status_url': '/api/jobs/<job_id>'
+        }
     """
     # Create job
     import uuid
     job_id = str(uuid.uuid4())
     
-    with job_lock:
-        jobs[job_id] = {
-            'id': job_id,
-            'status': 'processing',
-            'progress': 0,
-            'message': '',
-            'created_at': time.time(),
-            'updated_at': time.time()
-        }
+    job_store.create({
+        'id': job_id,
+        'status': 'processing',
+        'stage': 'uploading',
+        'progress': 0,
+        'message': '',
+        'created_at': time.time(),
+        'updated_at': time.time()
+    })
     
     try:
         # 1. Get user message
         user_message = request.form.get('message', '')
+        async_flag = request.form.get('async', request.args.get('async'))
+        run_async = ASYNC_PROCESSING if async_flag is None else async_flag.lower() in ('1', 'true', 'yes')
         
         logger.info("=" * 60)
         logger.info(f"📨 New Request: {user_message[:100]} (Job: {job_id})")
         
-        # Update progress
-        with job_lock:
-            jobs[job_id]['progress'] = 10
-            jobs[job_id]['message'] = 'Verarbeite Anfrage...'
-        
-        # 2. Handle file uploads
-        with job_lock:
-            jobs[job_id]['progress'] = 20
-            jobs[job_id]['message'] = 'Lade Dateien hoch...'
+        # 2. Handle file uploads (immer im Request-Thread - der Upload-Stream gehört zum Request)
+        update_job(job_id, progress=10, message='Lade Dateien hoch...')
         
         uploaded_files = []
         if 'files' in request.files:
@@ -364,39 +465,413 @@ def process_request():
                     logger.info(f"✅ Uploaded: {file_info['filename']} ({file_info['size_mb']}MB)")
                 except Exception as e:
                     logger.error(f"❌ Upload failed: {e}")
+                    update_job(job_id, status='failed', stage='failed', message=f'File upload failed: {str(e)}')
                     return jsonify({
                         'success': False,
+                        'job_id': job_id,
                         'error': f'File upload failed: {str(e)}'
                     }), 400
         
-        # 3. Extract intent and params with LLM
-        with job_lock:
-            jobs[job_id]['progress'] = 40
-            jobs[job_id]['message'] = 'Erkenne Intent...'
+        # Bereits vorhandene Dateien (Hash-Vorabprüfung über /api/uploads/check)
+        try:
+            uploaded_files.extend(resolve_file_refs(request.form.get('file_refs')))
+        except ValueError as e:
+            update_job(job_id, status='failed', stage='failed', message=str(e))
+            return jsonify({
+                'success': False,
+                'job_id': job_id,
+                'error': str(e)
+            }), 400
+        
+        update_job(job_id, progress=20, message='Dateien hochgeladen', uploaded_files=uploaded_files)
+        
+        # Eingaben sind bis zum Job-Ende referenziert (cleanup_old_files lässt sie liegen)
+        input_files = upload_refs(uploaded_files)
+        
+        if run_async:
+            update_job(job_id, status='queued', stage='queued', message='Warte auf freien Worker...')
+            upload_index.acquire(input_files)
+            job_runner.submit_job(
+                job_id, run_pipeline, user_message, uploaded_files,
+                on_done=lambda: upload_index.release(input_files)
+            )
+            logger.info(f"📬 Job {job_id} queued for async processing")
+            
+            return jsonify({
+                'success': True,
+                'job_id': job_id,
+                'status': 'queued',
+                'status_url': f'/api/jobs/{job_id}',
+                'uploaded_files': uploaded_files
+            }), 202
+        
+        with upload_index.hold(input_files):
+            payload = run_pipeline(job_id, user_message, uploaded_files)
+        status_code = 200 if payload.get('success') else 400
+        return jsonify(payload), status_code
+        
+    except Exception as e:
+        # run_pipeline hat bereits geloggt und den Job als failed markiert
+        update_job(job_id, status='failed', stage='failed', message=str(e))
+        
+        return jsonify({
+            'success': False,
+            'job_id': job_id,
+            'error': str(e)
+        }), 500
+
+
+def upload_refs(uploaded_files):
+    """Gespeicherte Dateinamen der Uploads eines Jobs (für upload_index.acquire/release)"""
+    return [f['stored_filename'] for f in uploaded_files if f.get('stored_filename')]
+
+
+def resolve_file_refs(raw_refs):
+    """
+    Löst das Formularfeld 'file_refs' (JSON-Liste von {sha256, filename}) in file_infos auf
+    
+    Raises:
+        ValueError: Ungültiges JSON, ungültiger Eintrag oder Datei nicht (mehr) auf dem Server
+    """
+    if not raw_refs:
+        return []
+    try:
+        refs = json.loads(raw_refs)
+    except ValueError:
+        raise ValueError('file_refs ist kein gültiges JSON')
+    if not isinstance(refs, list):
+        raise ValueError('file_refs muss eine Liste sein')
+    
+    files = []
+    for ref in refs:
+        if not isinstance(ref, dict) or not isinstance(ref.get('sha256'), str) or not isinstance(ref.get('filename'), str):
+            raise ValueError('file_refs-Einträge müssen {"sha256": ..., "filename": ...} sein')
+        # Ungültiger Hash oder Dateityp → ValueError aus lookup_upload
+        file_info = lookup_upload(ref['sha256'], ref['filename'])
+        if file_info is None:
+            raise ValueError(f"Datei nicht mehr vorhanden, bitte neu hochladen: {ref['filename']}")
+        files.append(file_info)
+    return files
+
+
+@app.route('/api/uploads/check', methods=['POST'])
+def check_upload():
+    """
+    Hash-Vorabprüfung vor dem Upload
+    
+    JSON:
+        {'sha256': '<hex>', 'filename': 'video.mp4'}
+    
+    Returns:
+        {'success': True, 'exists': True, 'file': {...file_info}} oder {'success': True, 'exists': False}
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        file_info = lookup_upload(data.get('sha256'), data.get('filename'))
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    if file_info is None:
+        return jsonify({'success': True, 'exists': False})
+    return jsonify({'success': True, 'exists': True, 'file': file_info})
+
+
+def _upload_session_error(e):
+    payload = {'success': False, 'error': str(e)}
+    if e.offset is not None:
+        payload['offset'] = e.offset
+    return jsonify(payload), e.status_code
+
+
+@app.route('/api/uploads/sessions', methods=['POST'])
+def create_upload_session():
+    """
+    Startet einen fortsetzbaren Chunk-Upload
+    
+    JSON:
+        {'filename': 'video.mp4', 'size': 419430400, 'sha256': '<hex>' (optional)}
+    
+    Returns (201):
+        {'success': True, 'upload_id': '...', 'offset': 0, 'upload_url': '...'}
+        bzw. (200) {'success': True, 'complete': True, 'file': {...}} wenn die Datei schon da ist
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        session = upload_sessions.create_session(data.get('filename'), data.get('size'), data.get('sha256'))
+    except UploadSessionError as e:
+        return _upload_session_error(e)
+    return jsonify({'success': True, **session}), 200 if session.get('file') else 201
+
+
+@app.route('/api/uploads/sessions/<upload_id>', methods=['GET', 'PUT', 'DELETE'])
+def upload_session(upload_id):
+    """
+    GET: Status (aktueller 'offset' zum Fortsetzen)
+    PUT: Byte-Bereich senden (Header 'Content-Range: bytes start-end/total', Body = Rohdaten)
+    DELETE: Session abbrechen
+    """
+    try:
+        if request.method == 'PUT':
+            session = upload_sessions.write_chunk(
+                upload_id,
+                request.headers.get('Content-Range'),
+                request.stream,
+                request.content_length
+            )
+        elif request.method == 'DELETE':
+            upload_sessions.abort_session(upload_id)
+            return jsonify({'success': True})
+        else:
+            session = upload_sessions.get_session(upload_id).to_dict()
+    except UploadSessionError as e:
+        return _upload_session_error(e)
+    return jsonify({'success': True, **session})
+
+
+@app.route('/api/uploads/sessions/<upload_id>/finalize', methods=['POST'])
+def finalize_upload_session(upload_id):
+    """
+    Schließt den Upload ab
+    
+    Returns:
+        {'success': True, 'file': {...}, 'file_ref': {'sha256', 'filename'}}
+        - 'file_ref' kann direkt in /api/process als file_refs übergeben werden
+    """
+    try:
+        result = upload_sessions.finalize_session(upload_id)
+    except UploadSessionError as e:
+        return _upload_session_error(e)
+    return jsonify({'success': True, **result})
+
+
+def _batch_item(index, item):
+    """
+    Prüft einen JSON-Batch-Eintrag und macht daraus {'message', 'uploaded_files'}
+    
+    Raises:
+        ValueError: Ungültiger Eintrag (Meldung nennt den Index)
+    """
+    if not isinstance(item, dict):
+        raise ValueError(f"items[{index}]: Eintrag muss ein Objekt sein")
+    message = item.get('message', '')
+    files = item.get('files') or []
+    file_urls = item.get('file_urls') or []
+    if not isinstance(message, str):
+        raise ValueError(f"items[{index}]: 'message' muss ein String sein")
+    if not isinstance(files, list) or not all(isinstance(f, dict) and f.get('url') and isinstance(f['url'], str) for f in files):
+        raise ValueError(f"items[{index}]: jeder Eintrag in 'files' braucht eine 'url'")
+    if not isinstance(file_urls, list) or not all(url and isinstance(url, str) for url in file_urls):
+        raise ValueError(f"items[{index}]: 'file_urls' muss eine Liste von URLs sein")
+    
+    files = list(files)
+    for url in file_urls:
+        filename = url.split('?', 1)[0].rsplit('/', 1)[-1]
+        files.append({
+            'filename': filename,
+            'url': url,
+            'type': filename.rsplit('.', 1)[1].lower() if '.' in filename else '',
+            'size': 0
+        })
+    return {'message': message, 'uploaded_files': files}
+
+
+@app.route('/api/process/batch', methods=['POST'])
+def process_batch_request():
+    """
+    Batch-Endpunkt: Viele Befehle auf einmal, Intent-Erkennung gebündelt in wenigen LLM-Calls
+    
+    JSON:
+        {
+            'items': [
+                {'message': '...', 'files': [{filename, url, type, size}], 'file_urls': ['...']}
+            ]
+        }
+    
+    Form Data:
+        message: Befehl, der auf JEDE Datei einzeln angewendet wird
+        files: Hochgeladene Dateien (je Datei ein Job)
+    
+    Returns (202):
+        {
+            'success': True,
+            'batch_id': '...',
+            'jobs': [{'job_id': '...', 'intent': {...} oder None}, ...]
+        }
+    
+    Die gebündelten LLM-Calls laufen höchstens LLM_BATCH_DEADLINE Sekunden im Request;
+    was danach noch offen ist (intent None), erkennt der Job selbst im Worker.
+    """
+    import uuid
+    batch_id = str(uuid.uuid4())
+    items = []
+    
+    try:
+        if request.is_json:
+            data = request.get_json() or {}
+            raw_items = data.get('items', []) if isinstance(data, dict) else None
+            if not isinstance(raw_items, list):
+                raise ValueError("'items' muss eine Liste sein")
+            for index, item in enumerate(raw_items):
+                items.append(_batch_item(index, item))
+        else:
+            user_message = request.form.get('message', '')
+            for file in request.files.getlist('files'):
+                items.append({'message': user_message, 'uploaded_files': [handle_upload(file)]})
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    if not items:
+        return jsonify({
+            'success': False,
+            'error': 'Keine Einträge im Batch'
+        }), 400
+    
+    logger.info(f"📦 Batch {batch_id}: {len(items)} items")
+    
+    job_ids = []
+    for item in items:
+        job_id = str(uuid.uuid4())
+        job_store.create({
+            'id': job_id,
+            'batch_id': batch_id,
+            'status': 'processing',
+            'stage': 'intent',
+            'progress': 20,
+            'message': 'Erkenne Intent (Batch)...',
+            'uploaded_files': item['uploaded_files'],
+            'created_at': time.time(),
+            'updated_at': time.time()
+        })
+        job_ids.append(job_id)
+    
+    # Einzelaufrufe für Nachzügler laufen im Job, nicht im Request-Thread
+    intents = extract_intents_batch(items, deadline=LLM_BATCH_DEADLINE, resolve_remaining=False)
+    
+    jobs_out = []
+    for job_id, item, intent in zip(job_ids, items, intents):
+        update_job(job_id, status='queued', stage='queued', message='Warte auf freien Worker...')
+        input_files = upload_refs(item['uploaded_files'])
+        upload_index.acquire(input_files)
+        job_runner.submit_job(
+            job_id, run_pipeline, item['message'], item['uploaded_files'], intent,
+            on_done=lambda input_files=input_files: upload_index.release(input_files)
+        )
+        jobs_out.append({
+            'job_id': job_id,
+            'status_url': f'/api/jobs/{job_id}',
+            'intent': {
+                'endpoint': intent.get('endpoint'),
+                'confidence': intent.get('confidence', 0.0),
+                'tier': intent.get('tier')
+            } if intent else None
+        })
+    
+    return jsonify({
+        'success': True,
+        'batch_id': batch_id,
+        'count': len(jobs_out),
+        'jobs': jobs_out
+    }), 202
+
+
+def update_job(job_id, **fields):
+    """Aktualisiert Felder eines Jobs (thread-safe) und benachrichtigt SSE-Subscriber"""
+    snapshot, status_changed = job_store.update(job_id, fields)
+    if snapshot is None:
+        return
+    
+    if status_changed:
+        job_events.publish(snapshot, 'status')
+    elif any(key in fields for key in ('progress', 'message', 'stage')):
+        job_events.publish(snapshot, 'progress')
+
+
+def _apply_job_update(job_id, fields):
+    """Callback für den Job-Runner (auch für Updates aus Worker-Prozessen)"""
+    update_job(job_id, **fields)
+
+
+job_runner.init_runner(_apply_job_update)
+
+
+def run_pipeline(job_id, user_message, uploaded_files, resolved_intent=None):
+    """
+    Verarbeitet einen Job: Intent-Erkennung, YouTube-Download, lokale/NCA-Verarbeitung
+    
+    Läuft entweder direkt im Request-Thread oder im Worker-Pool (job_runner).
+    Alle Job-Updates laufen über job_runner.report_progress, damit sie auch aus
+    Worker-Prozessen beim Server ankommen.
+    
+    Args:
+        resolved_intent: Bereits erkannter Intent (z.B. aus extract_intents_batch) - überspringt die Erkennung
+    
+    Returns:
+        Response-Payload (dict) wie von /api/process
+    """
+    report = job_runner.report_progress
+    
+    try:
+        report(job_id, status='processing', stage='intent', progress=40, message='Erkenne Intent...')
         
-        logger.info("🤖 Calling LLM for intent extraction...")
+        # 3. Extract intent and params (Regeln → Cache → LLM → Fallback)
+        logger.info("🤖 Resolving intent...")
         
-        llm_result = extract_intent_and_params(user_message, uploaded_files)
+        llm_result = resolved_intent or resolve_intent(user_message, uploaded_files)
         
         endpoint = llm_result.get('endpoint')
         params = llm_result.get('params', {})
         confidence = llm_result.get('confidence', 0.0)
         reasoning = llm_result.get('reasoning', '')
+        tier = llm_result.get('tier')
         
-        logger.info(f"🤖 Gemini API Call: {endpoint}")
+        logger.info(f"🤖 Intent ({tier}): {endpoint}")
         logger.info(f"📋 Parameters: {json.dumps(params, indent=None)}")
         logger.info(f"💭 Reasoning: {reasoning}")
         logger.info(f"🎯 Confidence: {confidence*100:.1f}%")
         
+        intent = {
+            'endpoint': endpoint,
+            'confidence': confidence,
+            'reasoning': reasoning,
+            'tier': tier
+        }
+        
         # Check if intent was found
         if not endpoint or confidence < 0.5:
             logger.warning("⚠️ Low confidence or no intent found")
-            return jsonify({
+            error = 'Konnte keine passende Aktion finden. Bitte formulieren Sie Ihre Anfrage anders.'
+            report(job_id, status='failed', stage='failed', message=error, intent=llm_result, intent_tier=tier)
+            return {
                 'success': False,
-                'error': 'Konnte keine passende Aktion finden. Bitte formulieren Sie Ihre Anfrage anders.',
+                'job_id': job_id,
+                'error': error,
                 'intent': llm_result,
                 'uploaded_files': uploaded_files
-            }), 400
+            }
+        
+        # Wiederholungen begrenzen, bevor ein Pfad (lokal, Audio, Container) sie ausschreibt
+        if 'repeat' in params:
+            try:
+                params['repeat'] = validate_repeat(params['repeat'])
+            except ValueError as e:
+                error = str(e)
+                logger.warning(f"⚠️ {error}")
+                report(job_id, status='failed', stage='failed', message=error, intent=llm_result, intent_tier=tier)
+                return {
+                    'success': False,
+                    'job_id': job_id,
+                    'error': error,
+                    'intent': llm_result,
+                    'uploaded_files': uploaded_files
+                }
+        
+        report(job_id, endpoint=endpoint, intent=intent, intent_tier=tier, params=params)
         
         # 3.5 ENDPOINT DISCOVERY: Check if we need to find alternative endpoints
         # This is especially important for audio concatenation which might not work with /combine-videos
@@ -409,11 +884,7 @@ def process_request():
                 # Try to find audio concatenation endpoint
                 try:
                     # Query available routes from container
-                    routes_response = requests.get(
-                        f"{NCA_API_URL}/",
-                        headers={'x-api-key': NCA_API_KEY},
-                        timeout=2
-                    )
+                    routes_response = get_nca_client().get('/')
                     
                     # If root doesn't work, we know from our investigation that audio mixing exists
                     # Let's use /media-to-mp3 endpoint multiple times or find concat endpoint
@@ -427,13 +898,6 @@ def process_request():
                     logger.warning(f"Endpoint discovery failed: {e}")
 
         
-        # 4. Call NCA Toolkit API (or handle locally)
-        with job_lock:
-            jobs[job_id]['progress'] = 60
-            jobs[job_id]['message'] = f'Rufe {endpoint} auf...'
-        
-        logger.info(f"🚀 Calling NCA API: {endpoint}")
-        
         # Check for YouTube URLs and download them automatically
         if params:
             from youtube_service import is_youtube_url, download_youtube_video
@@ -443,9 +907,7 @@ def process_request():
                     logger.info(f"🎬 YouTube URL detected: {value}")
                     logger.info(f"📥 Downloading video automatically...")
                     
-                    with job_lock:
-                        jobs[job_id]['progress'] = 50
-                        jobs[job_id]['message'] = 'Lade YouTube-Video herunter...'
+                    report(job_id, stage='downloading', progress=50, message='Lade YouTube-Video herunter...')
                     
                     try:
                         download_result = download_youtube_video(value)
@@ -454,31 +916,35 @@ def process_request():
                         # Replace YouTube URL with downloaded file URL
                         params[key] = download_result['url']
                         
-                        with job_lock:
-                            jobs[job_id]['progress'] = 60
-                            jobs[job_id]['message'] = f'Video heruntergeladen: {download_result["title"]}'
+                        report(job_id, progress=55, message=f'Video heruntergeladen: {download_result["title"]}')
                         
                     except Exception as e:
                         logger.error(f"❌ YouTube download failed: {e}")
                         raise ValueError(f"YouTube-Download fehlgeschlagen: {str(e)}")
         
+        # 4. Call NCA Toolkit API (or handle locally)
+        report(job_id, stage='processing', progress=60, message=f'Rufe {endpoint} auf...')
+        
+        logger.info(f"🚀 Calling NCA API: {endpoint}")
+        
         # SPECIAL CASE: Audio concatenation
         if endpoint == '/combine-videos' and params.get('media_urls'):
-            first_url = params['media_urls'][0] if params['media_urls'] else ''
-            if first_url.endswith('.mp3') or first_url.endswith('.wav') or first_url.endswith('.aac'):
+            route = concat_route(params['media_urls'])
+            if route == 'audio':
                 logger.info("🎵 Detected audio concatenation request - handling locally")
                 
                 try:
                     from local_audio_service import concatenate_audio_files
                     import uuid
                     output_filename = f"concatenated_{uuid.uuid4().hex[:8]}.mp3"
-                    result_url = concatenate_audio_files(params['media_urls'], output_filename)
+                    repeat = int(params.get('repeat') or 1)
+                    result_url = concatenate_audio_files(params['media_urls'], output_filename, repeat=repeat)
                     
                     nca_response = {
                         'success': True,
                         'output_url': result_url,
                         'message': 'Audio concatenation completed locally',
-                        'files_concatenated': len(params['media_urls'])
+                        'files_concatenated': len(params['media_urls']) * repeat
                     }
                     
                     logger.info(f"✅ Local audio concatenation successful: {result_url}")
@@ -486,57 +952,81 @@ def process_request():
                 except Exception as e:
                     logger.error(f"❌ Local audio concatenation failed: {e}")
                     raise
+            elif route == 'video':
+                # Video concatenation lokal: passende Clips kopieren, abweichende parallel normalisieren
+                logger.info("🚀 LOCAL OVERRIDE: Using local FFmpeg for video concatenation")
+                nca_response = local_processor.local_video_concat(
+                    params['media_urls'], repeat=params.get('repeat') or 1
+                )
             else:
-                # Regular video concatenation - send to container
-                nca_response = call_nca_api(endpoint, params)
+                # Regular video concatenation - send to container (kennt kein 'repeat')
+                nca_response = call_nca_api(endpoint, expand_repeat(params))
         else:
             # All other endpoints - send to container
             nca_response = call_nca_api(endpoint, params)
         
-        with job_lock:
-            jobs[job_id]['progress'] = 90
-            jobs[job_id]['message'] = 'Verarbeite Ergebnis...'
+        report(job_id, stage='finalizing', progress=90, message='Verarbeite Ergebnis...')
         
         logger.info("✅ Request completed successfully")
         logger.info("=" * 60)
         
         # Update job status
-        with job_lock:
-            jobs[job_id]['status'] = 'completed'
-            jobs[job_id]['progress'] = 100
-            jobs[job_id]['message'] = 'Fertig!'
-            jobs[job_id]['updated_at'] = time.time()
-            jobs[job_id]['result'] = nca_response
+        report(
+            job_id,
+            status='completed',
+            stage='completed',
+            progress=100,
+            message='Fertig!',
+            result=nca_response
+        )
         
         # 5. Return result
-        return jsonify({
+        return {
             'success': True,
             'job_id': job_id,
-            'intent': {
-                'endpoint': endpoint,
-                'confidence': confidence,
-                'reasoning': reasoning
-            },
+            'intent': intent,
             'params': params,
             'uploaded_files': uploaded_files,
             'result': nca_response
-        })
+        }
         
     except Exception as e:
         logger.exception("💥 Error processing request")
         
         # Update job status
-        with job_lock:
-            if job_id in jobs:
-                jobs[job_id]['status'] = 'failed'
-                jobs[job_id]['message'] = str(e)
-                jobs[job_id]['updated_at'] = time.time()
-        
-        return jsonify({
-            'success': False,
-            'job_id': job_id,
-            'error': str(e)
-        }), 500
+        report(job_id, status='failed', stage='failed', message=str(e))
+        raise
+
+
+def concat_route(media_urls):
+    """
+    Ziel einer /combine-videos-Anfrage: 'audio' (local_audio_service), 'video' (lokal) oder 'container'
+
+    Audio wird an der Endung (AUDIO_EXTENSIONS) oder bei lokalen Uploads am ffprobe-Profil
+    erkannt; Eingaben ohne Videostream gehen nie in local_video_concat.
+    """
+    if all(is_audio_url(url) for url in media_urls):
+        return 'audio'
+    if not (local_processor.check_local_ffmpeg() and get_capabilities().ffprobe_available):
+        return 'container'
+    paths = local_processor.local_upload_paths(media_urls)
+    if not paths:
+        return 'container'
+    infos = [probe_media(path) or {} for path in paths]
+    if all(info.get('video') for info in infos):
+        return 'video'
+    if all(info.get('audio') and not info.get('video') for info in infos):
+        return 'audio'
+    return 'container'
+
+
+def expand_repeat(params):
+    """'repeat' für den Container ausschreiben: media_urls * repeat (nur lokal wird geloopt)"""
+    repeat = int(params.get('repeat') or 1)
+    params = {k: v for k, v in params.items() if k != 'repeat'}
+    if repeat > 1 and params.get('media_urls'):
+        params['media_urls'] = params['media_urls'] * repeat
+    return params
 
 
 def call_nca_api(endpoint, params):
@@ -545,7 +1035,7 @@ def call_nca_api(endpoint, params):
     # SPECIAL HANDLING: Test Endpoint
     if endpoint == '/v1/toolkit/test':
         try:
-            resp = requests.get(f"{NCA_API_URL}/v1/tools/list", timeout=5)
+            resp = get_nca_client().get('/v1/tools/list')
             if resp.ok:
                 return {'message': 'NCA Toolkit läuft!', 'tools': resp.json()}
         except:
@@ -587,7 +1077,7 @@ def call_nca_api(endpoint, params):
         logger.info("🚀 LOCAL OVERRIDE: Using local FFmpeg for audio concatenation")
         audio_urls = params.get('audio_urls', [])
         try:
-            return local_processor.local_audio_concat(audio_urls)
+            return local_processor.local_audio_concat(audio_urls, repeat=params.get('repeat') or 1)
         except Exception as e:
             logger.error(f"Local Audio Concat Failed: {e}")
             raise Exception(f"Local Audio Processing Error: {e}")
@@ -638,7 +1128,14 @@ def call_nca_api(endpoint, params):
                      logger.info("🚀 LOCAL OVERRIDE: Generating thumbnail locally with FFmpeg")
                      try:
                          # Synchronous result - NO job_id needed for frontend!
-                         return local_processor.create_thumbnail(video_url)
+                         options = {
+                             key: params[key]
+                             for key in ('offsets', 'count', 'mode', 'output', 'width', 'height', 'columns', 'scene_threshold')
+                             if params.get(key) not in (None, '')
+                         }
+                         if params.get('time_offset') and 'offsets' not in options:
+                             options['offsets'] = [params['time_offset']]
+                         return local_processor.create_thumbnail(video_url, **options)
                      except Exception as e:
                          logger.error(f"Local Thumbnail Failed: {e}")
                          raise Exception(f"Thumbnail Generation Error: {e}")
@@ -650,19 +1147,22 @@ def call_nca_api(endpoint, params):
                       # Check params for viewport
                       width = params.get('viewport_width', 1920)
                       height = params.get('viewport_height', 1080)
-                      return local_processor.create_website_screenshot(video_url, width, height)
+                      # Mehrere Viewports / ganze Seite / Elemente aus EINEM Seitenaufruf
+                      options = {
+                          key: params[key]
+                          for key in ('viewports', 'full_page', 'elements')
+                          if params.get(key)
+                      }
+                      if params.get('max_age') is not None:
+                          # Sekunden, die eine gecachte Aufnahme alt sein darf (0 = immer frisch)
+                          options['max_age'] = params['max_age']
+                      return local_processor.create_website_screenshot(video_url, width, height, **options)
                  except Exception as e:
                       logger.error(f"Local Website Screenshot Failed: {e}")
                       # Fallback to container if local fails? No, container doesn't have it.
                       raise Exception(f"Website Screenshot Error: {e}")
 
-    url = f"{NCA_API_URL}{endpoint}"
-    headers = {
-        'x-api-key': NCA_API_KEY,
-        'Content-Type': 'application/json'
-    }
-    
-    response = requests.post(url, headers=headers, json=params, timeout=300)
+    response = get_nca_client().post(endpoint, json=params)
     
     if not response.ok:
         error_text = response.text
@@ -676,12 +1176,6 @@ def call_nca_api(endpoint, params):
     return response.json()
 
 
-@app.route('/uploads/<filename>')
-def uploaded_file(filename):
-    """Serve uploaded files"""
-    return send_from_directory(UPLOAD_FOLDER, filename)
-
-
 @app.route('/api/upload', methods=['POST'])
 def api_upload_result():
     """
@@ -710,24 +1204,16 @@ def health_check():
     try:
         # Teste Verbindung zum NCA Toolkit
         # Wir nutzen /authenticate da der Root-Pfad 404 liefert
-        headers = {'x-api-key': NCA_API_KEY}
+        client = get_nca_client()
         try:
             # Versuche Authenticate Endpoint
-            response = requests.post(
-                f"{NCA_API_URL}/authenticate", # Container path seems to be /authenticate based on blueprint
-                headers=headers,
-                timeout=5
-            )
+            response = client.post('/authenticate') # Container path seems to be /authenticate based on blueprint
             # 200 = Authorized, 401 = Unauthorized (aber erreichbar!), 404 = Falscher Pfad
             if response.status_code in [200, 401]:
                 nca_status = 'healthy'
             else:
                 # Fallback: Vielleicht ist es unter /v1/toolkit/authenticate?
-                response = requests.post(
-                    f"{NCA_API_URL}/v1/toolkit/authenticate",
-                    headers=headers,
-                    timeout=5
-                )
+                response = client.post('/v1/toolkit/authenticate')
                 if response.status_code in [200, 401]:
                     nca_status = 'healthy'
                 else:
@@ -743,7 +1229,32 @@ def health_check():
         'nca_toolkit': {
             'url': NCA_API_URL,
             'status': nca_status
-        }
+        },
+        'jobs': job_store.stats()
+    })
+
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Laufzeit-Statistiken für das Monitoring"""
+    return jsonify({
+        'success': True,
+        'timestamp': datetime.utcnow().isoformat(),
+        'uptime_seconds': round(time.time() - START_TIME, 1),
+        'nca_client': get_nca_client().stats(),
+        'jobs': job_store.stats(),
+        'job_runner': job_runner.get_runner_stats(),
+        'sse_subscribers': job_events.subscriber_count(),
+        'intent_cache': intent_cache.stats() if intent_cache else None,
+        'ffmpeg': get_capabilities().to_dict(),
+        'ffmpeg_scheduler': get_scheduler().stats(),
+        'derivation_cache': derivation_cache.stats() if derivation_cache else None,
+        'browser_pool': get_browser_pool().stats(),
+        'screenshot_cache': screenshot_cache.stats() if screenshot_cache else None,
+        'youtube_cache': youtube_cache_stats(),
+        'uploads': {**upload_index.stats(), **upload_sessions.session_stats()},
+        'intent_tiers': get_intent_stats(),
+        'llm_deadline': get_llm_deadline_stats()
     })
 
 
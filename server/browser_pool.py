@@ -0,0 +1,288 @@
+"""
+Browser Pool - Langlebige Headless-Chrome-Sessions für Webseiten-Screenshots
+Der ChromeDriver-Pfad wird einmal aufgelöst, Browser werden wiederverwendet und nach
+BROWSER_MAX_USES Seiten oder nach einem Fehler ersetzt. Statt fester Wartezeit wird auf
+document.readyState und Netzwerk-Ruhe gewartet (mit Obergrenze).
+"""
+
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Konfiguration
+BROWSER_POOL_SIZE = int(os.getenv('BROWSER_POOL_SIZE', 2))
+BROWSER_MAX_USES = int(os.getenv('BROWSER_MAX_USES', 50))
+BROWSER_PAGE_TIMEOUT = float(os.getenv('BROWSER_PAGE_TIMEOUT', 15))        # Sekunden bis Seite als geladen gilt
+BROWSER_NETWORK_IDLE_MS = int(os.getenv('BROWSER_NETWORK_IDLE_MS', 500))   # So lange keine neuen Requests = fertig
+BROWSER_ACQUIRE_TIMEOUT = float(os.getenv('BROWSER_ACQUIRE_TIMEOUT', 60))  # Warten auf eine freie Session
+BROWSER_PREWARM = os.getenv('BROWSER_PREWARM', 'false').lower() in ('1', 'true', 'yes')
+CHROMEDRIVER_PATH = os.getenv('CHROMEDRIVER_PATH', '')  # Leer = einmalig über webdriver-manager
+
+POLL_INTERVAL = 0.1
+
+# Zählt Ressourcen (Performance API) - bleibt die Zahl BROWSER_NETWORK_IDLE_MS lang gleich, ist das Netz ruhig
+RESOURCE_COUNT_JS = "return performance.getEntriesByType('resource').length;"
+
+
+class BrowserPoolError(Exception):
+    """Keine Browser-Session verfügbar (Selenium fehlt, Start fehlgeschlagen, Zeitlimit)"""
+
+
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+
+def resolve_driver_path():
+    """ChromeDriver-Pfad - einmal pro Prozess (ChromeDriverManager().install() prüft sonst jedes Mal online)"""
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path is None:
+            if CHROMEDRIVER_PATH:
+                _driver_path = CHROMEDRIVER_PATH
+            else:
+                from webdriver_manager.chrome import ChromeDriverManager
+                _driver_path = ChromeDriverManager().install()
+            logger.info(f"🌐 ChromeDriver: {_driver_path}")
+        return _driver_path
+
+
+class BrowserSession:
+    """Ein Headless-Chrome mit Nutzungszähler"""
+
+    def __init__(self):
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.chrome.service import Service
+
+        chrome_options = Options()
+        chrome_options.add_argument("--headless=new")
+        chrome_options.add_argument("--window-size=1920,1080")
+        chrome_options.add_argument("--no-sandbox")
+        chrome_options.add_argument("--disable-dev-shm-usage")
+        chrome_options.add_argument("--hide-scrollbars")
+
+        self.driver = webdriver.Chrome(service=Service(resolve_driver_path()), options=chrome_options)
+        self.driver.set_page_load_timeout(BROWSER_PAGE_TIMEOUT)
+        self.uses = 0
+        self.created_at = time.time()
+
+    def set_viewport(self, width, height, device_scale_factor=1, mobile=False):
+        """Exakter Viewport über DevTools (unabhängig von Fenster-Rahmen und Scrollbars)"""
+        self.driver.execute_cdp_cmd('Emulation.setDeviceMetricsOverride', {
+            'width': int(width),
+            'height': int(height),
+            'deviceScaleFactor': device_scale_factor,
+            'mobile': bool(mobile)
+        })
+
+    def open(self, url, width=1920, height=1080, timeout=BROWSER_PAGE_TIMEOUT):
+        """Lädt url im gewünschten Viewport und wartet, bis die Seite fertig ist"""
+        self.set_viewport(width, height)
+        return self.navigate(url, timeout)
+
+    def navigate(self, url, timeout=BROWSER_PAGE_TIMEOUT):
+        """
+        Ruft url auf und wartet, bis die Seite fertig ist (insgesamt höchstens timeout)
+
+        Lädt die Seite nicht rechtzeitig fertig (hängende Ressource), wird das Laden
+        gestoppt und trotzdem aufgenommen - die Session bleibt dabei nutzbar.
+
+        Returns:
+            Sekunden bis zur Ruhe bzw. bis zum Abbruch
+        """
+        from selenium.common.exceptions import TimeoutException
+
+        start = time.time()
+        try:
+            self.driver.get(url)
+        except TimeoutException:
+            logger.info(f"⏱️ Page load not finished after {timeout:g}s - capturing anyway: {url}")
+            try:
+                self.driver.execute_script("window.stop();")
+            except Exception as e:
+                logger.debug(f"window.stop failed: {e}")
+            return round(time.time() - start, 3)
+        return round(time.time() - start + self.wait_until_ready(max(timeout - (time.time() - start), 0)), 3)
+
+    def wait_until_ready(self, timeout=BROWSER_PAGE_TIMEOUT):
+        """
+        Wartet auf document.readyState == 'complete' und Netzwerk-Ruhe
+
+        Returns:
+            Sekunden bis zur Ruhe; bei Zeitüberschreitung wird trotzdem weitergemacht
+            (Seiten mit Dauer-Polling werden nie ganz ruhig)
+        """
+        start = time.time()
+        deadline = start + timeout
+        idle_seconds = BROWSER_NETWORK_IDLE_MS / 1000
+
+        while time.time() < deadline:
+            if self.driver.execute_script("return document.readyState;") == 'complete':
+                break
+            time.sleep(POLL_INTERVAL)
+
+        last_count = -1
+        last_change = time.time()
+        while time.time() < deadline:
+            count = self.driver.execute_script(RESOURCE_COUNT_JS)
+            now = time.time()
+            if count != last_count:
+                last_count, last_change = count, now
+            elif now - last_change >= idle_seconds:
+                return round(now - start, 3)
+            time.sleep(POLL_INTERVAL)
+
+        logger.info(f"⏱️ Page not idle after {timeout:g}s - capturing anyway")
+        return round(time.time() - start, 3)
+
+    def reset(self):
+        """Zustand für die nächste Anfrage leeren (Cookies, Seite)"""
+        self.driver.delete_all_cookies()
+        self.driver.get('about:blank')
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception as e:
+            logger.debug(f"Browser quit failed: {e}")
+
+
+class BrowserPool:
+    """Begrenzte Anzahl wiederverwendbarer Browser-Sessions"""
+
+    def __init__(self, size=BROWSER_POOL_SIZE, max_uses=BROWSER_MAX_USES):
+        self.size = max(1, size)
+        self.max_uses = max(1, max_uses)
+        self._idle = queue.LifoQueue()  # Zuletzt genutzter Browser zuerst (warme Caches)
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._sessions = set()
+        self._stats = {
+            'launched': 0, 'recycled': 0, 'crashed': 0, 'pages': 0,
+            'launch_seconds': 0.0, 'wait_seconds': 0.0
+        }
+
+    def _launch(self):
+        start = time.time()
+        try:
+            session = BrowserSession()
+        except ImportError as e:
+            raise BrowserPoolError(f"Selenium nicht installiert: {e}")
+        seconds = time.time() - start
+        with self._lock:
+            self._sessions.add(session)
+            self._stats['launched'] += 1
+            self._stats['launch_seconds'] += seconds
+        logger.info(f"🌐 Browser launched in {seconds:.1f}s ({len(self._sessions)}/{self.size})")
+        return session
+
+    def _discard(self, session, reason):
+        with self._lock:
+            self._sessions.discard(session)
+            self._stats[reason] += 1
+        session.quit()
+
+    @contextmanager
+    def session(self, timeout=BROWSER_ACQUIRE_TIMEOUT):
+        """
+        Leiht eine Session aus (wartet, wenn alle belegt sind)
+
+        Nach einem Fehler wird die Session verworfen, nach max_uses Seiten ersetzt.
+        """
+        queued_at = time.time()
+        if not self._slots.acquire(timeout=timeout):
+            raise BrowserPoolError(f"Kein Browser frei nach {timeout:g}s")
+        with self._lock:
+            self._stats['wait_seconds'] += time.time() - queued_at
+
+        session = None
+        try:
+            try:
+                session = self._idle.get_nowait()
+            except queue.Empty:
+                session = self._launch()
+
+            try:
+                yield session
+            except BaseException:
+                # Abgestürzt, hängengeblieben oder Seite kaputt - nicht wiederverwenden
+                self._discard(session, 'crashed')
+                session = None
+                raise
+
+            session.uses += 1
+            with self._lock:
+                self._stats['pages'] += 1
+            if session.uses >= self.max_uses:
+                self._discard(session, 'recycled')
+                session = None
+            else:
+                try:
+                    session.reset()
+                except Exception:
+                    self._discard(session, 'crashed')
+                    session = None
+        finally:
+            if session is not None:
+                self._idle.put(session)
+            self._slots.release()
+
+    def prewarm(self):
+        """Startet alle Sessions vorab (sonst beim ersten Bedarf)"""
+        for _ in range(self.size - len(self._sessions)):
+            self._idle.put(self._launch())
+
+    def shutdown(self):
+        while True:
+            try:
+                session = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            session.quit()
+        with self._lock:
+            self._sessions.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['open'] = len(self._sessions)
+        stats['idle'] = self._idle.qsize()
+        stats['size'] = self.size
+        stats['max_uses'] = self.max_uses
+        stats['launch_seconds'] = round(stats['launch_seconds'], 1)
+        stats['wait_seconds'] = round(stats['wait_seconds'], 1)
+        return stats
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool():
+    """Pool des aktuellen Prozesses (Browser lassen sich nicht über fork teilen)"""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = BrowserPool()
+            _pool_pid = os.getpid()
+            atexit.register(_pool.shutdown)
+        return _pool
+
+
+def init_browser_pool(prewarm=BROWSER_PREWARM):
+    """Löst den ChromeDriver-Pfad beim Server-Start auf (optional mit vorgestarteten Browsern)"""
+    try:
+        resolve_driver_path()
+        if prewarm:
+            get_browser_pool().prewarm()
+    except ImportError:
+        logger.warning("Selenium/webdriver-manager not installed - webpage screenshots disabled")
+    except Exception as e:
+        logger.warning(f"Browser pool init failed: {e}")
@@ -0,0 +1,486 @@
+"""
+Concat Engine - Audio- und Video-Dateien aneinanderhängen, so billig wie möglich
+Die Eingaben werden per ffprobe verglichen: passen Codec, Sample-Rate und Kanäle zum Ziel,
+wird nur kopiert (concat demuxer, -c copy); abweichende Eingaben werden einzeln ins Zielprofil
+umkodiert und dann ebenfalls per Stream-Copy angehängt. Wiederholungen werden nicht
+dupliziert dekodiert, sondern als Loop bzw. mehrfacher Listeneintrag kopiert.
+Die Normalisierung abweichender Eingaben läuft parallel (je Eingabe ein FFmpeg-Prozess,
+begrenzt durch den FFmpeg Scheduler).
+"""
+
+import os
+import time
+import shutil
+import logging
+import tempfile
+from contextlib import contextmanager
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from file_handler import UPLOAD_FOLDER
+from ffmpeg_capabilities import get_capabilities, ffmpeg_command
+from ffmpeg_scheduler import get_scheduler, run_ffmpeg, PRIORITY_NORMAL, FFMPEG_TIMEOUT
+from media_probe import probe_media
+from intent_rules import validate_repeat
+
+logger = logging.getLogger(__name__)
+
+# Konfiguration
+# Arbeitsverzeichnisse im Upload-Ordner (gleiches Dateisystem, /tmp ist oft zu klein für Hörbücher)
+CONCAT_WORK_DIR = os.getenv('CONCAT_WORK_DIR', os.path.join(UPLOAD_FOLDER, '.concat'))
+CONCAT_MAX_INPUTS = int(os.getenv('CONCAT_MAX_INPUTS', 64))  # Gleichzeitig dekodierte Eingaben pro FFmpeg-Aufruf
+CONCAT_WORK_DIR_TTL_HOURS = 24  # Reste abgestürzter Jobs
+
+# Ausgabeformate: Ziel-Codec (wie ffprobe ihn meldet) und Encoder-Kandidaten (schnellster zuerst)
+AUDIO_TARGETS = {
+    'mp3': {'codec': 'mp3', 'encoders': ('libmp3lame', 'libshine', 'mp3')},
+    'm4a': {'codec': 'aac', 'encoders': ('libfdk_aac', 'aac')},
+    'wav': {'codec': 'pcm_s16le', 'encoders': ('pcm_s16le',)}
+}
+# Video (MP4): H.264 + AAC, Zielauflösung/FPS = häufigstes Profil der Eingaben
+VIDEO_CODEC = 'h264'
+VIDEO_PIX_FMT = 'yuv420p'
+VIDEO_ENCODERS = ('libx264', 'libopenh264', 'h264')
+DEFAULT_FPS = 30
+MP3_SAMPLE_RATES = (8000, 11025, 12000, 16000, 22050, 24000, 32000, 44100, 48000)
+DEFAULT_SAMPLE_RATE = 44100
+DEFAULT_CHANNELS = 2
+
+
+class ConcatError(Exception):
+    """Aneinanderhängen fehlgeschlagen (FFmpeg-Fehler oder kein passender Encoder)"""
+
+
+def audio_profile(path):
+    """(codec, sample_rate, channels) des ersten Audio-Streams oder None (ffprobe fehlt / kein Audio)"""
+    info = probe_media(path)
+    if not info or not info.get('audio'):
+        return None
+    audio = info['audio']
+    return (audio['codec'], audio['sample_rate'], audio['channels'])
+
+
+def _target_profile(profiles, output_format):
+    """
+    Zielprofil: häufigstes Profil unter den Eingaben, die schon den Ziel-Codec haben
+    (die müssen dann nicht angefasst werden); sonst häufigste Sample-Rate/Kanäle insgesamt.
+    """
+    codec = AUDIO_TARGETS[output_format]['codec']
+    same_codec = [(rate, channels) for c, rate, channels in profiles if c == codec]
+    candidates = same_codec or [(rate, channels) for _, rate, channels in profiles]
+    rate, channels = Counter(candidates).most_common(1)[0][0] if candidates else (None, None)
+
+    rate = rate or DEFAULT_SAMPLE_RATE
+    channels = channels or DEFAULT_CHANNELS
+    if output_format == 'mp3':
+        # MP3 kennt nur bestimmte Raten und höchstens Stereo
+        rate = rate if rate in MP3_SAMPLE_RATES else DEFAULT_SAMPLE_RATE
+        channels = min(channels, 2)
+    return (codec, rate, channels)
+
+
+def _pick_encoder(output_format):
+    encoder = get_capabilities().pick_encoder(*AUDIO_TARGETS[output_format]['encoders'])
+    if not encoder and output_format == 'wav':
+        encoder = 'pcm_s16le'  # Immer eingebaut, wird aber nicht in jeder -encoders Liste gemeldet
+    if not encoder:
+        raise ConcatError(f"Kein {output_format.upper()}-Encoder in dieser FFmpeg-Version")
+    return encoder
+
+
+def _run_parallel(tasks):
+    """
+    Führt unabhängige FFmpeg-Schritte gleichzeitig aus (jeder ein eigener Prozess)
+
+    Die Threads warten nur auf ihren Prozess; wie viele wirklich laufen,
+    bestimmt der FFmpeg Scheduler (FFMPEG_MAX_CONCURRENT).
+    """
+    if len(tasks) <= 1:
+        for task in tasks:
+            task()
+        return
+    workers = min(len(tasks), get_scheduler().max_concurrent)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='concat') as executor:
+        futures = [executor.submit(task) for task in tasks]
+    for future in futures:
+        future.result()  # Erste Exception weiterreichen
+
+
+def _run(cmd, label, priority, timeout, threads=True):
+    logger.info(f"🎤 {label}: {' '.join(cmd)}")
+    result = run_ffmpeg(cmd, priority=priority, timeout=timeout, threads=threads, label=label)
+    if result.returncode != 0:
+        logger.error(f"FFmpeg Error: {result.stderr}")
+        raise ConcatError(f"{label} fehlgeschlagen: {result.stderr[:200]}")
+
+
+def write_list_file(list_path, paths):
+    """Liste für den concat demuxer (absolute Pfade, einfache Anführungszeichen escaped)"""
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for path in paths:
+            safe_path = os.path.abspath(path).replace('\\', '/').replace("'", "'\\''")
+            f.write(f"file '{safe_path}'\n")
+
+
+@contextmanager
+def work_directory():
+    """Eigenes Arbeitsverzeichnis pro Concat-Job (Listen, Zwischenteile) - wird danach gelöscht"""
+    cleanup_stale_work_dirs()
+    os.makedirs(CONCAT_WORK_DIR, exist_ok=True)
+    path = tempfile.mkdtemp(prefix='concat-', dir=CONCAT_WORK_DIR)
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def cleanup_stale_work_dirs(max_age_hours=CONCAT_WORK_DIR_TTL_HOURS):
+    """Löscht Arbeitsverzeichnisse, die ein abgestürzter Prozess liegen gelassen hat"""
+    if not os.path.isdir(CONCAT_WORK_DIR):
+        return
+    cutoff = time.time() - max_age_hours * 3600
+    for name in os.listdir(CONCAT_WORK_DIR):
+        path = os.path.join(CONCAT_WORK_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+                logger.info(f"Deleted stale concat work dir: {name}")
+        except OSError:
+            pass
+
+
+def _copy_concat(paths, output_path, work_dir, priority, timeout, list_name='inputs.txt'):
+    """Stream-Copy über den concat demuxer - liest eine Datei nach der anderen, ohne Dekodieren"""
+    list_path = os.path.join(work_dir, list_name)
+    write_list_file(list_path, paths)
+    cmd = ffmpeg_command(
+        '-y', '-f', 'concat', '-safe', '0', '-i', list_path,
+        '-map', '0:a', '-c', 'copy',
+        output_path
+    )
+    _run(cmd, 'Audio concat (copy)', priority, timeout, threads=False)
+
+
+def _reencode(path, output_path, profile, encoder, priority, timeout):
+    """Eine Eingabe ins Zielprofil umkodieren (nur Audio, ohne Cover-Bild)"""
+    _, rate, channels = profile
+    cmd = ffmpeg_command(
+        '-y', '-i', path,
+        '-vn', '-map', '0:a:0',
+        '-c:a', encoder, '-ar', str(rate), '-ac', str(channels),
+        output_path
+    )
+    _run(cmd, 'Audio normalize', priority, timeout)
+
+
+def _loop_copy(path, count, output_path, priority, timeout):
+    """Eine Datei count-mal hintereinander: ein Input mit -stream_loop, Stream-Copy"""
+    cmd = ffmpeg_command(
+        '-y', '-stream_loop', str(count - 1), '-i', path,
+        '-map', '0:a', '-c', 'copy',
+        output_path
+    )
+    _run(cmd, 'Audio loop (copy)', priority, timeout, threads=False)
+
+
+def _filter_pass(segments, output_path, encoder, priority, timeout, profile=None):
+    """Ein FFmpeg-Aufruf: Segmente dekodieren, über den concat-Filter verbinden, neu kodieren"""
+    inputs = []
+    for path, count in segments:
+        # Wiederholungen als Loop desselben Inputs statt als weitere -i Argumente
+        if count > 1:
+            inputs.extend(['-stream_loop', str(count - 1)])
+        inputs.extend(['-i', path])
+    filter_complex = ''.join(f"[{i}:a]" for i in range(len(segments)))
+    filter_complex += f"concat=n={len(segments)}:v=0:a=1[out]"
+    output_args = ['-c:a', encoder]
+    if profile:
+        output_args += ['-ar', str(profile[1]), '-ac', str(profile[2])]
+    cmd = ffmpeg_command('-y', *inputs, '-filter_complex', filter_complex, '-map', '[out]', *output_args, output_path)
+    _run(cmd, 'Audio concat (re-encode)', priority, timeout)
+
+
+def _filter_concat(segments, output_path, output_format, encoder, work_dir, priority, timeout):
+    """
+    Fallback ohne ffprobe: alles dekodieren und neu kodieren
+
+    Bis CONCAT_MAX_INPUTS Segmente in einem Aufruf; darüber hierarchisch: Gruppen zu je
+    CONCAT_MAX_INPUTS mit festem Profil kodieren, die Gruppen dann per Stream-Copy verbinden.
+    So bleiben argv und die Zahl gleichzeitig offener Decoder begrenzt.
+    """
+    if len(segments) <= CONCAT_MAX_INPUTS:
+        _filter_pass(segments, output_path, encoder, priority, timeout)
+        return
+
+    profile = _target_profile([], output_format)
+    group_paths = []
+    tasks = []
+    for index, start in enumerate(range(0, len(segments), CONCAT_MAX_INPUTS)):
+        group_path = os.path.join(work_dir, f"group_{index:05d}.{output_format}")
+        group = segments[start:start + CONCAT_MAX_INPUTS]
+        tasks.append(lambda group=group, group_path=group_path: _filter_pass(
+            group, group_path, encoder, priority, timeout, profile
+        ))
+        group_paths.append(group_path)
+    _run_parallel(tasks)
+    logger.info(f"🎤 Audio concat: {len(segments)} segments in {len(group_paths)} groups")
+    _copy_concat(group_paths, output_path, work_dir, priority, timeout, list_name='groups.txt')
+
+
+def build_segments(input_paths, repeat=1):
+    """
+    Abspielfolge als [(path, count)]
+
+    repeat wiederholt die ganze Folge; direkt aufeinanderfolgende gleiche Eingaben
+    (z.B. ältere Intents mit [a, a, a]) werden zu einem Segment zusammengefasst.
+    """
+    repeat = validate_repeat(repeat)
+    segments = []
+    for path in list(input_paths) * repeat:
+        if segments and segments[-1][0] == path:
+            segments[-1] = (path, segments[-1][1] + 1)
+        else:
+            segments.append((path, 1))
+    return segments
+
+
+def concat_audio(input_paths, output_path, output_format='mp3', priority=PRIORITY_NORMAL,
+                 timeout=FFMPEG_TIMEOUT, repeat=1):
+    """
+    Hängt Audio-Dateien aneinander
+
+    Args:
+        input_paths: Lokale Pfade in Abspielreihenfolge
+        output_path: Zieldatei
+        output_format: 'mp3', 'm4a' oder 'wav'
+        priority: Priorität im FFmpeg Scheduler
+        timeout: Sekunden pro FFmpeg-Aufruf
+        repeat: Wie oft die ganze Folge abgespielt wird (jede Datei wird trotzdem nur einmal geprüft/umkodiert)
+
+    Returns:
+        {'mode': 'copy' | 'partial' | 'reencode', 'inputs': N, 'unique_inputs': U, 'reencoded': M}
+    """
+    if output_format not in AUDIO_TARGETS:
+        raise ValueError(f"Unbekanntes Audio-Ausgabeformat: {output_format}")
+    if not input_paths:
+        raise ValueError("No input files found")
+
+    segments = build_segments(input_paths, repeat)
+    unique_paths = list(dict.fromkeys(path for path, _ in segments))
+    total = sum(count for _, count in segments)
+    info = {'inputs': total, 'unique_inputs': len(unique_paths)}
+
+    profiles = {path: audio_profile(path) for path in unique_paths}
+    if any(profile is None for profile in profiles.values()):
+        logger.info("🎤 Audio concat: Eingaben nicht prüfbar - kodiere alles neu")
+        with work_directory() as work_dir:
+            _filter_concat(segments, output_path, output_format, _pick_encoder(output_format), work_dir, priority, timeout)
+        return dict(info, mode='reencode', reencoded=len(unique_paths))
+
+    target = _target_profile(list(profiles.values()), output_format)
+    mismatched = [path for path in unique_paths if profiles[path] != target]
+    encoder = _pick_encoder(output_format) if mismatched else None
+
+    with work_directory() as work_dir:
+        # Jede abweichende Datei nur einmal umkodieren, auch wenn sie mehrfach vorkommt
+        parts = {path: path for path in unique_paths}
+        tasks = []
+        for index, path in enumerate(mismatched):
+            part_path = os.path.join(work_dir, f"part_{index:05d}.{output_format}")
+            logger.info(f"🎤 {os.path.basename(path)} {profiles[path]} → {target}")
+            tasks.append(lambda path=path, part_path=part_path: _reencode(
+                path, part_path, target, encoder, priority, timeout
+            ))
+            parts[path] = part_path
+        _run_parallel(tasks)
+
+        if len(segments) == 1 and segments[0][1] > 1:
+            _loop_copy(parts[segments[0][0]], segments[0][1], output_path, priority, timeout)
+        else:
+            # Die Liste ist eine Datei statt argv - auch hunderte Eingaben, nur eine gleichzeitig offen
+            _copy_concat(
+                [parts[path] for path, count in segments for _ in range(count)],
+                output_path, work_dir, priority, timeout
+            )
+
+    mode = 'copy' if not mismatched else ('reencode' if len(mismatched) == len(unique_paths) else 'partial')
+    logger.info(f"✅ Audio concat ({mode}): {total} inputs ({len(unique_paths)} unique), {len(mismatched)} re-encoded")
+    return dict(info, mode=mode, reencoded=len(mismatched))
+
+
+# ------------------------------
+# VIDEO
+# ------------------------------
+
+def video_profile(path):
+    """
+    ((codec, width, height, pix_fmt, fps), audio_profile oder None, bitstream) oder None wenn nicht prüfbar
+
+    bitstream = (profile, level, time_base, extradata_hash). Per concat demuxer ohne Umkodieren
+    verbinden lassen sich nur Eingaben, bei denen auch dieser Teil gleich ist - der Join übernimmt
+    die Parametersätze (SPS/PPS) der ersten Datei.
+    """
+    info = probe_media(path)
+    if not info or not info.get('video'):
+        return None
+    video = info['video']
+    audio = info.get('audio')
+    return (
+        (video['codec'], video['width'], video['height'], video['pix_fmt'], video['fps']),
+        (audio['codec'], audio['sample_rate'], audio['channels']) if audio else None,
+        (video.get('profile'), video.get('level'), video.get('time_base'), video.get('extradata_hash'))
+    )
+
+
+def _target_video_profile(profiles):
+    """Zielprofil: häufigste Auflösung/FPS (bevorzugt unter H.264-Eingaben), AAC-Ton wenn irgendeine Eingabe Ton hat"""
+    videos = [video for video, _, _ in profiles]
+    h264 = [(w, h, fps) for codec, w, h, pix_fmt, fps in videos if codec == VIDEO_CODEC and pix_fmt == VIDEO_PIX_FMT]
+    width, height, fps = Counter(h264 or [(w, h, fps) for _, w, h, _, fps in videos]).most_common(1)[0][0]
+    # yuv420p braucht gerade Kantenlängen
+    width, height = (width or 1280) // 2 * 2, (height or 720) // 2 * 2
+    video_target = (VIDEO_CODEC, width, height, VIDEO_PIX_FMT, fps or DEFAULT_FPS)
+
+    audios = [audio for _, audio, _ in profiles if audio]
+    if not audios:
+        return video_target, None
+    aac = [(rate, channels) for codec, rate, channels in audios if codec == 'aac']
+    rate, channels = Counter(aac or [(rate, channels) for _, rate, channels in audios]).most_common(1)[0][0]
+    return video_target, ('aac', rate or 48000, min(channels or DEFAULT_CHANNELS, 2))
+
+
+def _video_conforms(video, target):
+    codec, width, height, pix_fmt, fps = video
+    _, t_width, t_height, t_pix_fmt, t_fps = target
+    return (
+        codec == VIDEO_CODEC and (width, height, pix_fmt) == (t_width, t_height, t_pix_fmt)
+        and fps is not None and abs(fps - t_fps) < 0.01
+    )
+
+
+def _video_copyable(profiles, target):
+    """
+    Bild aller Eingaben per Stream-Copy verbindbar?
+
+    Nur wenn jede Eingabe dem Zielprofil entspricht und Profil/Level, time_base und
+    extradata (SPS/PPS) bei allen identisch sind. Schon eine abweichende Eingabe
+    bedeutet: alle Bilder neu kodieren, damit die Parametersätze zusammenpassen.
+    """
+    if not all(_video_conforms(video, target[0]) for video, _, _ in profiles):
+        return False
+    if len(profiles) == 1:
+        return True
+    bitstreams = {bitstream for _, _, bitstream in profiles}
+    return len(bitstreams) == 1 and None not in next(iter(bitstreams))
+
+
+def _normalize_video(path, part_path, profile, target, encoders, copy_video, priority, timeout):
+    """
+    Eine Eingabe ins Zielprofil bringen
+
+    Passt nur der Ton nicht (copy_video), wird das Bild kopiert und nur der Ton neu kodiert;
+    fehlt der Ton, wird Stille ergänzt (sonst bricht der Stream-Copy-Join).
+    """
+    (video, audio, _), (video_target, audio_target) = profile, target
+    video_encoder, audio_encoder = encoders
+    cmd = ffmpeg_command('-y', '-i', path)
+    if audio_target and not audio:
+        layout = 'stereo' if audio_target[2] == 2 else 'mono'
+        cmd += ['-f', 'lavfi', '-i', f"anullsrc=r={audio_target[1]}:cl={layout}"]
+    cmd += ['-map', '0:v:0']
+    if audio_target:
+        cmd += ['-map', '0:a:0' if audio else '1:a:0']
+
+    if copy_video:
+        cmd += ['-c:v', 'copy']
+    else:
+        _, width, height, pix_fmt, fps = video_target
+        cmd += [
+            '-vf', f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+                   f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={fps},format={pix_fmt}",
+            '-c:v', video_encoder
+        ]
+        cmd += ['-preset', 'veryfast', '-crf', '20'] if video_encoder == 'libx264' else ['-b:v', '6M']
+
+    if audio_target:
+        cmd += ['-c:a', audio_encoder, '-ar', str(audio_target[1]), '-ac', str(audio_target[2])]
+        if not audio:
+            cmd += ['-shortest']
+    cmd.append(part_path)
+    _run(cmd, 'Video normalize', priority, timeout)
+
+
+def concat_video(input_paths, output_path, priority=PRIORITY_NORMAL, timeout=FFMPEG_TIMEOUT, repeat=1):
+    """
+    Hängt Videos aneinander (MP4)
+
+    Sind die Bild-Streams bitstream-kompatibel (_video_copyable), werden Eingaben mit
+    passendem Ton unverändert kopiert und nur abweichender Ton neu kodiert; sonst werden
+    alle Eingaben parallel normalisiert. Danach ein Stream-Copy-Join über den concat demuxer.
+
+    Args:
+        input_paths: Lokale Pfade in Abspielreihenfolge
+        output_path: Zieldatei (.mp4)
+        priority: Priorität im FFmpeg Scheduler
+        timeout: Sekunden pro FFmpeg-Aufruf
+        repeat: Wie oft die ganze Folge abgespielt wird
+
+    Returns:
+        {'mode': 'copy' | 'partial' | 'reencode', 'inputs': N, 'unique_inputs': U, 'reencoded': M}
+
+    Raises:
+        ConcatError: Eingaben nicht prüfbar (ffprobe fehlt) oder FFmpeg-Fehler
+    """
+    if not input_paths:
+        raise ValueError("No input files found")
+
+    segments = build_segments(input_paths, repeat)
+    unique_paths = list(dict.fromkeys(path for path, _ in segments))
+    total = sum(count for _, count in segments)
+
+    profiles = {path: video_profile(path) for path in unique_paths}
+    unreadable = [os.path.basename(path) for path, profile in profiles.items() if profile is None]
+    if unreadable:
+        raise ConcatError(f"Video-Eingaben nicht prüfbar: {', '.join(unreadable)}")
+
+    target = _target_video_profile(list(profiles.values()))
+    copy_video = _video_copyable(list(profiles.values()), target)
+    mismatched = [
+        path for path in unique_paths
+        if not copy_video or profiles[path][1] != target[1]
+    ]
+    encoders = (None, None)
+    if mismatched:
+        caps = get_capabilities()
+        encoders = (caps.pick_encoder(*VIDEO_ENCODERS), caps.pick_encoder(*AUDIO_TARGETS['m4a']['encoders']))
+        if not encoders[0] or (target[1] and not encoders[1]):
+            raise ConcatError("Kein H.264/AAC-Encoder in dieser FFmpeg-Version")
+
+    with work_directory() as work_dir:
+        parts = {path: path for path in unique_paths}
+        tasks = []
+        for index, path in enumerate(mismatched):
+            part_path = os.path.join(work_dir, f"part_{index:05d}.mp4")
+            logger.info(f"🎬 {os.path.basename(path)} {profiles[path]} → {target}")
+            tasks.append(lambda path=path, part_path=part_path: _normalize_video(
+                path, part_path, profiles[path], target, encoders, copy_video, priority, timeout
+            ))
+            parts[path] = part_path
+        _run_parallel(tasks)
+
+        if len(segments) == 1 and segments[0][1] > 1:
+            cmd = ffmpeg_command(
+                '-y', '-stream_loop', str(segments[0][1] - 1), '-i', parts[segments[0][0]],
+                '-c', 'copy', '-movflags', '+faststart', output_path
+            )
+        else:
+            list_path = os.path.join(work_dir, 'inputs.txt')
+            write_list_file(list_path, [parts[path] for path, count in segments for _ in range(count)])
+            cmd = ffmpeg_command(
+                '-y', '-f', 'concat', '-safe', '0', '-i', list_path,
+                '-c', 'copy', '-movflags', '+faststart', output_path
+            )
+        _run(cmd, 'Video concat (copy)', priority, timeout, threads=False)
+
+    mode = 'copy' if not mismatched else ('reencode' if len(mismatched) == len(unique_paths) else 'partial')
+    logger.info(f"✅ Video concat ({mode}): {total} inputs ({len(unique_paths)} unique), {len(mismatched)} normalized")
+    return {'mode': mode, 'inputs': total, 'unique_inputs': len(unique_paths), 'reencoded': len(mismatched)}
@@ -0,0 +1,322 @@
+"""
+Derivation Cache - Ergebnis-Cache für lokale FFmpeg-Operationen
+Key = (Operation, normalisierte Parameter, Inhalts-Hashes der Eingaben). Bei einem Treffer
+wird die vorhandene Ausgabedatei zurückgegeben statt FFmpeg erneut zu starten.
+"""
+
+import os
+import json
+import time
+import uuid
+import atexit
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager, ExitStack
+from file_handler import UPLOAD_FOLDER, BASE_DIR, HASH_CHUNK_SIZE, SHA256_PATTERN, upload_index
+from utils import file_lock
+
+logger = logging.getLogger(__name__)
+
+# Konfiguration
+DERIVATION_CACHE_ENABLED = os.getenv('DERIVATION_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+DERIVATION_CACHE_MAX_MB = float(os.getenv('DERIVATION_CACHE_MAX_MB', 2048))
+DERIVATION_CACHE_MAX_ENTRIES = int(os.getenv('DERIVATION_CACHE_MAX_ENTRIES', 5000))
+DERIVATION_CACHE_PATH = os.getenv('DERIVATION_CACHE_PATH', os.path.join(BASE_DIR, 'derivation_cache.json'))
+DERIVATION_CACHE_SAVE_INTERVAL = 5  # Sekunden zwischen zwei Schreibvorgängen
+
+
+_hash_memo = {}  # path -> (size, mtime, sha256)
+_hash_memo_lock = threading.Lock()
+
+
+def file_sha256(path):
+    """
+    Inhalts-Hash einer Eingabedatei
+
+    Inhaltsadressierte Uploads (<sha256>.<ext>) tragen den Hash schon im Namen;
+    alle anderen werden gehasht und nach (Größe, mtime) gemerkt.
+    """
+    stem = os.path.basename(path).rsplit('.', 1)[0]
+    if SHA256_PATTERN.match(stem):
+        return stem
+
+    stat = os.stat(path)
+    with _hash_memo_lock:
+        memo = _hash_memo.get(path)
+        if memo and memo[0] == stat.st_size and memo[1] == stat.st_mtime:
+            return memo[2]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    sha256 = digest.hexdigest()
+
+    with _hash_memo_lock:
+        _hash_memo[path] = (stat.st_size, stat.st_mtime, sha256)
+    return sha256
+
+
+def make_key(operation, params=None, input_paths=()):
+    """Cache-Key aus Operation, Parametern (sortiert) und Inhalts-Hashes der Eingaben (Reihenfolge zählt)"""
+    raw = json.dumps({
+        'op': operation,
+        'params': params or {},
+        'inputs': [file_sha256(path) for path in input_paths]
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class DerivationCache:
+    """LRU-Cache für abgeleitete Dateien im Upload-Ordner, begrenzt nach Gesamtgröße und Anzahl"""
+
+    def __init__(self, max_bytes=DERIVATION_CACHE_MAX_MB * 1024 * 1024,
+                 max_entries=DERIVATION_CACHE_MAX_ENTRIES, path=DERIVATION_CACHE_PATH):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.path = path
+        self._entries = OrderedDict()  # key -> {'stored_filename', 'size', 'created_at', 'operation'}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}  # key -> [Lock, Anzahl Nutzer] (gleiche Ableitung nur einmal gleichzeitig)
+        self._removed = {}  # key -> created_at des entfernten Eintrags (seit dem letzten save)
+        self._last_save = 0
+        self._dirty = False
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'seconds_saved': 0.0}
+
+        if self.path:
+            self._load()
+            atexit.register(self.save)
+
+    def get(self, key, max_age=None, with_meta=False):
+        """
+        Gibt den Dateinamen der gecachten Ausgabe zurück oder None
+
+        Args:
+            key: Key aus make_key()
+            max_age: Optional - ältere Einträge gelten als Miss (Sekunden); sie bleiben stehen,
+                weil frühere URLs noch darauf zeigen können, und werden beim nächsten put() ersetzt
+            with_meta: (stored_filename, meta) statt nur des Dateinamens zurückgeben
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                filepath = os.path.join(UPLOAD_FOLDER, entry['stored_filename'])
+                if not os.path.isfile(filepath):
+                    # Extern gelöscht (z.B. cleanup_old_files)
+                    self._drop_locked(key)
+                    entry = None
+                elif max_age is not None and time.time() - entry['created_at'] > max_age:
+                    entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                return (None, None) if with_meta else None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            self._stats['seconds_saved'] += entry.get('seconds', 0.0)
+            stored_filename = entry['stored_filename']
+            meta = dict(entry.get('meta') or {}, created_at=entry['created_at'])
+
+        # mtime auffrischen, damit cleanup_old_files häufig genutzte Ergebnisse behält
+        try:
+            os.utime(filepath)
+        except OSError:
+            pass
+        return (stored_filename, meta) if with_meta else stored_filename
+
+    def put(self, key, stored_filename, operation='', seconds=0.0, meta=None):
+        """Registriert eine fertige Ausgabedatei (liegt bereits im Upload-Ordner); meta = kleine JSON-Zusatzinfos"""
+        size = os.path.getsize(os.path.join(UPLOAD_FOLDER, stored_filename))
+        with self._lock:
+            # Veralteten Eintrag ersetzen, die alte Datei bleibt für bestehende URLs liegen
+            self._drop_locked(key)
+            self._entries[key] = {
+                'stored_filename': stored_filename,
+                'size': size,
+                'created_at': time.time(),
+                'operation': operation,
+                'seconds': round(seconds, 3)
+            }
+            if meta:
+                self._entries[key]['meta'] = meta
+            self._total_bytes += size
+            self._stats['stores'] += 1
+            for candidate in list(self._entries):
+                if self._total_bytes <= self.max_bytes and len(self._entries) <= self.max_entries:
+                    break
+                # Gerade referenzierte Ausgaben (laufende Jobs, file_refs) nicht löschen
+                if candidate == key or upload_index.in_use(self._entries[candidate]['stored_filename']):
+                    continue
+                self._drop_locked(candidate, delete_file=True)
+                self._stats['evictions'] += 1
+            self._dirty = True
+            save_due = self.path and time.time() - self._last_save >= DERIVATION_CACHE_SAVE_INTERVAL
+
+        if save_due:
+            self.save()
+
+    def output_filename(self, operation, key, ext):
+        """Deterministischer Dateiname einer Ableitung im Upload-Ordner"""
+        safe_operation = operation.split(':', 1)[0].replace('/', '_')
+        return f"{safe_operation}_{key[:24]}.{ext}"
+
+    @contextmanager
+    def locked(self, *keys):
+        """
+        Hält die Locks der angegebenen Keys (gleiche Ableitung nur einmal gleichzeitig)
+
+        Locks werden pro Key gezählt und erst entfernt, wenn niemand mehr darauf wartet -
+        sonst bekäme ein dritter Aufrufer einen neuen Lock und zwei Erzeuger schrieben
+        gleichzeitig in denselben Dateinamen. Feste Reihenfolge verhindert Deadlocks.
+        """
+        keys = sorted(set(keys))
+        with self._lock:
+            slots = [self._key_locks.setdefault(key, [threading.Lock(), 0]) for key in keys]
+            for slot in slots:
+                slot[1] += 1
+        try:
+            with ExitStack() as stack:
+                for slot in slots:
+                    stack.enter_context(slot[0])
+                yield
+        finally:
+            with self._lock:
+                for key, slot in zip(keys, slots):
+                    slot[1] -= 1
+                    if slot[1] == 0:
+                        self._key_locks.pop(key, None)
+
+    def run(self, operation, params, input_paths, ext, produce, max_age=None):
+        """
+        Liefert die Ausgabe aus dem Cache oder erzeugt sie über produce(output_path)
+
+        Args:
+            operation: Name der Operation inkl. Version, z.B. 'thumbnail:v1'
+            params: Normalisierte Parameter (JSON-serialisierbar)
+            input_paths: Eingabedateien (Inhalt geht in den Key ein)
+            ext: Endung der Ausgabedatei
+            produce: Funktion, die die Datei unter output_path erzeugt
+            max_age: Optional - maximales Alter eines Treffers in Sekunden
+
+        Returns:
+            (stored_filename, cached)
+        """
+        key = make_key(operation, params, input_paths)
+        with self.locked(key):
+            stored_filename = self.get(key, max_age=max_age)
+            if stored_filename:
+                logger.info(f"⚡ Derivation cache hit: {operation} → {stored_filename}")
+                return stored_filename, True
+
+            stored_filename = self.output_filename(operation, key, ext)
+            output_path = os.path.join(UPLOAD_FOLDER, stored_filename)
+            start = time.time()
+            # Eingaben aus dem Upload-Ordner sind während der Ableitung referenziert
+            uploads = [
+                os.path.basename(path) for path in input_paths
+                if os.path.dirname(os.path.abspath(path)) == os.path.abspath(UPLOAD_FOLDER)
+            ]
+            try:
+                with upload_index.hold(uploads):
+                    produce(output_path)
+            except BaseException:
+                # Keine halbfertigen Ausgaben liegen lassen
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+                raise
+            self.put(key, stored_filename, operation, time.time() - start)
+            return stored_filename, False
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._total_bytes
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        stats['seconds_saved'] = round(stats['seconds_saved'], 1)
+        stats['max_bytes'] = int(self.max_bytes)
+        return stats
+
+    def save(self):
+        """
+        Schreibt den Index atomar auf die Platte
+
+        Mehrere Server-Prozesse teilen sich die Datei: unter einem Datei-Lock wird der Stand
+        auf der Platte neu gelesen und zusammengeführt (siehe UploadIndex.save).
+        """
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            self._last_save = time.time()
+
+        tmp_path = f"{self.path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            with file_lock(self.path):
+                on_disk = self._read()
+                with self._lock:
+                    self._merge_locked(on_disk)
+                    data = [[key, entry] for key, entry in self._entries.items()]
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"Derivation cache save failed: {e}")
+            with self._lock:
+                self._dirty = True
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _merge_locked(self, on_disk):
+        """Übernimmt Einträge anderer Prozesse (vorne, also zuerst verdrängt); bei gleichem Key gewinnt der neuere"""
+        removed, self._removed = self._removed, {}
+        for key, entry in reversed(on_disk):
+            current = self._entries.get(key)
+            if current is not None:
+                if entry['created_at'] > current['created_at']:
+                    self._total_bytes += entry['size'] - current['size']
+                    self._entries[key] = entry
+            elif key in removed and entry['created_at'] <= removed[key]:
+                continue  # hier entfernt
+            elif os.path.isfile(os.path.join(UPLOAD_FOLDER, entry['stored_filename'])):
+                self._entries[key] = entry
+                self._entries.move_to_end(key, last=False)
+                self._total_bytes += entry['size']
+
+    def _drop_locked(self, key, delete_file=False):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._total_bytes -= entry['size']
+        self._removed[key] = entry['created_at']
+        self._dirty = True
+        if delete_file:
+            try:
+                os.remove(os.path.join(UPLOAD_FOLDER, entry['stored_filename']))
+            except OSError:
+                pass
+
+    def _read(self):
+        """Index auf der Platte ([[key, entry], ...]); leer, wenn nicht vorhanden oder unlesbar"""
+        if not os.path.exists(self.path):
+            return []
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Derivation cache load failed: {e}")
+            return []
+
+    def _load(self):
+        # Nur Einträge übernehmen, deren Datei noch existiert
+        self._merge_locked(self._read())
+        if self._entries:
+            logger.info(f"💾 Derivation cache loaded: {len(self._entries)} entries")
+
+
+derivation_cache = DerivationCache() if DERIVATION_CACHE_ENABLED else None
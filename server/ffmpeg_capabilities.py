@@ -0,0 +1,191 @@
+"""
+FFmpeg Capabilities - Einmalige Erkennung von ffmpeg/ffprobe
+Version, Encoder, Decoder, Filter und Muxer werden beim Start (oder beim ersten Zugriff)
+ermittelt und gecacht; lokale Operationen wählen daraus ihren schnellsten Weg.
+"""
+
+import os
+import re
+import time
+import logging
+import threading
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+# Konfiguration
+FFMPEG_BINARY = os.getenv('FFMPEG_BINARY', 'ffmpeg')
+FFPROBE_BINARY = os.getenv('FFPROBE_BINARY', 'ffprobe')
+FFMPEG_PROBE_TIMEOUT = float(os.getenv('FFMPEG_PROBE_TIMEOUT', 10))
+
+VERSION_RE = re.compile(r'version\s+(\S+)')
+# Encoder/Decoder: " V....D libx264   ..." - Filter: " TSC acrossfade  AA->A ..." - Muxer: "  E mp4   ..."
+CODEC_LINE_RE = re.compile(r'^\s*[VASDFXBI.]{6}\s+(\S+)')
+FILTER_LINE_RE = re.compile(r'^\s*[TSC.|]{2,3}\s+(\S+)\s+\S+->\S+')
+FORMAT_LINE_RE = re.compile(r'^\s*D?E\s+(\S+)')
+
+
+def _run(binary, *args):
+    """Startet ein Binary und gibt stdout zurück (None wenn nicht vorhanden/fehlgeschlagen)"""
+    try:
+        result = subprocess.run(
+            [binary, '-hide_banner', *args],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+            timeout=FFMPEG_PROBE_TIMEOUT
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.debug(f"{binary} {' '.join(args)} failed: {e}")
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout
+
+
+def _parse_list(output, pattern):
+    """Namen aus einer ffmpeg-Liste (-encoders, -filters, -muxers) - nur Zeilen nach dem Trenner"""
+    names = set()
+    if not output:
+        return names
+    # Die Legende endet mit ' ------' (Codecs) bzw. ' --' (Formate); Filter haben keinen Trenner
+    started = pattern is FILTER_LINE_RE
+    for line in output.splitlines():
+        if not started:
+            started = line.strip().startswith('--')
+            continue
+        match = pattern.match(line)
+        if match:
+            names.update(match.group(1).split(','))
+    return names
+
+
+class FFmpegCapabilities:
+    """Ergebnis eines Probes: was das installierte ffmpeg/ffprobe kann"""
+
+    def __init__(self, ffmpeg_binary=FFMPEG_BINARY, ffprobe_binary=FFPROBE_BINARY):
+        self.ffmpeg_binary = ffmpeg_binary
+        self.ffprobe_binary = ffprobe_binary
+        self.available = False
+        self.version = None
+        self.configuration = set()
+        self.ffprobe_available = False
+        self.ffprobe_version = None
+        self.encoders = set()
+        self.decoders = set()
+        self.filters = set()
+        self.muxers = set()
+        self.cpu_count = os.cpu_count() or 1
+        self.probed_at = None
+        self.probe_seconds = 0.0
+
+    def probe(self):
+        """Fragt die Binaries einmal ab (ca. 5 kurze Prozessaufrufe)"""
+        start = time.time()
+
+        version_output = _run(self.ffmpeg_binary, '-version')
+        self.available = version_output is not None
+        if self.available:
+            match = VERSION_RE.search(version_output)
+            self.version = match.group(1) if match else 'unknown'
+            for line in version_output.splitlines():
+                if line.startswith('configuration:'):
+                    self.configuration = set(line.split(':', 1)[1].split())
+            self.encoders = _parse_list(_run(self.ffmpeg_binary, '-encoders'), CODEC_LINE_RE)
+            self.decoders = _parse_list(_run(self.ffmpeg_binary, '-decoders'), CODEC_LINE_RE)
+            self.filters = _parse_list(_run(self.ffmpeg_binary, '-filters'), FILTER_LINE_RE)
+            self.muxers = _parse_list(_run(self.ffmpeg_binary, '-muxers'), FORMAT_LINE_RE)
+
+        probe_output = _run(self.ffprobe_binary, '-version')
+        self.ffprobe_available = probe_output is not None
+        if self.ffprobe_available:
+            match = VERSION_RE.search(probe_output)
+            self.ffprobe_version = match.group(1) if match else 'unknown'
+
+        self.probed_at = time.time()
+        self.probe_seconds = round(self.probed_at - start, 3)
+        return self
+
+    @property
+    def threads(self):
+        """Multithreading verfügbar (pthreads/w32threads nicht explizit deaktiviert)"""
+        return self.available and '--disable-pthreads' not in self.configuration
+
+    def has_encoder(self, name):
+        return name in self.encoders
+
+    def has_filter(self, name):
+        return name in self.filters
+
+    def has_muxer(self, name):
+        return name in self.muxers
+
+    def pick_encoder(self, *candidates):
+        """Erster verfügbarer Encoder aus candidates (schnellster zuerst) oder None"""
+        for name in candidates:
+            if name in self.encoders:
+                return name
+        return None
+
+    def to_dict(self):
+        """Zusammenfassung für /api/metrics (ohne die vollständigen Listen)"""
+        return {
+            'available': self.available,
+            'version': self.version,
+            'ffprobe_available': self.ffprobe_available,
+            'ffprobe_version': self.ffprobe_version,
+            'threads': self.threads,
+            'cpu_count': self.cpu_count,
+            'encoders': len(self.encoders),
+            'decoders': len(self.decoders),
+            'filters': len(self.filters),
+            'muxers': len(self.muxers),
+            'probed_at': self.probed_at,
+            'probe_seconds': self.probe_seconds
+        }
+
+
+_capabilities = None
+_capabilities_lock = threading.Lock()
+
+
+def get_capabilities(refresh=False):
+    """Gibt die (gecachten) Fähigkeiten zurück; probt beim ersten Aufruf oder mit refresh=True"""
+    global _capabilities
+    with _capabilities_lock:
+        if _capabilities is None or refresh:
+            _capabilities = FFmpegCapabilities().probe()
+            if _capabilities.available:
+                logger.info(
+                    f"🎞️ FFmpeg {_capabilities.version}: {len(_capabilities.encoders)} encoders, "
+                    f"{len(_capabilities.filters)} filters, ffprobe: {_capabilities.ffprobe_available} "
+                    f"({_capabilities.probe_seconds}s)"
+                )
+            else:
+                logger.warning(f"FFmpeg not found ({FFMPEG_BINARY}) - local processing disabled")
+        return _capabilities
+
+
+def init_ffmpeg_capabilities():
+    """Probt ffmpeg/ffprobe beim Server-Start, damit der erste Request nicht wartet"""
+    return get_capabilities()
+
+
+def ffmpeg_available():
+    return get_capabilities().available
+
+
+def ffmpeg_command(*args):
+    """Kommandozeile mit dem konfigurierten Binary (FFMPEG_BINARY)"""
+    return [get_capabilities().ffmpeg_binary, *args]
+
+
+def ffprobe_command(*args):
+    """Kommandozeile mit dem konfigurierten ffprobe (FFPROBE_BINARY)"""
+    return [get_capabilities().ffprobe_binary, *args]
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    caps = get_capabilities()
+    print(caps.to_dict())
+    print("MP3 encoder:", caps.pick_encoder('libmp3lame', 'libshine', 'mp3'))
+    print("AAC encoder:", caps.pick_encoder('libfdk_aac', 'aac'))
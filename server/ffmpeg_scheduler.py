@@ -0,0 +1,186 @@
+"""
+FFmpeg Scheduler - Begrenzte, priorisierte Ausführung lokaler FFmpeg-Prozesse
+Alle lokalen FFmpeg-Aufrufe laufen hierüber: höchstens FFMPEG_MAX_CONCURRENT Prozesse
+gleichzeitig, jeder mit fester -threads Zuteilung, Warteschlange nach Priorität, Timeouts.
+"""
+
+import os
+import time
+import heapq
+import logging
+import itertools
+import threading
+import subprocess
+from ffmpeg_capabilities import get_capabilities
+
+logger = logging.getLogger(__name__)
+
+# Konfiguration
+CPU_COUNT = os.cpu_count() or 1
+FFMPEG_MAX_CONCURRENT = int(os.getenv('FFMPEG_MAX_CONCURRENT', max(1, CPU_COUNT // 2)))
+FFMPEG_THREADS_PER_JOB = int(os.getenv('FFMPEG_THREADS_PER_JOB', max(1, CPU_COUNT // FFMPEG_MAX_CONCURRENT)))
+FFMPEG_TIMEOUT = float(os.getenv('FFMPEG_TIMEOUT', 600))
+
+# Prioritäten (kleiner = früher)
+PRIORITY_INTERACTIVE = 0   # Thumbnails, Screenshots - jemand wartet im UI
+PRIORITY_NORMAL = 5
+PRIORITY_BATCH = 10        # Lange Renderings, Batch-Jobs
+
+# FFmpeg-Optionen ohne Wert - alle anderen Optionen verbrauchen das nächste Argument
+FLAG_OPTIONS = {
+    '-y', '-n', '-hide_banner', '-nostdin', '-nostats', '-stats', '-shortest', '-re',
+    '-vn', '-an', '-sn', '-dn', '-copyts', '-start_at_zero', '-accurate_seek', '-noaccurate_seek'
+}
+
+
+class FFmpegTimeout(Exception):
+    """FFmpeg hat das Zeitlimit überschritten (Prozess wurde beendet)"""
+
+
+class FFmpegScheduler:
+    """Prioritäts-Semaphore vor subprocess.run für FFmpeg/ffprobe"""
+
+    def __init__(self, max_concurrent=FFMPEG_MAX_CONCURRENT, threads_per_job=FFMPEG_THREADS_PER_JOB):
+        self.max_concurrent = max(1, max_concurrent)
+        self.threads_per_job = max(1, threads_per_job)
+        self._cond = threading.Condition()
+        self._running = 0
+        self._waiting = []  # Heap aus (priority, seq)
+        self._seq = itertools.count()
+        self._stats = {
+            'completed': 0, 'failed': 0, 'timeouts': 0,
+            'max_queue_depth': 0, 'wait_seconds': 0.0, 'run_seconds': 0.0
+        }
+
+    def _acquire(self, priority):
+        ticket = (priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], len(self._waiting))
+            try:
+                while self._running >= self.max_concurrent or self._waiting[0] != ticket:
+                    self._cond.wait()
+            except BaseException:
+                # Abgebrochenes Warten (z.B. KeyboardInterrupt) - Ticket darf niemanden blockieren
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+                raise
+            heapq.heappop(self._waiting)
+            self._running += 1
+            # Der Nächste in der Schlange darf prüfen, ob noch ein Slot frei ist
+            self._cond.notify_all()
+
+    def _release(self):
+        with self._cond:
+            self._running -= 1
+            self._cond.notify_all()
+
+    def with_threads(self, cmd):
+        """
+        Setzt '-threads N' vor jede Ausgabedatei (Encoder-Threads), falls nicht schon angegeben
+
+        Ausgaben sind die Positionsargumente, die nicht Wert einer Option sind -
+        so bekommen auch Mehrfach-Ausgaben (Thumbnails) alle dasselbe Limit.
+        """
+        if '-threads' in cmd or not get_capabilities().threads or len(cmd) < 2:
+            return list(cmd)
+        threads = ['-threads', str(self.threads_per_job)]
+        result = [cmd[0]]
+        expects_value = False
+        for arg in cmd[1:]:
+            if expects_value:
+                expects_value = False
+            elif arg.startswith('-') and arg != '-':
+                expects_value = arg not in FLAG_OPTIONS
+            else:
+                result += threads
+            result.append(arg)
+        return result
+
+    def run(self, cmd, priority=PRIORITY_NORMAL, timeout=FFMPEG_TIMEOUT, threads=True, label=None):
+        """
+        Führt ein FFmpeg-Kommando aus, sobald ein Slot frei ist
+
+        Args:
+            cmd: Kommando als Liste
+            priority: PRIORITY_INTERACTIVE / PRIORITY_NORMAL / PRIORITY_BATCH
+            timeout: Sekunden Laufzeit (ohne Wartezeit), danach wird der Prozess beendet
+            threads: '-threads' anhängen (False z.B. für ffprobe)
+            label: Name für Logs
+
+        Returns:
+            subprocess.CompletedProcess (stdout/stderr als Text)
+
+        Raises:
+            FFmpegTimeout: Zeitlimit überschritten
+        """
+        if threads:
+            cmd = self.with_threads(cmd)
+        label = label or os.path.basename(cmd[0])
+
+        queued_at = time.time()
+        self._acquire(priority)
+        started_at = time.time()
+        wait_seconds = started_at - queued_at
+        if wait_seconds > 1:
+            logger.info(f"⏳ {label} waited {wait_seconds:.1f}s for an FFmpeg slot")
+
+        try:
+            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self._record(wait_seconds, started_at, 'timeouts')
+            logger.error(f"⏱️ {label} killed after {timeout}s")
+            raise FFmpegTimeout(f"FFmpeg Zeitlimit überschritten ({timeout:g}s)")
+        except BaseException:
+            self._record(wait_seconds, started_at, 'failed')
+            raise
+        finally:
+            self._release()
+
+        self._record(wait_seconds, started_at, 'completed' if result.returncode == 0 else 'failed')
+        return result
+
+    def _record(self, wait_seconds, started_at, outcome):
+        with self._cond:
+            self._stats[outcome] += 1
+            self._stats['wait_seconds'] += wait_seconds
+            self._stats['run_seconds'] += time.time() - started_at
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['running'] = self._running
+            stats['queued'] = len(self._waiting)
+        finished = stats['completed'] + stats['failed'] + stats['timeouts']
+        stats['avg_wait_seconds'] = round(stats['wait_seconds'] / finished, 3) if finished else 0.0
+        stats['avg_run_seconds'] = round(stats['run_seconds'] / finished, 3) if finished else 0.0
+        stats['wait_seconds'] = round(stats['wait_seconds'], 1)
+        stats['run_seconds'] = round(stats['run_seconds'], 1)
+        stats['max_concurrent'] = self.max_concurrent
+        stats['threads_per_job'] = self.threads_per_job
+        return stats
+
+
+_scheduler = None
+_scheduler_pid = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Scheduler des aktuellen Prozesses (Worker-Prozesse haben ihr eigenes Limit)"""
+    global _scheduler, _scheduler_pid
+    with _scheduler_lock:
+        if _scheduler is None or _scheduler_pid != os.getpid():
+            _scheduler = FFmpegScheduler()
+            _scheduler_pid = os.getpid()
+            logger.info(
+                f"🎛️ FFmpeg scheduler: {_scheduler.max_concurrent} parallel, "
+                f"{_scheduler.threads_per_job} threads each"
+            )
+        return _scheduler
+
+
+def run_ffmpeg(cmd, priority=PRIORITY_NORMAL, timeout=FFMPEG_TIMEOUT, threads=True, label=None):
+    """Kurzform für get_scheduler().run(...)"""
+    return get_scheduler().run(cmd, priority=priority, timeout=timeout, threads=threads, label=label)
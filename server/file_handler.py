@@ -3,11 +3,20 @@ File Handler - Upload und Storage Management
 """
 
 import os
+import re
+import json
+import time
+import atexit
 import uuid
+import hashlib
 import logging
+import threading
+from contextlib import contextmanager
 from werkzeug.utils import secure_filename
-from flask import url_for
-from utils import get_lan_ip
+from werkzeug.security import safe_join
+from flask import url_for, request, send_file, abort, make_response
+import mimetypes
+from utils import get_lan_ip, file_lock
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +27,17 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__)) # server/
 PROJECT_DIR = os.path.dirname(BASE_DIR)              # root/
 UPLOAD_FOLDER = os.path.join(PROJECT_DIR, 'uploads')
 MAX_FILE_SIZE = int(os.getenv('MAX_FILE_SIZE', 500 * 1024 * 1024))  # 500MB default
+UPLOAD_INDEX_PATH = os.getenv('UPLOAD_INDEX_PATH', os.path.join(BASE_DIR, 'upload_index.json'))
+UPLOAD_INDEX_SAVE_INTERVAL = 5  # Sekunden zwischen zwei Schreibvorgängen
+HASH_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+SHA256_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+# Auslieferung von /uploads: 'direct' (Python, mit Range/ETag), 'accel' (nginx X-Accel-Redirect)
+# oder 'sendfile' (Apache/lighttpd X-Sendfile)
+UPLOAD_SERVE_MODE = os.getenv('UPLOAD_SERVE_MODE', 'direct').lower()
+UPLOAD_ACCEL_PREFIX = os.getenv('UPLOAD_ACCEL_PREFIX', '/protected-uploads/')
+UPLOAD_MAX_AGE = int(os.getenv('UPLOAD_MAX_AGE', 3600))
 
 ALLOWED_EXTENSIONS = {
     'video': {'mp4', 'avi', 'mov', 'mkv', 'webm', 'flv'},
@@ -58,9 +78,297 @@ def get_file_size_mb(size_bytes):
     return round(size_bytes / (1024 * 1024), 2)
 
 
+class UploadIndex:
+    """
+    Index und Referenzzähler für inhaltsadressierte Uploads (<sha256>.<ext>)
+    
+    Laufende Jobs und Ableitungen halten Referenzen (acquire/release bzw. hold);
+    cleanup_old_files löscht eine Datei erst, wenn keine Referenz mehr besteht und
+    die letzte Nutzung (Upload, Hash-Treffer oder Ende eines Jobs) älter als die TTL ist.
+    Referenzen leben nur im Speicher - nach einem Neustart läuft kein Job mehr.
+    """
+    
+    def __init__(self, path=UPLOAD_INDEX_PATH):
+        self.path = path
+        self._entries = {}  # stored_filename -> {'sha256', 'size', 'created_at', 'last_ref'}
+        self._refs = {}  # stored_filename -> Anzahl laufender Jobs/Ableitungen
+        self._removed = {}  # stored_filename -> Zeitpunkt von remove() (seit dem letzten save)
+        self._lock = threading.Lock()
+        self._last_save = 0
+        self._dirty = False
+        self._stats = {'stores': 0, 'dedup_hits': 0, 'precheck_hits': 0, 'precheck_misses': 0, 'bytes_saved': 0}
+        self._load()
+        atexit.register(self.save)
+    
+    def get(self, stored_filename):
+        with self._lock:
+            entry = self._entries.get(stored_filename)
+            return dict(entry) if entry else None
+    
+    def touch(self, stored_filename, sha256, size, reason='stores'):
+        """Registriert eine Nutzung (verlängert die TTL); reason: 'stores', 'dedup_hits' oder 'precheck_hits'"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.setdefault(stored_filename, {
+                'sha256': sha256,
+                'size': size,
+                'created_at': now
+            })
+            entry['last_ref'] = now
+            self._stats[reason] += 1
+            if reason != 'stores':
+                self._stats['bytes_saved'] += size
+            self._dirty = True
+            entry = dict(entry)
+        self._save_if_due()
+        return entry
+    
+    def acquire(self, stored_filenames):
+        """Markiert Dateien als in Benutzung - cleanup_old_files lässt sie liegen"""
+        with self._lock:
+            for name in stored_filenames:
+                self._refs[name] = self._refs.get(name, 0) + 1
+    
+    def release(self, stored_filenames):
+        """Gibt Referenzen aus acquire() frei; die TTL zählt ab jetzt"""
+        now = time.time()
+        with self._lock:
+            for name in stored_filenames:
+                count = self._refs.get(name, 0) - 1
+                if count > 0:
+                    self._refs[name] = count
+                else:
+                    self._refs.pop(name, None)
+                entry = self._entries.get(name)
+                if entry:
+                    entry['last_ref'] = now
+                    self._dirty = True
+        self._save_if_due()
+    
+    @contextmanager
+    def hold(self, stored_filenames):
+        """acquire() für die Dauer eines with-Blocks"""
+        stored_filenames = list(stored_filenames)
+        self.acquire(stored_filenames)
+        try:
+            yield
+        finally:
+            self.release(stored_filenames)
+    
+    def in_use(self, stored_filename):
+        with self._lock:
+            return self._refs.get(stored_filename, 0) > 0
+    
+    def count_miss(self):
+        with self._lock:
+            self._stats['precheck_misses'] += 1
+    
+    def remove(self, stored_filename):
+        with self._lock:
+            if self._entries.pop(stored_filename, None) is not None:
+                self._removed[stored_filename] = time.time()
+                self._dirty = True
+        self._save_if_due()
+    
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['files'] = len(self._entries)
+            stats['refs'] = sum(self._refs.values())
+            stats['files_in_use'] = len(self._refs)
+            stats['bytes_stored'] = sum(entry['size'] for entry in self._entries.values())
+        return stats
+    
+    def save(self):
+        """
+        Schreibt den Index atomar auf die Platte (nur wenn sich etwas geändert hat)
+        
+        Mehrere Server-Prozesse teilen sich die Datei: unter einem Datei-Lock wird der Stand
+        auf der Platte neu gelesen und zusammengeführt, damit kein Prozess die Einträge
+        eines anderen überschreibt. Jeder Schreiber nutzt eine eigene .tmp-Datei.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            self._last_save = time.time()
+        
+        tmp_path = f"{self.path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            with file_lock(self.path):
+                on_disk = self._read()
+                with self._lock:
+                    self._merge_locked(on_disk)
+                    data = {name: dict(entry) for name, entry in self._entries.items()}
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"Upload index save failed: {e}")
+            with self._lock:
+                self._dirty = True
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    
+    def _merge_locked(self, on_disk):
+        """Übernimmt Einträge anderer Prozesse; bei gemeinsamen Dateien gilt die jüngste Nutzung"""
+        removed, self._removed = self._removed, {}
+        for name, entry in on_disk.items():
+            entry.pop('refs', None)  # Alte Indizes: Zähler wurde früher mitgespeichert
+            current = self._entries.get(name)
+            if current is not None:
+                current['last_ref'] = max(current.get('last_ref', 0), entry.get('last_ref', 0))
+            elif name in removed and entry.get('last_ref', 0) <= removed[name]:
+                continue  # hier gelöscht, seitdem nirgends mehr genutzt
+            elif os.path.isfile(os.path.join(UPLOAD_FOLDER, name)):
+                self._entries[name] = entry
+    
+    def _save_if_due(self):
+        # Gebündelt statt bei jeder Referenz den ganzen Index neu zu schreiben
+        if time.time() - self._last_save >= UPLOAD_INDEX_SAVE_INTERVAL:
+            self.save()
+    
+    def _read(self):
+        """Index auf der Platte ({stored_filename: entry}); leer, wenn nicht vorhanden oder unlesbar"""
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Upload index load failed: {e}")
+            return {}
+    
+    def _load(self):
+        # Nur Einträge übernehmen, deren Datei noch existiert
+        self._merge_locked(self._read())
+
+
+upload_index = UploadIndex()
+
+
+def get_file_url(stored_filename):
+    """Öffentliche URL einer Datei im Upload-Ordner (für Container erreichbar)"""
+    host_ip = get_lan_ip()
+    return f"http://{host_ip}:5000/uploads/{stored_filename}"
+
+
+def build_file_info(original_filename, stored_filename, size, sha256=None, deduplicated=False):
+    """Einheitliches file_info-Dict für hochgeladene oder wiederverwendete Dateien"""
+    ext = stored_filename.rsplit('.', 1)[1].lower() if '.' in stored_filename else ''
+    return {
+        'filename': original_filename,
+        'stored_filename': stored_filename,
+        'url': get_file_url(stored_filename),
+        'type': ext,
+        'file_type': get_file_type(original_filename),
+        'size': size,
+        'size_mb': get_file_size_mb(size),
+        'sha256': sha256,
+        'deduplicated': deduplicated
+    }
+
+
+def store_stream(stream, original_filename):
+    """
+    Schreibt einen Datenstrom in den Upload-Ordner und hasht ihn dabei (SHA-256)
+    
+    Die Datei landet unter <sha256>.<ext>; existiert der Inhalt schon, wird die
+    neue Kopie verworfen und nur eine Referenz gezählt.
+    
+    Args:
+        stream: Datei-artiges Objekt mit read()
+        original_filename: Bereinigter Original-Dateiname (für die Extension)
+    
+    Returns:
+        file_info (siehe handle_upload)
+    """
+    init_upload_folder()
+    tmp_path = os.path.join(UPLOAD_FOLDER, f".upload-{uuid.uuid4()}.tmp")
+    
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, 'wb') as f:
+            while True:
+                chunk = stream.read(HASH_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_FILE_SIZE:
+                    raise ValueError(f"Datei zu groß: > {get_file_size_mb(MAX_FILE_SIZE)}MB")
+                digest.update(chunk)
+                f.write(chunk)
+        
+        return commit_file(tmp_path, original_filename, digest.hexdigest(), size)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def commit_file(tmp_path, original_filename, sha256, size):
+    """
+    Übernimmt eine fertig geschriebene Datei als <sha256>.<ext> in den Upload-Ordner
+    
+    tmp_path muss auf demselben Dateisystem liegen (os.replace statt Kopie).
+    Existiert der Inhalt schon, wird tmp_path gelöscht und nur eine Referenz gezählt.
+    
+    Returns:
+        file_info (siehe handle_upload)
+    """
+    ext = original_filename.rsplit('.', 1)[1].lower()
+    stored_filename = f"{sha256}.{ext}"
+    filepath = os.path.join(UPLOAD_FOLDER, stored_filename)
+    
+    if os.path.isfile(filepath):
+        os.remove(tmp_path)
+        deduplicated = True
+        upload_index.touch(stored_filename, sha256, size, reason='dedup_hits')
+        logger.info(f"♻️ Upload deduplicated: {original_filename} → {stored_filename}")
+    else:
+        os.replace(tmp_path, filepath)
+        deduplicated = False
+        upload_index.touch(stored_filename, sha256, size)
+    
+    return build_file_info(original_filename, stored_filename, size, sha256, deduplicated)
+
+
+def lookup_upload(sha256, filename):
+    """
+    Hash-Vorabprüfung: Gibt file_info zurück, wenn der Inhalt schon auf dem Server liegt
+    
+    Args:
+        sha256: Hex-Digest des Datei-Inhalts
+        filename: Original-Dateiname (bestimmt die Extension)
+    
+    Returns:
+        file_info (mit 'deduplicated': True) oder None
+    """
+    sha256 = (sha256 or '').lower()
+    if not SHA256_PATTERN.match(sha256):
+        raise ValueError("Ungültiger SHA-256 Hash")
+    if not allowed_file(filename or ''):
+        raise ValueError(f"Dateityp nicht erlaubt: {filename}")
+    
+    original_filename = secure_filename(filename)
+    ext = original_filename.rsplit('.', 1)[1].lower()
+    stored_filename = f"{sha256}.{ext}"
+    filepath = os.path.join(UPLOAD_FOLDER, stored_filename)
+    
+    if not os.path.isfile(filepath):
+        upload_index.count_miss()
+        return None
+    
+    size = os.path.getsize(filepath)
+    upload_index.touch(stored_filename, sha256, size, reason='precheck_hits')
+    logger.info(f"♻️ Upload pre-check hit: {original_filename} → {stored_filename}")
+    return build_file_info(original_filename, stored_filename, size, sha256, deduplicated=True)
+
+
 def handle_upload(file):
     """
-    Verarbeitet File-Upload
+    Verarbeitet File-Upload (inhaltsadressiert, gleiche Inhalte werden nur einmal gespeichert)
     
     Args:
         file: Werkzeug FileStorage object
@@ -68,12 +376,14 @@ def handle_upload(file):
     Returns:
         {
             'filename': 'original.mp4',
-            'stored_filename': 'abc123.mp4',
-            'url': 'http://localhost:5000/uploads/abc123.mp4',
+            'stored_filename': '<sha256>.mp4',
+            'url': 'http://localhost:5000/uploads/<sha256>.mp4',
             'type': 'mp4',
             'file_type': 'video',
             'size': 1024000,
-            'size_mb': 1.02
+            'size_mb': 1.02,
+            'sha256': '<sha256>',
+            'deduplicated': False
         }
     """
     
@@ -93,46 +403,79 @@ def handle_upload(file):
         actual_mb = get_file_size_mb(file_size)
         raise ValueError(f"Datei zu groß: {actual_mb}MB (max: {max_mb}MB)")
     
-    # Generate unique filename
+    # Save file (Hash wird beim Schreiben berechnet)
     original_filename = secure_filename(file.filename)
-    ext = original_filename.rsplit('.', 1)[1].lower()
-    stored_filename = f"{uuid.uuid4()}.{ext}"
-    filepath = os.path.join(UPLOAD_FOLDER, stored_filename)
+    file_info = store_stream(file.stream, original_filename)
     
-    # Save file
-    init_upload_folder()
-    file.save(filepath)
+    logger.info(f"File uploaded: {original_filename} → {file_info['stored_filename']} ({file_info['size_mb']}MB)")
+    logger.info(f"Generated File URL: {file_info['url']}")
     
-    logger.info(f"File uploaded: {original_filename} → {stored_filename} ({get_file_size_mb(file_size)}MB)")
+    return file_info
+
+
+def send_upload(filename):
+    """
+    Liefert eine Datei aus dem Upload-Ordner aus
     
-    host_ip = get_lan_ip()
-    base_url = f"http://{host_ip}:5000"
+    - Range-Requests (206) und If-Range für Video-Seeking und fortgesetzte Downloads
+    - ETag/Last-Modified mit 304; inhaltsadressierte Dateien (<sha256>.<ext>) bekommen
+      den Hash als starkes ETag und sind unveränderlich (immutable)
+    - UPLOAD_SERVE_MODE 'accel'/'sendfile' überlässt die Übertragung dem Front-Proxy
     
-    # Fallback to host.docker.internal if detection fails (e.g. offline)
-    file_url = f"{base_url}/uploads/{stored_filename}"
+    Args:
+        filename: Pfad relativ zum Upload-Ordner
+    """
+    # Versteckte Pfade (.partial/, .upload-*.tmp) nie ausliefern
+    if any(part.startswith('.') for part in filename.replace('\\', '/').split('/')):
+        abort(404)
     
-    logger.info(f"Generated File URL: {file_url} (Host IP: {host_ip})")
+    filepath = safe_join(UPLOAD_FOLDER, filename)
+    if filepath is None or not os.path.isfile(filepath):
+        abort(404)
     
-    return {
-        'filename': original_filename,
-        'stored_filename': stored_filename,
-        'url': file_url,
-        'type': ext,
-        'file_type': get_file_type(original_filename),
-        'size': file_size,
-        'size_mb': get_file_size_mb(file_size)
-    }
+    stem = os.path.basename(filename).rsplit('.', 1)[0]
+    content_addressed = bool(SHA256_PATTERN.match(stem))
+    etag = stem if content_addressed else True
+    max_age = 31536000 if content_addressed else UPLOAD_MAX_AGE
+    
+    if UPLOAD_SERVE_MODE in ('accel', 'sendfile'):
+        stat = os.stat(filepath)
+        response = make_response('')
+        response.headers['Content-Type'] = mimetypes.guess_type(filepath)[0] or 'application/octet-stream'
+        if UPLOAD_SERVE_MODE == 'accel':
+            response.headers['X-Accel-Redirect'] = UPLOAD_ACCEL_PREFIX.rstrip('/') + '/' + filename.lstrip('/')
+        else:
+            response.headers['X-Sendfile'] = os.path.abspath(filepath)
+        response.last_modified = stat.st_mtime
+        response.set_etag(stem if content_addressed else f"{int(stat.st_mtime)}-{stat.st_size}")
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        if content_addressed:
+            response.cache_control.immutable = True
+        # 304 schon hier - der Proxy muss die Datei dann gar nicht anfassen
+        response.make_conditional(request.environ)
+        if response.status_code == 304:
+            response.headers.pop('X-Accel-Redirect', None)
+            response.headers.pop('X-Sendfile', None)
+        return response
+    
+    response = send_file(filepath, conditional=True, etag=etag, max_age=max_age)
+    response.cache_control.public = True
+    if content_addressed:
+        response.cache_control.immutable = True
+    return response
 
 
 def cleanup_old_files(max_age_hours=24):
     """
     Löscht alte Dateien aus dem Upload-Ordner
     
+    Dateien mit laufenden Referenzen (Jobs, Ableitungen) bleiben liegen; für
+    inhaltsadressierte Dateien zählt die letzte Nutzung, nicht das Datei-Alter.
+    
     Args:
         max_age_hours: Maximales Alter in Stunden
     """
-    import time
-    
     if not os.path.exists(UPLOAD_FOLDER):
         return
     
@@ -143,18 +486,28 @@ def cleanup_old_files(max_age_hours=24):
     for filename in os.listdir(UPLOAD_FOLDER):
         filepath = os.path.join(UPLOAD_FOLDER, filename)
         
+        if filename.startswith('.'):
+            continue
+        
         if os.path.isfile(filepath):
-            file_age = current_time - os.path.getmtime(filepath)
+            if upload_index.in_use(filename):
+                continue
+            entry = upload_index.get(filename)
+            last_used = entry['last_ref'] if entry else os.path.getmtime(filepath)
+            file_age = current_time - last_used
             
             if file_age > max_age_seconds:
                 try:
                     os.remove(filepath)
+                    if entry:
+                        upload_index.remove(filename)
                     deleted_count += 1
                     logger.info(f"Deleted old file: {filename}")
                 except Exception as e:
                     logger.error(f"Failed to delete {filename}: {e}")
     
     if deleted_count > 0:
+        upload_index.save()
         logger.info(f"Cleanup: {deleted_count} files deleted")
 
 
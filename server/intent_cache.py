@@ -0,0 +1,188 @@
+"""
+Intent Cache - Cache für LLM-Intent-Erkennung
+Gleiche Befehle mit gleicher Datei-Signatur (Anzahl + Typen) liefern dasselbe Template;
+Datei-URLs werden als USE_UPLOADED_FILE_n gespeichert und beim Treffer neu eingesetzt.
+"""
+
+import os
+import re
+import copy
+import json
+import time
+import atexit
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Konfiguration
+INTENT_CACHE_ENABLED = os.getenv('INTENT_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+INTENT_CACHE_SIZE = int(os.getenv('INTENT_CACHE_SIZE', 1000))
+INTENT_CACHE_TTL_HOURS = float(os.getenv('INTENT_CACHE_TTL_HOURS', 24))
+INTENT_CACHE_PATH = os.getenv('INTENT_CACHE_PATH', '')  # leer = nur im Speicher
+INTENT_CACHE_SAVE_INTERVAL = 5  # Sekunden zwischen zwei Schreibvorgängen
+
+PLACEHOLDER_PREFIX = 'USE_UPLOADED_FILE_'
+PLACEHOLDER_PATTERN = re.compile(rf'^{PLACEHOLDER_PREFIX}(\d+)$')
+
+
+def _file_kind(file):
+    """Normalisierter Typ einer hochgeladenen Datei ('mp4', 'audio/mp3' → 'mp3', ...)"""
+    kind = (file.get('type') or '').lower()
+    if '/' in kind:
+        kind = kind.split('/')[-1]
+    if not kind and '.' in file.get('filename', ''):
+        kind = file['filename'].rsplit('.', 1)[1].lower()
+    return kind
+
+
+def abstract_uploaded_files(obj, uploaded_files):
+    """Ersetzt Datei-URLs (rekursiv) durch USE_UPLOADED_FILE_n Platzhalter"""
+    url_index = {f['url']: i for i, f in enumerate(uploaded_files or []) if f.get('url')}
+
+    def walk(value):
+        if isinstance(value, str):
+            if value in url_index:
+                return f"{PLACEHOLDER_PREFIX}{url_index[value]}"
+            return value
+        if isinstance(value, list):
+            return [walk(v) for v in value]
+        if isinstance(value, dict):
+            return {k: walk(v) for k, v in value.items()}
+        return value
+
+    return walk(obj)
+
+
+def bind_uploaded_files(obj, uploaded_files):
+    """Setzt (rekursiv) die URLs der hochgeladenen Dateien für USE_UPLOADED_FILE_n ein"""
+    uploaded_files = uploaded_files or []
+
+    def walk(value):
+        if isinstance(value, str):
+            match = PLACEHOLDER_PATTERN.match(value)
+            if match and int(match.group(1)) < len(uploaded_files):
+                return uploaded_files[int(match.group(1))]['url']
+            return value
+        if isinstance(value, list):
+            return [walk(v) for v in value]
+        if isinstance(value, dict):
+            return {k: walk(v) for k, v in value.items()}
+        return value
+
+    return walk(obj)
+
+
+def make_key(user_message, uploaded_files=None):
+    """Cache-Key aus normalisierter Nachricht und Datei-Signatur"""
+    message = abstract_uploaded_files(user_message or '', uploaded_files)
+    message = re.sub(r'\s+', ' ', message.strip().lower()).rstrip('.!?')
+    signature = [_file_kind(f) for f in (uploaded_files or [])]
+    raw = json.dumps([message, signature], ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class IntentCache:
+    """LRU + TTL Cache für Intent-Templates mit optionaler Persistenz als JSON-Datei"""
+
+    def __init__(self, max_size=INTENT_CACHE_SIZE, ttl_hours=INTENT_CACHE_TTL_HOURS, path=INTENT_CACHE_PATH):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_hours * 3600
+        self.path = path
+        self._entries = OrderedDict()  # key -> (stored_at, template)
+        self._lock = threading.Lock()
+        self._last_save = 0
+        self._dirty = False
+        self._stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'expired': 0}
+
+        if self.path:
+            self._load()
+            atexit.register(self.save)
+
+    def get(self, user_message, uploaded_files=None):
+        """Gibt das gebundene Ergebnis zurück oder None"""
+        key = make_key(user_message, uploaded_files)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            stored_at, template = entry
+            if time.time() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self._dirty = True
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            template = copy.deepcopy(template)
+
+        return bind_uploaded_files(template, uploaded_files)
+
+    def put(self, user_message, uploaded_files, result):
+        """Speichert ein LLM-Ergebnis als Template"""
+        key = make_key(user_message, uploaded_files)
+        template = abstract_uploaded_files(copy.deepcopy(result), uploaded_files)
+        with self._lock:
+            self._entries[key] = (time.time(), template)
+            self._entries.move_to_end(key)
+            self._stats['stores'] += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+            self._dirty = True
+            save_due = self.path and time.time() - self._last_save >= INTENT_CACHE_SAVE_INTERVAL
+
+        if save_due:
+            self.save()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        stats['max_size'] = self.max_size
+        stats['persistent'] = bool(self.path)
+        return stats
+
+    def save(self):
+        """Schreibt den Cache atomar auf die Platte"""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = [[key, stored_at, template] for key, (stored_at, template) in self._entries.items()]
+            self._dirty = False
+            self._last_save = time.time()
+
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"Intent cache save failed: {e}")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Intent cache load failed: {e}")
+            return
+
+        cutoff = time.time() - self.ttl_seconds
+        for key, stored_at, template in data[-self.max_size:]:
+            if stored_at >= cutoff:
+                self._entries[key] = (stored_at, template)
+        logger.info(f"💾 Intent cache loaded: {len(self._entries)} entries")
+
+
+intent_cache = IntentCache() if INTENT_CACHE_ENABLED else None
@@ -0,0 +1,177 @@
+"""
+Intent Rules - Deterministische Intent-Erkennung für eindeutige Befehle
+Vorkompilierte Regeln laufen vor dem LLM; nur bei keinem oder mehrdeutigem Treffer wird Gemini gefragt.
+"""
+
+import os
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Konfiguration
+INTENT_RULES_ENABLED = os.getenv('INTENT_RULES_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+INTENT_RULES_MIN_CONFIDENCE = float(os.getenv('INTENT_RULES_MIN_CONFIDENCE', 0.9))
+MAX_REPEAT = int(os.getenv('MAX_REPEAT', 100))
+
+VIDEO_EXTENSIONS = ('mp4', 'mov', 'avi', 'mkv', 'webm', 'flv')
+AUDIO_EXTENSIONS = ('mp3', 'wav', 'aac', 'm4a', 'ogg', 'flac')
+
+URL_RE = re.compile(r'https?://[^\s]+')
+TEST_RE = re.compile(r'^\s*(bitte\s+)?(teste|test|check|prüfe?)\b(\s+(die|das|den|mal))?(\s+(api|verbindung|system|toolkit|server|container))?\s*[.!?]*\s*$', re.IGNORECASE)
+THUMBNAIL_RE = re.compile(r'\b(thumbnail|vorschaubild)\b', re.IGNORECASE)
+MP3_RE = re.compile(r'\bmp3\b', re.IGNORECASE)
+CONVERT_RE = re.compile(r'\b(konvertier\w*|convert\w*|umwandeln|wandle|extrahier\w*|extract\w*)\b', re.IGNORECASE)
+CONCAT_RE = re.compile(r'\b(hintereinander|aneinander|concat\w*|verkett\w*|loop|wiederhol\w*)\b', re.IGNORECASE)
+# Wörter, die auf andere Operationen hinweisen - dann ist keine Regel eindeutig
+MIXING_RE = re.compile(r'\b(video|film|mp4)\b.*\b(audio|ton|musik)\b|\b(audio|ton|musik)\b.*\b(video|film|mp4)\b', re.IGNORECASE)
+
+REPEAT_WORDS = {
+    'zweimal': 2, 'dreimal': 3, 'viermal': 4, 'fünfmal': 5, 'sechsmal': 6,
+    'siebenmal': 7, 'achtmal': 8, 'neunmal': 9, 'zehnmal': 10,
+    'twice': 2, 'thrice': 3
+}
+REPEAT_WORD_RE = re.compile(r'\b(' + '|'.join(REPEAT_WORDS) + r')\b', re.IGNORECASE)
+REPEAT_NUMBER_RE = re.compile(r'\b(\d{1,3})\s*(x|mal|times)\b', re.IGNORECASE)
+
+
+def _extension(value):
+    value = value.split('?', 1)[0]
+    return value.rsplit('.', 1)[1].lower() if '.' in value.rsplit('/', 1)[-1] else ''
+
+
+def _media_sources(user_message, uploaded_files):
+    """(url, extension) aller Medienquellen: hochgeladene Dateien, sonst URLs in der Nachricht"""
+    if uploaded_files:
+        return [(f['url'], _extension(f.get('filename') or f['url'])) for f in uploaded_files]
+    return [(url, _extension(url)) for url in URL_RE.findall(user_message)]
+
+
+def is_audio_url(value):
+    """True, wenn URL/Dateiname auf eine Endung aus AUDIO_EXTENSIONS zeigt"""
+    return isinstance(value, str) and _extension(value) in AUDIO_EXTENSIONS
+
+
+def parse_repeat_count(user_message):
+    """Erkennt Wiederholungen ('dreimal', '3x', '4 mal'); Default 1"""
+    match = REPEAT_WORD_RE.search(user_message)
+    if match:
+        return REPEAT_WORDS[match.group(1).lower()]
+    match = REPEAT_NUMBER_RE.search(user_message)
+    if match:
+        return max(1, int(match.group(1)))
+    return 1
+
+
+def validate_repeat(value):
+    """
+    Normalisiert eine Wiederholungsanzahl (None → 1)
+
+    Raises:
+        ValueError: Keine ganze Zahl oder außerhalb 1..MAX_REPEAT
+    """
+    try:
+        repeat = int(value or 1)
+    except (TypeError, ValueError):
+        raise ValueError(f"Ungültige Anzahl Wiederholungen: {value!r}")
+    if not 1 <= repeat <= MAX_REPEAT:
+        raise ValueError(f"Wiederholungen müssen zwischen 1 und {MAX_REPEAT} liegen")
+    return repeat
+
+
+def _rule_test(message, sources):
+    if sources or not TEST_RE.match(message):
+        return None
+    return {
+        'endpoint': '/v1/toolkit/test',
+        'params': {},
+        'confidence': 0.95,
+        'reasoning': 'Regel: Test-Befehl'
+    }
+
+
+def _rule_thumbnail(message, sources):
+    if not THUMBNAIL_RE.search(message):
+        return None
+    videos = [url for url, ext in sources if ext in VIDEO_EXTENSIONS]
+    if len(videos) != 1 or len(sources) != 1:
+        return None
+    return {
+        'endpoint': '/v1/video/thumbnail',
+        'params': {'url': videos[0]},
+        'confidence': 0.95,
+        'reasoning': 'Regel: Thumbnail aus genau einem Video'
+    }
+
+
+def _rule_mp3(message, sources):
+    if not (MP3_RE.search(message) and CONVERT_RE.search(message)) or MIXING_RE.search(message):
+        return None
+    media = [url for url, ext in sources if ext in VIDEO_EXTENSIONS + AUDIO_EXTENSIONS]
+    if len(media) != 1 or len(sources) != 1:
+        return None
+    return {
+        'endpoint': '/media-to-mp3',
+        'params': {'media_url': media[0]},
+        'confidence': 0.95,
+        'reasoning': 'Regel: MP3-Konvertierung einer Datei'
+    }
+
+
+def _rule_concat(message, sources):
+    if not CONCAT_RE.search(message) or not sources:
+        return None
+    count = parse_repeat_count(message)
+    urls = [url for url, _ in sources]
+    params = {}
+    if len(urls) == 1 and count > 1:
+        # Wiederholung explizit: eine Eingabe, die lokal geloopt wird (statt N-mal dieselbe URL)
+        params['repeat'] = count
+        media_urls = urls
+        reasoning = f'Regel: Datei {count}x hintereinander'
+    elif len(urls) > 1 and count == 1:
+        kinds = {ext in VIDEO_EXTENSIONS for _, ext in sources}
+        if len(kinds) != 1 or not all(ext in VIDEO_EXTENSIONS + AUDIO_EXTENSIONS for _, ext in sources):
+            # Gemischte Medien (Video + Audio) sind eher Mixing als Verkettung
+            return None
+        media_urls = urls
+        reasoning = f'Regel: {len(urls)} Dateien hintereinander'
+    else:
+        # Mehrere Dateien UND Wiederholung ist nicht eindeutig
+        return None
+    return {
+        'endpoint': '/combine-videos',
+        'params': dict(params, media_urls=media_urls),
+        'confidence': 0.9,
+        'reasoning': reasoning
+    }
+
+
+RULES = (
+    ('test', _rule_test),
+    ('thumbnail', _rule_thumbnail),
+    ('mp3', _rule_mp3),
+    ('concat', _rule_concat),
+)
+
+
+def match_rules(user_message, uploaded_files=None):
+    """
+    Wendet alle Regeln an
+
+    Returns:
+        Intent-Dict (mit 'rule') wenn genau eine Regel trifft, sonst None
+    """
+    sources = _media_sources(user_message, uploaded_files)
+    matches = []
+    for name, rule in RULES:
+        result = rule(user_message, sources)
+        if result:
+            result['rule'] = name
+            matches.append(result)
+
+    if len(matches) != 1:
+        if len(matches) > 1:
+            logger.info(f"Intent rules ambiguous: {[m['rule'] for m in matches]}")
+        return None
+    return matches[0]
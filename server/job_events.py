@@ -0,0 +1,186 @@
+"""
+Job Events - Server-Sent Events für Job-Fortschritt
+Verteilt Job-Updates an offene EventSource-Verbindungen statt Client-Polling.
+Updates aus anderen Server-Prozessen (gemeinsamer SQLite-Store) holt ein Poller
+aus dem Store; mit JOB_STORE=memory funktioniert SSE nur innerhalb eines Prozesses.
+"""
+
+import os
+import json
+import time
+import queue
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Konfiguration
+SSE_HEARTBEAT_SECONDS = float(os.getenv('SSE_HEARTBEAT_SECONDS', 15))
+SSE_QUEUE_SIZE = int(os.getenv('SSE_QUEUE_SIZE', 100))
+SSE_POLL_INTERVAL = float(os.getenv('SSE_POLL_INTERVAL', 1.0))  # Sekunden, nur bei geteiltem Store
+LAST_SEEN_MAX = 10000
+
+# Felder, die über den Stream gehen (ohne große Payloads wie 'result')
+EVENT_FIELDS = ('id', 'status', 'stage', 'progress', 'message', 'updated_at')
+TERMINAL_STATUSES = ('completed', 'failed')
+
+ALL_JOBS = '*'
+
+_subscribers = {}  # job_id oder ALL_JOBS -> set(queue.Queue)
+_subscribers_lock = threading.Lock()
+_last_seen = OrderedDict()  # job_id -> (updated_at, status) des zuletzt verteilten Updates
+_poller = None
+
+
+def subscribe(job_id=ALL_JOBS):
+    """Registriert einen Subscriber für einen Job (oder alle Jobs)"""
+    q = queue.Queue(maxsize=SSE_QUEUE_SIZE)
+    with _subscribers_lock:
+        _subscribers.setdefault(job_id, set()).add(q)
+    return q
+
+
+def unsubscribe(q, job_id=ALL_JOBS):
+    """Entfernt einen Subscriber"""
+    with _subscribers_lock:
+        subs = _subscribers.get(job_id)
+        if subs:
+            subs.discard(q)
+            if not subs:
+                del _subscribers[job_id]
+
+
+def subscriber_count():
+    """Anzahl offener Streams"""
+    with _subscribers_lock:
+        return sum(len(subs) for subs in _subscribers.values())
+
+
+def event_payload(job):
+    """Reduziert einen Job auf die Felder für den Event-Stream"""
+    payload = {key: job.get(key) for key in EVENT_FIELDS if key in job}
+    if job.get('status') in TERMINAL_STATUSES:
+        # Endzustand: Ergebnis einmalig mitschicken, damit der Client nicht nachladen muss
+        for key in ('result', 'intent', 'params'):
+            if key in job:
+                payload[key] = job[key]
+    return payload
+
+
+def _put(q, event):
+    """Legt ein Event ab; bei langsamen Clients wird das älteste verworfen"""
+    try:
+        q.put_nowait(event)
+    except queue.Full:
+        try:
+            q.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            q.put_nowait(event)
+        except queue.Full:
+            pass
+
+
+def publish(job, event_type='progress'):
+    """
+    Verteilt ein Job-Update an alle Subscriber des Jobs und des globalen Streams
+
+    Args:
+        job: Job-Dict (Snapshot nach dem Update)
+        event_type: 'progress' oder 'status'
+    """
+    job_id = job.get('id')
+    updated_at = job.get('updated_at') or 0
+    status = job.get('status')
+    with _subscribers_lock:
+        # Dasselbe Update kommt lokal und später noch einmal über den Store-Poller
+        seen = _last_seen.get(job_id)
+        if seen and updated_at <= seen[0] and status == seen[1]:
+            return
+        _last_seen[job_id] = (max(updated_at, seen[0]) if seen else updated_at, status)
+        _last_seen.move_to_end(job_id)
+        while len(_last_seen) > LAST_SEEN_MAX:
+            _last_seen.popitem(last=False)
+        targets = list(_subscribers.get(job_id, ())) + list(_subscribers.get(ALL_JOBS, ()))
+
+    if not targets:
+        return
+
+    event = (event_type, event_payload(job))
+    for q in targets:
+        _put(q, event)
+
+
+def start_store_poller(store, interval=SSE_POLL_INTERVAL, lag=1.0):
+    """
+    Verteilt Updates, die andere Server-Prozesse in den gemeinsamen Store geschrieben haben
+
+    Args:
+        store: JobStore mit changed_since() (SQLite)
+        interval: Sekunden zwischen zwei Abfragen (nur solange Streams offen sind)
+        lag: Zusätzliches Rückfenster - gepufferter Fortschritt landet verzögert im Store
+    """
+    global _poller
+    if _poller is not None:
+        return
+
+    def loop():
+        since = time.time()
+        while True:
+            time.sleep(interval)
+            polled_at = time.time()
+            if not subscriber_count():
+                since = polled_at
+                continue
+            try:
+                for job in store.changed_since(since - lag):
+                    with _subscribers_lock:
+                        seen = _last_seen.get(job.get('id'))
+                    publish(job, 'status' if not seen or seen[1] != job.get('status') else 'progress')
+                since = polled_at
+            except Exception as e:
+                logger.error(f"SSE store poll failed: {e}")
+
+    _poller = threading.Thread(target=loop, name='sse-store-poller', daemon=True)
+    _poller.start()
+    logger.info(f"📡 SSE: polling shared job store every {interval:g}s")
+
+
+def format_sse(event_type, data):
+    """Formatiert ein Event im text/event-stream Format"""
+    return f"event: {event_type}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def stream(q, job_id=ALL_JOBS, initial=None):
+    """
+    Generator für eine SSE-Response
+
+    Args:
+        q: Subscriber-Queue aus subscribe()
+        job_id: Job-ID oder ALL_JOBS
+        initial: Optionaler Job-Snapshot, der als erstes 'snapshot'-Event gesendet wird
+    """
+    try:
+        yield "retry: 3000\n\n"
+
+        if initial is not None:
+            yield format_sse('snapshot', event_payload(initial))
+            if job_id != ALL_JOBS and initial.get('status') in TERMINAL_STATUSES:
+                return
+
+        while True:
+            try:
+                event_type, data = q.get(timeout=SSE_HEARTBEAT_SECONDS)
+            except queue.Empty:
+                # Kommentar-Zeile hält Proxies und Browser-Verbindung offen
+                yield ": heartbeat\n\n"
+                continue
+
+            yield format_sse(event_type, data)
+
+            if job_id != ALL_JOBS and data.get('status') in TERMINAL_STATUSES:
+                return
+    finally:
+        unsubscribe(q, job_id)
@@ -0,0 +1,186 @@
+"""
+Job Runner - Asynchrone Ausführung von Jobs
+Führt lange Pipelines (LLM, Downloads, FFmpeg, NCA API) in einem Worker-Pool aus,
+damit HTTP-Threads sofort wieder frei sind.
+"""
+
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Konfiguration
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 4))
+JOB_EXECUTOR = os.getenv('JOB_EXECUTOR', 'thread').lower()  # 'thread' oder 'process'
+ASYNC_PROCESSING = os.getenv('ASYNC_PROCESSING', 'false').lower() in ('1', 'true', 'yes')
+
+_executor = None
+_executor_lock = threading.Lock()
+_update_callback = None
+
+# Nur im Prozess-Modus: Worker melden Fortschritt über diese Queue an den Server-Prozess
+_progress_queue = None
+_is_worker_process = False
+
+_stats = {
+    'submitted': 0,
+    'running': 0,
+    'completed': 0,
+    'failed': 0
+}
+_stats_lock = threading.Lock()
+
+
+def init_runner(update_callback):
+    """
+    Registriert die Funktion, mit der Job-Updates angewendet werden
+
+    Args:
+        update_callback: callable(job_id, fields) - schreibt Felder in den Job-Store
+    """
+    global _update_callback
+    _update_callback = update_callback
+
+
+def _init_worker_process(progress_queue):
+    """Initializer für Worker-Prozesse"""
+    global _progress_queue, _is_worker_process
+    _progress_queue = progress_queue
+    _is_worker_process = True
+
+
+def _progress_listener(progress_queue):
+    """Wendet Fortschrittsmeldungen aus Worker-Prozessen im Server-Prozess an"""
+    while True:
+        item = progress_queue.get()
+        if item is None:
+            break
+        job_id, fields = item
+        try:
+            _update_callback(job_id, fields)
+        except Exception as e:
+            logger.error(f"Job update from worker failed ({job_id}): {e}")
+
+
+def _get_executor():
+    """Erstellt den Worker-Pool beim ersten Gebrauch"""
+    global _executor, _progress_queue
+
+    with _executor_lock:
+        if _executor is not None:
+            return _executor
+
+        if JOB_EXECUTOR == 'process':
+            ctx = multiprocessing.get_context()
+            _progress_queue = ctx.Queue()
+            _executor = ProcessPoolExecutor(
+                max_workers=JOB_WORKERS,
+                mp_context=ctx,
+                initializer=_init_worker_process,
+                initargs=(_progress_queue,)
+            )
+            threading.Thread(
+                target=_progress_listener,
+                args=(_progress_queue,),
+                name='job-progress-listener',
+                daemon=True
+            ).start()
+        else:
+            _executor = ThreadPoolExecutor(
+                max_workers=JOB_WORKERS,
+                thread_name_prefix='job-worker'
+            )
+
+        logger.info(f"⚙️ Job worker pool started: {JOB_WORKERS} {JOB_EXECUTOR} workers")
+        return _executor
+
+
+def report_progress(job_id, **fields):
+    """
+    Meldet Fortschritt eines Jobs (z.B. progress, message, stage, status)
+    Funktioniert sowohl im Server-Prozess als auch in Worker-Prozessen.
+    """
+    if _is_worker_process:
+        _progress_queue.put((job_id, fields))
+    elif _update_callback:
+        _update_callback(job_id, fields)
+
+
+def submit_job(job_id, fn, *args, on_done=None):
+    """
+    Startet fn(job_id, *args) im Worker-Pool
+
+    Args:
+        job_id: ID des Jobs (wird bei unerwarteten Fehlern als failed markiert)
+        fn: Modul-Level-Funktion (muss im Prozess-Modus picklebar sein)
+        *args: Argumente (müssen im Prozess-Modus picklebar sein)
+        on_done: Optional - callable() im Server-Prozess, wenn der Job endet (auch bei Fehler/Abbruch)
+
+    Returns:
+        concurrent.futures.Future
+    """
+    executor = _get_executor()
+
+    with _stats_lock:
+        _stats['submitted'] += 1
+        _stats['running'] += 1
+
+    try:
+        future = executor.submit(fn, job_id, *args)
+    except BaseException:
+        with _stats_lock:
+            _stats['running'] -= 1
+        if on_done:
+            on_done()
+        raise
+
+    def _on_done(f):
+        with _stats_lock:
+            _stats['running'] -= 1
+        if on_done:
+            try:
+                on_done()
+            except Exception as e:
+                logger.error(f"Job done callback failed ({job_id}): {e}")
+        exc = RuntimeError('Job abgebrochen') if f.cancelled() else f.exception()
+        if exc is None:
+            with _stats_lock:
+                _stats['completed'] += 1
+            return
+
+        with _stats_lock:
+            _stats['failed'] += 1
+        logger.error(f"💥 Job {job_id} crashed in worker: {exc}")
+        if _update_callback:
+            _update_callback(job_id, {
+                'status': 'failed',
+                'stage': 'failed',
+                'message': str(exc)
+            })
+
+    future.add_done_callback(_on_done)
+    return future
+
+
+def get_runner_stats():
+    """Gibt Statistiken des Worker-Pools zurück"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['workers'] = JOB_WORKERS
+    stats['executor'] = JOB_EXECUTOR
+    stats['queued'] = max(0, stats['running'] - JOB_WORKERS)
+    return stats
+
+
+def shutdown_runner(wait=True):
+    """Beendet den Worker-Pool"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+            _executor = None
+        if _progress_queue is not None:
+            _progress_queue.put(None)
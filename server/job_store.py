@@ -0,0 +1,461 @@
+"""
+Job Store - Speicherung des Job-Status
+Backends: In-Memory (Default) oder SQLite (WAL, mehrere Server-Prozesse teilen sich die Jobs)
+"""
+
+import os
+import json
+import time
+import base64
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Konfiguration
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+JOB_STORE = os.getenv('JOB_STORE', 'memory').lower()  # 'memory' oder 'sqlite'
+JOB_STORE_PATH = os.getenv('JOB_STORE_PATH', os.path.join(BASE_DIR, 'jobs.db'))
+JOB_TTL_HOURS = float(os.getenv('JOB_TTL_HOURS', 24))
+JOB_MAX_FINISHED = int(os.getenv('JOB_MAX_FINISHED', 1000))
+JOB_FLUSH_INTERVAL = float(os.getenv('JOB_FLUSH_INTERVAL', 0.5))
+JOB_EVICT_INTERVAL = float(os.getenv('JOB_EVICT_INTERVAL', 60))
+
+FINISHED_STATUSES = ('completed', 'failed')
+
+# Updates, die nur diese Felder betreffen, dürfen gepuffert geschrieben werden
+BUFFERED_FIELDS = frozenset(('progress', 'message', 'stage', 'updated_at'))
+
+# Listing: Default-Seitengröße und -Felder (ohne große Payloads wie 'result')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+SUMMARY_FIELDS = ('id', 'status', 'stage', 'progress', 'message', 'endpoint', 'created_at', 'updated_at')
+
+
+def encode_cursor(job):
+    """Cursor für die Seite nach diesem Job (Sortierung: created_at DESC, id DESC)"""
+    raw = json.dumps([job.get('created_at', 0), job['id']])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Returns: (created_at, id) - ValueError bei ungültigem Cursor"""
+    try:
+        created_at, job_id = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        return float(created_at), str(job_id)
+    except Exception:
+        raise ValueError(f"Ungültiger Cursor: {cursor}")
+
+
+def project_fields(job, fields):
+    """Reduziert einen Job auf die angegebenen Felder (None = alle)"""
+    if fields is None:
+        return job
+    return {key: job[key] for key in fields if key in job}
+
+
+class JobStore:
+    """Basisklasse für Job-Speicher"""
+
+    def __init__(self, ttl_hours=JOB_TTL_HOURS, max_finished=JOB_MAX_FINISHED):
+        self.ttl_seconds = ttl_hours * 3600
+        self.max_finished = max_finished
+        self._maintenance_thread = None
+        self._stop = threading.Event()
+
+    def create(self, job):
+        """Legt einen neuen Job an"""
+        raise NotImplementedError
+
+    def get(self, job_id):
+        """Gibt eine Kopie des Jobs zurück oder None"""
+        raise NotImplementedError
+
+    def update(self, job_id, fields):
+        """
+        Aktualisiert Felder eines Jobs
+
+        Returns:
+            (snapshot, status_changed) oder (None, False) wenn der Job nicht existiert
+        """
+        raise NotImplementedError
+
+    def list_jobs(self, status=None, endpoint=None, since=None, until=None,
+                  cursor=None, limit=DEFAULT_PAGE_SIZE):
+        """
+        Jobs seitenweise, neueste zuerst
+
+        Args:
+            status: Liste erlaubter Status (None = alle)
+            endpoint: Nur Jobs für diesen Endpunkt
+            since / until: created_at-Bereich (Unix-Timestamps)
+            cursor: next_cursor der vorherigen Seite
+            limit: Seitengröße (max. MAX_PAGE_SIZE)
+
+        Returns:
+            (jobs, next_cursor) - next_cursor ist None auf der letzten Seite
+        """
+        raise NotImplementedError
+
+    def _page(self, job_list, limit):
+        """Schneidet eine Seite aus (job_list enthält limit + 1 Einträge wenn es weitergeht)"""
+        if len(job_list) > limit:
+            job_list = job_list[:limit]
+            return job_list, encode_cursor(job_list[-1])
+        return job_list, None
+
+    def changed_since(self, since, limit=500):
+        """
+        Jobs mit updated_at > since (älteste zuerst) - für SSE über Prozessgrenzen
+
+        In-Memory: alle Updates laufen ohnehin durch diesen Prozess, daher leer.
+        """
+        return []
+
+    def evict(self):
+        """Entfernt abgelaufene / überzählige abgeschlossene Jobs. Returns: Anzahl gelöschter Jobs"""
+        raise NotImplementedError
+
+    def count(self):
+        raise NotImplementedError
+
+    def flush(self):
+        """Schreibt gepufferte Updates (nur bei persistenten Backends relevant)"""
+
+    def stats(self):
+        return {
+            'backend': self.backend,
+            'jobs': self.count(),
+            'ttl_hours': self.ttl_seconds / 3600,
+            'max_finished': self.max_finished
+        }
+
+    def start_maintenance(self):
+        """Startet den Hintergrund-Thread für Flush und Eviction"""
+        if self._maintenance_thread is not None:
+            return
+        self._maintenance_thread = threading.Thread(
+            target=self._maintenance_loop,
+            name='job-store-maintenance',
+            daemon=True
+        )
+        self._maintenance_thread.start()
+
+    def stop_maintenance(self):
+        self._stop.set()
+        self.flush()
+
+    def _maintenance_loop(self):
+        last_evict = time.time()
+        while not self._stop.wait(JOB_FLUSH_INTERVAL):
+            try:
+                self.flush()
+                if time.time() - last_evict >= JOB_EVICT_INTERVAL:
+                    last_evict = time.time()
+                    deleted = self.evict()
+                    if deleted:
+                        logger.info(f"🧹 Job store: {deleted} finished jobs evicted")
+            except Exception as e:
+                logger.error(f"Job store maintenance failed: {e}")
+
+
+class MemoryJobStore(JobStore):
+    """Jobs in einem Dict im Prozess (Default, geht beim Neustart verloren)"""
+
+    backend = 'memory'
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job):
+        with self._lock:
+            self._jobs[job['id']] = dict(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def update(self, job_id, fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None, False
+            status_changed = 'status' in fields and fields['status'] != job.get('status')
+            job.update(fields)
+            job['updated_at'] = time.time()
+            return dict(job), status_changed
+
+    def list_jobs(self, status=None, endpoint=None, since=None, until=None,
+                  cursor=None, limit=DEFAULT_PAGE_SIZE):
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        after = decode_cursor(cursor) if cursor else None
+
+        def matches(job):
+            created_at = job.get('created_at', 0)
+            if status and job.get('status') not in status:
+                return False
+            if endpoint and job.get('endpoint') != endpoint:
+                return False
+            if since is not None and created_at < since:
+                return False
+            if until is not None and created_at >= until:
+                return False
+            if after and (created_at, job['id']) >= after:
+                return False
+            return True
+
+        with self._lock:
+            candidates = [job for job in self._jobs.values() if matches(job)]
+        candidates.sort(key=lambda j: (j.get('created_at', 0), j['id']), reverse=True)
+        return self._page([dict(job) for job in candidates[:limit + 1]], limit)
+
+    def evict(self):
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            finished = sorted(
+                (job for job in self._jobs.values() if job.get('status') in FINISHED_STATUSES),
+                key=lambda j: j.get('updated_at', 0)
+            )
+            expired = [job['id'] for job in finished if job.get('updated_at', 0) < cutoff]
+            overflow = len(finished) - len(expired) - self.max_finished
+            if overflow > 0:
+                expired += [job['id'] for job in finished[len(expired):len(expired) + overflow]]
+            for job_id in expired:
+                del self._jobs[job_id]
+        return len(expired)
+
+    def count(self):
+        with self._lock:
+            return len(self._jobs)
+
+
+class SQLiteJobStore(JobStore):
+    """
+    Jobs in einer SQLite-Datenbank (WAL-Modus)
+
+    Fortschritts-Updates (progress/message/stage) werden gepuffert und gesammelt
+    in einer Transaktion geschrieben; Statuswechsel werden sofort geschrieben.
+    Gepufferter Fortschritt wird für abgeschlossene Jobs verworfen - auch wenn der
+    Endzustand aus einem anderen Thread oder Prozess kam.
+    """
+
+    backend = 'sqlite'
+
+    def __init__(self, path=JOB_STORE_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._local = threading.local()
+        self._pending = {}  # job_id -> gepufferte Felder
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._init_schema()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        conn = self._conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                data TEXT NOT NULL
+            );
+        """)
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(jobs)')]
+        if 'endpoint' not in columns:
+            conn.execute('ALTER TABLE jobs ADD COLUMN endpoint TEXT')
+        conn.executescript("""
+            CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+            CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs (created_at, id);
+            CREATE INDEX IF NOT EXISTS idx_jobs_endpoint ON jobs (endpoint, created_at);
+            CREATE INDEX IF NOT EXISTS idx_jobs_updated_at ON jobs (updated_at);
+        """)
+        logger.info(f"🗄️ SQLite job store: {self.path}")
+
+    def _read(self, conn, job_id):
+        row = conn.execute('SELECT data FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _write(self, conn, job):
+        conn.execute(
+            'UPDATE jobs SET status = ?, endpoint = ?, updated_at = ?, data = ? WHERE id = ?',
+            (job.get('status', ''), job.get('endpoint'), job['updated_at'], json.dumps(job, default=str), job['id'])
+        )
+
+    def create(self, job):
+        job = dict(job)
+        job.setdefault('created_at', time.time())
+        job.setdefault('updated_at', job['created_at'])
+        with self._write_lock:
+            self._conn().execute(
+                'INSERT OR REPLACE INTO jobs (id, status, endpoint, created_at, updated_at, data) VALUES (?, ?, ?, ?, ?, ?)',
+                (job['id'], job.get('status', ''), job.get('endpoint'), job['created_at'], job['updated_at'],
+                 json.dumps(job, default=str))
+            )
+
+    def get(self, job_id):
+        job = self._read(self._conn(), job_id)
+        if job is None:
+            return None
+        if job.get('status') in FINISHED_STATUSES:
+            return job
+        with self._pending_lock:
+            pending = self._pending.get(job_id)
+            if pending:
+                job.update(pending)
+        return job
+
+    def update(self, job_id, fields):
+        fields = dict(fields)
+        fields['updated_at'] = time.time()
+
+        if BUFFERED_FIELDS.issuperset(fields):
+            # Reiner Fortschritt: puffern, der Maintenance-Thread schreibt gesammelt
+            job = self.get(job_id)
+            if job is None:
+                return None, False
+            if job.get('status') in FINISHED_STATUSES:
+                # Später Fortschritt nach dem Endzustand - nicht puffern
+                return job, False
+            with self._pending_lock:
+                self._pending.setdefault(job_id, {}).update(fields)
+            job.update(fields)
+            return job, False
+
+        with self._pending_lock:
+            pending = self._pending.pop(job_id, {})
+
+        conn = self._conn()
+        with self._write_lock:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                job = self._read(conn, job_id)
+                if job is None:
+                    conn.execute('ROLLBACK')
+                    return None, False
+                status_changed = 'status' in fields and fields['status'] != job.get('status')
+                if job.get('status') not in FINISHED_STATUSES:
+                    job.update(pending)
+                job.update(fields)
+                self._write(conn, job)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return job, status_changed
+
+    def flush(self):
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        conn = self._conn()
+        with self._write_lock:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for job_id, fields in pending.items():
+                    job = self._read(conn, job_id)
+                    # Unter dem Schreib-Lock gelesen: ein inzwischen geschriebener Endzustand
+                    # wird nie mit veraltetem Fortschritt überschrieben
+                    if job is not None and job.get('status') not in FINISHED_STATUSES:
+                        job.update(fields)
+                        self._write(conn, job)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    def list_jobs(self, status=None, endpoint=None, since=None, until=None,
+                  cursor=None, limit=DEFAULT_PAGE_SIZE):
+        self.flush()
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+        where, args = [], []
+        if status:
+            where.append(f"status IN ({','.join('?' * len(status))})")
+            args.extend(status)
+        if endpoint:
+            where.append('endpoint = ?')
+            args.append(endpoint)
+        if since is not None:
+            where.append('created_at >= ?')
+            args.append(since)
+        if until is not None:
+            where.append('created_at < ?')
+            args.append(until)
+        if cursor:
+            created_at, job_id = decode_cursor(cursor)
+            where.append('(created_at < ? OR (created_at = ? AND id < ?))')
+            args.extend((created_at, created_at, job_id))
+
+        sql = 'SELECT data FROM jobs'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY created_at DESC, id DESC LIMIT ?'
+        args.append(limit + 1)
+
+        rows = self._conn().execute(sql, args).fetchall()
+        return self._page([json.loads(row[0]) for row in rows], limit)
+
+    def changed_since(self, since, limit=500):
+        rows = self._conn().execute(
+            'SELECT data FROM jobs WHERE updated_at > ? ORDER BY updated_at LIMIT ?',
+            (since, limit)
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def evict(self):
+        placeholders = ','.join('?' * len(FINISHED_STATUSES))
+        cutoff = time.time() - self.ttl_seconds
+        conn = self._conn()
+        with self._write_lock:
+            deleted = conn.execute(
+                f'DELETE FROM jobs WHERE status IN ({placeholders}) AND updated_at < ?',
+                (*FINISHED_STATUSES, cutoff)
+            ).rowcount
+            deleted += conn.execute(
+                f"""DELETE FROM jobs WHERE id IN (
+                        SELECT id FROM jobs WHERE status IN ({placeholders})
+                        ORDER BY updated_at DESC LIMIT -1 OFFSET ?
+                    )""",
+                (*FINISHED_STATUSES, self.max_finished)
+            ).rowcount
+        return deleted
+
+    def count(self):
+        return self._conn().execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+
+    def stats(self):
+        stats = super().stats()
+        stats['path'] = self.path
+        with self._pending_lock:
+            stats['pending_updates'] = len(self._pending)
+        return stats
+
+
+def create_job_store():
+    """Erstellt das konfigurierte Backend (JOB_STORE=memory|sqlite)"""
+    if JOB_STORE == 'sqlite':
+        store = SQLiteJobStore()
+    else:
+        store = MemoryJobStore()
+    store.start_maintenance()
+    return store
@@ -6,12 +6,26 @@ Intelligente Intent-Erkennung und Parameter-Extraktion
 import google.generativeai as genai
 import json
 import os
+import time
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from intent_cache import intent_cache, bind_uploaded_files
+from endpoint_discovery import get_dynamic_system_prompt
+from intent_rules import match_rules, parse_repeat_count, INTENT_RULES_ENABLED, INTENT_RULES_MIN_CONFIDENCE
 
 logger = logging.getLogger(__name__)
 
 # Konfiguration
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '')
+GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-2.0-flash-exp')
+LLM_WARMUP = os.getenv('LLM_WARMUP', 'false').lower() in ('1', 'true', 'yes')
+# Deadline/Hedging: harte Obergrenze für die Wartezeit auf Gemini (0 = aus)
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', 8))
+LLM_HEDGE_DELAY = float(os.getenv('LLM_HEDGE_DELAY', 0))  # 0 = kein Hedging
+LLM_HEDGE_MIN_CONFIDENCE = float(os.getenv('LLM_HEDGE_MIN_CONFIDENCE', 0.85))
+LLM_REQUEST_TIMEOUT = float(os.getenv('LLM_REQUEST_TIMEOUT', 60))  # Obergrenze für späte Antworten
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 8))
 if GEMINI_API_KEY:
     genai.configure(api_key=GEMINI_API_KEY)
 
@@ -103,6 +117,171 @@ Antwort:
 """
 
 
+# Lokale Funktionen (NICHT im Container), werden an den dynamischen Prompt angehängt
+LOCAL_CAPABILITIES = """
+Zusätzliche LOKALE Funktionen (Server-seitig verfügbar):
+
+** /v1/image/screenshot/webpage **
+   - Beschreibung: Erstellt einen oder mehrere Screenshots einer Webseite (ein Seitenaufruf)
+   - Parameter: url (string), viewport_width (int, default: 1920), viewport_height (int, default: 1080),
+     viewports (list, optional - "desktop" | "laptop" | "tablet" | "mobile" oder {"width", "height"}),
+     full_page (bool, optional - ganze Seite), elements (list, optional - CSS-Selektoren für Ausschnitte),
+     max_age (int, optional - Sekunden, die ein gecachter Screenshot alt sein darf; 0 = neu aufnehmen)
+   - Beispiel: "Screenshot von google.de" -> endpoint: /v1/image/screenshot/webpage
+   - Beispiel: "Screenshots von example.com für Desktop, Tablet und Handy" -> params: {"url": ..., "viewports": ["desktop", "tablet", "mobile"]}
+
+** /combine-videos (Wiederholung) **
+   - Beschreibung: Spielt Dateien hintereinander; eine Datei mehrfach über repeat (wird geloopt statt dupliziert)
+   - Parameter: media_urls (array of strings), repeat (int, optional - wie oft die ganze Folge abgespielt wird)
+   - Beispiel: "Spiele audio.mp3 dreimal hintereinander" -> params: {"media_urls": ["...audio.mp3"], "repeat": 3}
+
+** /v1/video/thumbnail **
+   - Beschreibung: Erstellt ein oder mehrere Thumbnails aus einem Video (ein FFmpeg-Durchlauf)
+   - Parameter: url (string - file url),
+     offsets (list, optional - Zeitpunkte in Sekunden oder "hh:mm:ss"),
+     count (int, optional - Anzahl gleichmäßig verteilter Frames bzw. Maximum bei Szenen),
+     mode (string, optional - "offsets" | "interval" | "scene"),
+     output (string, optional - "frames" (einzelne JPEGs) | "sprite" (Sprite-Sheet + WebVTT)),
+     width/height (int, optional - Kachelgröße), columns (int, optional - Spalten im Sprite)
+   - Beispiel: "Mache ein Thumbnail" -> endpoint: /v1/video/thumbnail
+   - Beispiel: "10 Vorschaubilder als Sprite" -> params: {"url": ..., "count": 10, "output": "sprite"}
+   - Beispiel: "Thumbnails bei jedem Szenenwechsel" -> params: {"url": ..., "mode": "scene"}
+"""
+
+
+# Batch-Modus: mehrere Anfragen in einem Gemini-Call
+LLM_BATCH_SIZE = int(os.getenv('LLM_BATCH_SIZE', 20))
+LLM_BATCH_DEADLINE = float(os.getenv('LLM_BATCH_DEADLINE', 20))  # Sekunden für alle Batch-Calls eines Requests
+
+BATCH_INSTRUCTIONS = """
+BATCH-MODUS:
+Du bekommst mehrere nummerierte Anfragen (ANFRAGE 0, ANFRAGE 1, ...), jede mit eigenen Dateien.
+Antworte mit einem JSON-Array, genau ein Objekt pro Anfrage:
+- "index": Nummer der Anfrage
+- "endpoint", "confidence", "reasoning": wie oben
+- "params_json": die Parameter als JSON-String, z.B. "{\\"media_url\\": \\"USE_UPLOADED_FILE_0\\"}"
+USE_UPLOADED_FILE_n bezieht sich immer auf die Dateien DER JEWEILIGEN Anfrage.
+"""
+
+BATCH_RESPONSE_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "index": {"type": "integer"},
+            "endpoint": {"type": "string", "nullable": True},
+            "params_json": {"type": "string"},
+            "confidence": {"type": "number"},
+            "reasoning": {"type": "string"}
+        },
+        "required": ["index", "endpoint", "params_json", "confidence"]
+    }
+}
+
+
+def build_system_prompt():
+    """Dynamischer Prompt (entdeckte Container-Endpoints) + lokale Funktionen"""
+    return get_dynamic_system_prompt() + "\n" + LOCAL_CAPABILITIES
+
+
+class LLMClient:
+    """
+    Langlebiger Gemini-Client: Modell und System-Prompt werden einmal beim Start
+    erstellt statt bei jedem Request.
+    """
+
+    def __init__(self, model_name=GEMINI_MODEL):
+        self.model_name = model_name
+        self.system_prompt = build_system_prompt()
+        self._prompt_prefix = self.system_prompt + "\n\n"
+        self.model = genai.GenerativeModel(
+            model_name,
+            generation_config={
+                "response_mime_type": "application/json"
+            }
+        )
+        self.batch_model = genai.GenerativeModel(
+            model_name,
+            generation_config={
+                "response_mime_type": "application/json",
+                "response_schema": BATCH_RESPONSE_SCHEMA
+            }
+        )
+        self._batch_prompt_prefix = self.system_prompt + "\n" + BATCH_INSTRUCTIONS + "\n\n"
+        logger.info(f"🤖 LLM client ready: {model_name} (prompt: {len(self.system_prompt)} chars)")
+
+    def generate(self, context, timeout=None):
+        """Sendet Prompt + Kontext an Gemini und gibt den Antwort-Text zurück"""
+        if timeout:
+            response = self.model.generate_content(
+                self._prompt_prefix + context,
+                request_options={'timeout': timeout}
+            )
+        else:
+            response = self.model.generate_content(self._prompt_prefix + context)
+        return response.text
+
+    def generate_batch(self, context, timeout=None):
+        """Wie generate(), aber für mehrere Anfragen mit JSON-Array-Antwort"""
+        if timeout:
+            response = self.batch_model.generate_content(
+                self._batch_prompt_prefix + context,
+                request_options={'timeout': timeout}
+            )
+        else:
+            response = self.batch_model.generate_content(self._batch_prompt_prefix + context)
+        return response.text
+
+    def warm_up(self):
+        """Baut die Verbindung zu Gemini vorab auf (erster Call ist sonst deutlich langsamer)"""
+        start = time.time()
+        try:
+            self.model.generate_content('{"ping": true}')
+            logger.info(f"🔥 LLM warm-up done in {time.time() - start:.2f}s")
+        except Exception as e:
+            logger.warning(f"LLM warm-up failed: {e}")
+
+
+_llm_client = None
+_llm_client_pid = None
+_llm_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    """Gibt den gemeinsamen LLM-Client zurück (None ohne GEMINI_API_KEY)"""
+    global _llm_client, _llm_client_pid
+    if not GEMINI_API_KEY:
+        return None
+    with _llm_client_lock:
+        # gRPC-Kanäle überleben keinen fork - Worker-Prozesse bauen ihren eigenen Client
+        if _llm_client is None or _llm_client_pid != os.getpid():
+            _llm_client = LLMClient()
+            _llm_client_pid = os.getpid()
+        return _llm_client
+
+
+_llm_executor = None
+_llm_executor_pid = None
+
+
+def _get_llm_executor():
+    """Thread-Pool für LLM-Calls mit Deadline (pro Prozess, wie der Client)"""
+    global _llm_executor, _llm_executor_pid
+    with _llm_client_lock:
+        if _llm_executor is None or _llm_executor_pid != os.getpid():
+            _llm_executor = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix='llm')
+            _llm_executor_pid = os.getpid()
+        return _llm_executor
+
+
+def init_llm_client(warm_up=LLM_WARMUP):
+    """Erstellt den LLM-Client beim Server-Start (optional mit Warm-up-Call)"""
+    client = get_llm_client()
+    if client and warm_up:
+        client.warm_up()
+    return client
+
+
 def extract_intent_and_params(user_message, uploaded_files=None):
     """
     Nutzt Gemini LLM um Intent und Parameter zu extrahieren
@@ -122,69 +301,309 @@ def extract_intent_and_params(user_message, uploaded_files=None):
     
     if not GEMINI_API_KEY:
         logger.warning("Kein GEMINI_API_KEY - nutze Fallback")
-        return fallback_extraction(user_message, uploaded_files)
+        return _fallback_with_tier(user_message, uploaded_files)
+    
+    if intent_cache:
+        cached = intent_cache.get(user_message, uploaded_files)
+        if cached:
+            logger.info(f"⚡ Intent cache hit: {cached.get('endpoint')}")
+            cached['cached'] = True
+            cached['tier'] = 'cache'
+            return cached
     
     try:
         # Build context
-        context = f"User-Nachricht: {user_message}\n"
-        
-        if uploaded_files:
-            context += f"\nHochgeladene Dateien:\n"
-            for i, file in enumerate(uploaded_files):
-                context += f"  {i}. {file['filename']} ({file['type']}, {file['size']} bytes)\n"
-                context += f"     URL: {file['url']}\n"
+        context = build_context(user_message, uploaded_files)
         
         logger.info(f"LLM Context:\n{context}")
         
-        # Get dynamic system prompt with discovered endpoints
-        from endpoint_discovery import get_dynamic_system_prompt
-        dynamic_prompt = get_dynamic_system_prompt()
-        
-        # Merge with local capabilities (that are NOT in the container)
-        local_capabilities = """
-Zusätzliche LOKALE Funktionen (Server-seitig verfügbar):
-
-** /v1/image/screenshot/webpage **
-   - Beschreibung: Erstellt einen Screenshot einer Webseite
-   - Parameter: url (string), viewport_width (int, default: 1920), viewport_height (int, default: 1080)
-   - Beispiel: "Screenshot von google.de" -> endpoint: /v1/image/screenshot/webpage
-
-** /v1/video/thumbnail **
-   - Beschreibung: Erstellt ein Thumbnail aus einem Video
-   - Parameter: url (string - file url)
-   - Beispiel: "Mache ein Thumbnail" -> endpoint: /v1/video/thumbnail
-"""
-        system_prompt = dynamic_prompt + "\n" + local_capabilities
-        
-        # Call Gemini
-        model = genai.GenerativeModel(
-            'gemini-2.0-flash-exp',
-            generation_config={
-                "response_mime_type": "application/json"
-            }
-        )
-        
-        response = model.generate_content(system_prompt + "\n\n" + context)
+        # Call Gemini (Client + Prompt sind vorbereitet) - mit Deadline/Hedging
+        response_text, fallback = _generate_with_deadline(context, user_message, uploaded_files)
+        if fallback is not None:
+            return fallback
         
         # Parse response
-        result = json.loads(response.text)
+        result = json.loads(response_text)
         
         logger.info(f"LLM Response: {json.dumps(result, indent=2)}")
         
-        # Replace placeholders with actual URLs
+        # Nur brauchbare Ergebnisse cachen (Template mit Platzhaltern)
+        if intent_cache and result.get('endpoint') and result.get('confidence', 0) >= 0.5:
+            intent_cache.put(user_message, uploaded_files, result)
+        
+        # Replace placeholders with actual URLs (auch in Listen, z.B. media_urls)
         if uploaded_files:
-            params = result.get('params', {})
-            for key, value in params.items():
-                if isinstance(value, str) and value.startswith('USE_UPLOADED_FILE_'):
-                    file_index = int(value.split('_')[-1])
-                    if file_index < len(uploaded_files):
-                        params[key] = uploaded_files[file_index]['url']
+            result['params'] = bind_uploaded_files(result.get('params', {}), uploaded_files)
         
+        result['tier'] = 'llm'
         return result
         
     except Exception as e:
         logger.exception("LLM extraction failed")
-        return fallback_extraction(user_message, uploaded_files)
+        return _fallback_with_tier(user_message, uploaded_files)
+
+
+def build_context(user_message, uploaded_files=None):
+    """Kontext-Text (Nachricht + hochgeladene Dateien) für den LLM-Prompt"""
+    context = f"User-Nachricht: {user_message}\n"
+    
+    if uploaded_files:
+        context += f"\nHochgeladene Dateien:\n"
+        for i, file in enumerate(uploaded_files):
+            context += f"  {i}. {file.get('filename', '')} ({file.get('type', '')}, {file.get('size', 0)} bytes)\n"
+            context += f"     URL: {file['url']}\n"
+    
+    return context
+
+
+def _fallback_with_tier(user_message, uploaded_files=None):
+    result = fallback_extraction(user_message, uploaded_files)
+    result['tier'] = 'fallback'
+    return result
+
+
+_deadline_stats = {
+    'calls': 0, 'hedged': 0, 'deadline_exceeded': 0,
+    'late_answers': 0, 'late_agreed': 0, 'late_disagreed': 0, 'late_errors': 0
+}
+_deadline_lock = threading.Lock()
+
+
+def _count(key):
+    with _deadline_lock:
+        _deadline_stats[key] += 1
+
+
+def _generate_with_deadline(context, user_message, uploaded_files=None):
+    """
+    LLM-Call mit Hedging und harter Deadline
+    
+    Nach LLM_HEDGE_DELAY ohne Antwort wird der Keyword-Fallback genommen, sofern er
+    sicher genug ist (LLM_HEDGE_MIN_CONFIDENCE); nach LLM_TIMEOUT in jedem Fall.
+    Der Gemini-Call läuft weiter und seine Antwort wird nachträglich verglichen und gecacht.
+    
+    Returns:
+        (response_text, None) bei rechtzeitiger Antwort,
+        (None, fallback_result) wenn Hedging oder Deadline gegriffen hat
+    """
+    client = get_llm_client()
+    if LLM_TIMEOUT <= 0 and LLM_HEDGE_DELAY <= 0:
+        return client.generate(context, timeout=LLM_REQUEST_TIMEOUT), None
+    
+    _count('calls')
+    start = time.time()
+    future = _get_llm_executor().submit(client.generate, context, LLM_REQUEST_TIMEOUT)
+    
+    if LLM_HEDGE_DELAY > 0 and (LLM_TIMEOUT <= 0 or LLM_HEDGE_DELAY < LLM_TIMEOUT):
+        try:
+            return future.result(timeout=LLM_HEDGE_DELAY), None
+        except FuturesTimeout:
+            fallback = _fallback_with_tier(user_message, uploaded_files)
+            if fallback.get('endpoint') and fallback.get('confidence', 0) >= LLM_HEDGE_MIN_CONFIDENCE:
+                logger.warning(f"⏱️ LLM hedge after {LLM_HEDGE_DELAY}s - using fallback {fallback['endpoint']}")
+                return None, _cut_off(future, 'hedged', fallback, user_message, uploaded_files)
+    
+    remaining = LLM_TIMEOUT - (time.time() - start) if LLM_TIMEOUT > 0 else None
+    try:
+        return future.result(timeout=remaining), None
+    except FuturesTimeout:
+        logger.warning(f"⏱️ LLM deadline of {LLM_TIMEOUT}s exceeded - using fallback")
+        fallback = _fallback_with_tier(user_message, uploaded_files)
+        return None, _cut_off(future, 'deadline_exceeded', fallback, user_message, uploaded_files)
+
+
+def _cut_off(future, reason, fallback, user_message, uploaded_files):
+    """Markiert den Fallback und wertet die spätere LLM-Antwort im Hintergrund aus"""
+    _count(reason)
+    fallback['cutoff'] = reason
+    fallback_endpoint = fallback.get('endpoint')
+    
+    def on_late_answer(done):
+        try:
+            result = json.loads(done.result())
+        except Exception as e:
+            _count('late_errors')
+            logger.info(f"Late LLM answer failed: {e}")
+            return
+        
+        _count('late_answers')
+        agreed = result.get('endpoint') == fallback_endpoint
+        _count('late_agreed' if agreed else 'late_disagreed')
+        if not agreed:
+            logger.info(f"Late LLM answer disagrees: LLM {result.get('endpoint')} vs fallback {fallback_endpoint}")
+        # Die nächste gleiche Anfrage bekommt das LLM-Ergebnis dann aus dem Cache
+        if intent_cache and result.get('endpoint') and result.get('confidence', 0) >= 0.5:
+            intent_cache.put(user_message, uploaded_files, result)
+    
+    future.add_done_callback(on_late_answer)
+    return fallback
+
+
+_tier_counts = {'rules': 0, 'cache': 0, 'llm': 0, 'llm_batch': 0, 'fallback': 0}
+_tier_lock = threading.Lock()
+
+
+def resolve_intent(user_message, uploaded_files=None):
+    """
+    Gestufte Intent-Erkennung: Regeln → Cache → LLM → Keyword-Fallback
+    
+    Eindeutige Befehle (Test, Thumbnail, MP3, Verkettung mit Wiederholung) werden
+    ohne LLM-Call über vorkompilierte Regeln erkannt.
+    
+    Returns:
+        Wie extract_intent_and_params, zusätzlich 'tier' ('rules', 'cache', 'llm', 'fallback')
+    """
+    result = None
+    if INTENT_RULES_ENABLED:
+        result = match_rules(user_message, uploaded_files)
+        if result and result['confidence'] >= INTENT_RULES_MIN_CONFIDENCE:
+            result['tier'] = 'rules'
+            logger.info(f"⚡ Intent rule '{result['rule']}': {result['endpoint']}")
+        else:
+            result = None
+    
+    if result is None:
+        result = extract_intent_and_params(user_message, uploaded_files)
+    
+    with _tier_lock:
+        _tier_counts[result.get('tier', 'llm')] = _tier_counts.get(result.get('tier', 'llm'), 0) + 1
+    return result
+
+
+def get_intent_stats():
+    """Wie oft welche Stufe die Intent-Erkennung entschieden hat"""
+    with _tier_lock:
+        return dict(_tier_counts)
+
+
+def get_llm_deadline_stats():
+    """Hedging-/Deadline-Statistik inkl. Vergleich später LLM-Antworten mit dem Fallback"""
+    with _deadline_lock:
+        stats = dict(_deadline_stats)
+    stats['timeout_seconds'] = LLM_TIMEOUT
+    stats['hedge_delay_seconds'] = LLM_HEDGE_DELAY
+    return stats
+
+
+def _extract_batch_chunk(chunk, timeout=None):
+    """
+    Ein Gemini-Call für mehrere Anfragen
+    
+    Args:
+        chunk: Liste von (position, user_message, uploaded_files)
+        timeout: Optional - Obergrenze für den Gemini-Call (Sekunden)
+    
+    Returns:
+        {position: Intent-Dict} für alle erfolgreich geparsten Anfragen
+    """
+    context = ""
+    for index, (_, user_message, uploaded_files) in enumerate(chunk):
+        context += f"ANFRAGE {index}:\n{build_context(user_message, uploaded_files)}\n"
+    
+    response_text = get_llm_client().generate_batch(context, timeout=timeout)
+    answers = json.loads(response_text)
+    if not isinstance(answers, list):
+        raise ValueError("Batch-Antwort ist kein JSON-Array")
+    
+    results = {}
+    for answer in answers:
+        try:
+            index = int(answer['index'])
+            position, user_message, uploaded_files = chunk[index]
+            params = json.loads(answer.get('params_json') or '{}')
+            if not isinstance(params, dict):
+                raise ValueError("params_json ist kein Objekt")
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            logger.warning(f"Batch item unparseable, will retry singly: {e}")
+            continue
+        
+        result = {
+            'endpoint': answer.get('endpoint'),
+            'params': params,
+            'confidence': float(answer.get('confidence') or 0.0),
+            'reasoning': answer.get('reasoning', '')
+        }
+        if intent_cache and result['endpoint'] and result['confidence'] >= 0.5:
+            intent_cache.put(user_message, uploaded_files, result)
+        
+        result['params'] = bind_uploaded_files(params, uploaded_files)
+        result['tier'] = 'llm_batch'
+        results[position] = result
+    
+    return results
+
+
+def extract_intents_batch(items, deadline=None, resolve_remaining=True):
+    """
+    Intent-Erkennung für viele Anfragen auf einmal
+    
+    Regeln und Cache werden pro Anfrage zuerst geprüft; der Rest geht in Blöcken von
+    LLM_BATCH_SIZE als EIN Gemini-Call pro Block raus. Anfragen, deren Antwort fehlt
+    oder nicht parsebar ist, laufen einzeln über resolve_intent.
+    
+    Args:
+        items: Liste von {'message': str, 'uploaded_files': [...]}
+        deadline: Optional - Sekunden für alle Batch-Calls zusammen; danach startet kein Block mehr
+        resolve_remaining: False = offene Anfragen als None zurückgeben statt einzeln aufzulösen
+            (z.B. damit das der Job im Worker erledigt statt der Request-Thread)
+    
+    Returns:
+        Liste von Intent-Dicts (gleiche Reihenfolge wie items)
+    """
+    end = time.time() + deadline if deadline else None
+    results = [None] * len(items)
+    pending = []
+    
+    for position, item in enumerate(items):
+        user_message = item.get('message', '')
+        uploaded_files = item.get('uploaded_files') or []
+        
+        if INTENT_RULES_ENABLED:
+            result = match_rules(user_message, uploaded_files)
+            if result and result['confidence'] >= INTENT_RULES_MIN_CONFIDENCE:
+                result['tier'] = 'rules'
+                results[position] = result
+                continue
+        
+        if intent_cache:
+            cached = intent_cache.get(user_message, uploaded_files)
+            if cached:
+                cached['cached'] = True
+                cached['tier'] = 'cache'
+                results[position] = cached
+                continue
+        
+        pending.append((position, user_message, uploaded_files))
+    
+    if pending and get_llm_client():
+        logger.info(f"🤖 Batch intent extraction: {len(pending)} of {len(items)} items need the LLM")
+        for start in range(0, len(pending), LLM_BATCH_SIZE):
+            chunk = pending[start:start + LLM_BATCH_SIZE]
+            remaining = end - time.time() if end else None
+            if remaining is not None and remaining <= 0:
+                logger.warning(f"⏱️ Batch deadline of {deadline}s exceeded - {len(pending) - start} items left open")
+                break
+            try:
+                timeout = min(remaining, LLM_REQUEST_TIMEOUT) if remaining else None
+                for position, result in _extract_batch_chunk(chunk, timeout=timeout).items():
+                    results[position] = result
+            except Exception as e:
+                logger.warning(f"Batch LLM call failed, falling back to single calls: {e}")
+    
+    with _tier_lock:
+        for result in results:
+            if result is not None:
+                _tier_counts[result['tier']] = _tier_counts.get(result['tier'], 0) + 1
+    
+    if not resolve_remaining:
+        return results
+    
+    # Einzelaufrufe für alles, was im Batch nicht geklappt hat (zählt selbst)
+    for position, item in enumerate(items):
+        if results[position] is None:
+            results[position] = resolve_intent(item.get('message', ''), item.get('uploaded_files') or [])
+    
+    return results
 
 
 import time
@@ -220,9 +639,15 @@ def fallback_extraction(user_message, uploaded_files=None):
         elif urls:
             video_url = urls[0]
             
+        params = {'url': video_url or ''}
+        if any(kw in message_lower for kw in ['sprite', 'contact sheet', 'kontaktabzug']):
+            params.update({'count': 16, 'output': 'sprite'})
+        elif any(kw in message_lower for kw in ['szene', 'scene']):
+            params['mode'] = 'scene'
+
         return {
             'endpoint': '/v1/video/thumbnail',
-            'params': {'url': video_url or ''},
+            'params': params,
             'confidence': 0.8,
             'reasoning': 'Fallback: Keyword-Matching für Thumbnail'
         }
@@ -300,27 +725,19 @@ def fallback_extraction(user_message, uploaded_files=None):
 
         if media_files:
             # Check for repetition
-            count = 1
-            if any(kw in message_lower for kw in ['dreimal', '3x', '3 mal', '3 times']):
-                count = 3
-            elif any(kw in message_lower for kw in ['zweimal', '2x', '2 mal', '2 times']):
-                count = 2
-            
+            count = parse_repeat_count(user_message)
 
-
-            final_files = []
+            params = {
+                'media_urls': media_files # Correct param name
+            }
             if len(media_files) == 1 and count > 1:
-                final_files = media_files * count # Repeat the same file
-            else:
-                final_files = media_files # Just join different files
+                params['repeat'] = count # Repeat the same file (geloopt, nicht N-mal dekodiert)
 
             return {
                 'endpoint': '/combine-videos', # Correct endpoint per container source
-                'params': {
-                    'media_urls': final_files # Correct param name
-                },
+                'params': params,
                 'confidence': 0.85,
-                'reasoning': f'Fallback: Concatenation of {len(final_files)} files requested'
+                'reasoning': f'Fallback: Concatenation of {len(media_files) * params.get("repeat", 1)} files requested'
             }
     
     # Transkription
@@ -1,66 +1,56 @@
 import os
-import subprocess
 import uuid
 import logging
 from file_handler import UPLOAD_FOLDER
+from derivation_cache import derivation_cache
+from ffmpeg_capabilities import get_capabilities, ffmpeg_available, ffmpeg_command
+from ffmpeg_scheduler import run_ffmpeg, PRIORITY_NORMAL
+from thumbnails import create_thumbnails
+from concat_engine import concat_audio, concat_video
+from screenshots import capture_webpage
 
 logger = logging.getLogger(__name__)
 
+
+def _derive(operation, params, input_paths, ext, produce, fallback_filename):
+    """
+    Erzeugt eine Ausgabedatei über den Derivation Cache (gleiche Eingaben + Parameter → vorhandene Datei)
+    
+    Returns:
+        (output_filename, cached)
+    """
+    if derivation_cache:
+        return derivation_cache.run(operation, params, input_paths, ext, produce)
+    produce(os.path.join(UPLOAD_FOLDER, fallback_filename))
+    return fallback_filename, False
+
+
+def _run_ffmpeg(cmd, error_message, priority=PRIORITY_NORMAL):
+    """Startet FFmpeg über den Scheduler und wirft bei Fehler eine Exception mit dem Anfang von stderr"""
+    result = run_ffmpeg(cmd, priority=priority)
+    if result.returncode != 0:
+        logger.error(f"FFmpeg Error: {result.stderr}")
+        raise Exception(f"{error_message}: {result.stderr[:200]}")
+
+
 def check_local_ffmpeg():
-    """Checks if FFmpeg is installed and returns True/False"""
-    try:
-        subprocess.run(['ffmpeg', '-version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        return True
-    except FileNotFoundError:
-        return False
+    """Checks if FFmpeg is installed and returns True/False (aus der Capability-Registry, ohne Prozessaufruf)"""
+    return ffmpeg_available()
 
 # ------------------------------
 # LOCAL WEBSITE SCREENSHOT
 # ------------------------------
-def create_website_screenshot(url, width=1920, height=1080):
+def create_website_screenshot(url, width=1920, height=1080, **options):
     """
     Erstellt einen Screenshot einer Webseite mit Selenium
+    Mit options (viewports, full_page, elements) mehrere Aufnahmen aus einem Seitenaufruf - siehe screenshots.capture_webpage
     """
     logger.info(f"📸 Generating website screenshot for: {url}")
-    
-    output_filename = f"screenshot_{uuid.uuid4().hex[:8]}.png"
-    output_path = os.path.join(UPLOAD_FOLDER, output_filename)
-    
-    try:
-        from selenium import webdriver
-        from selenium.webdriver.chrome.options import Options
-        from webdriver_manager.chrome import ChromeDriverManager
-        from selenium.webdriver.chrome.service import Service
-
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")
-        chrome_options.add_argument(f"--window-size={width},{height}")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        
-        # Setup WebDriver
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service, options=chrome_options)
-        
-        try:
-            driver.get(url)
-            import time
-            time.sleep(2) 
-            driver.save_screenshot(output_path)
-            logger.info(f"✅ Screenshot saved to {output_path}")
-        finally:
-            driver.quit()
-
-        return {
-            'filename': output_filename,
-            'url': f"http://localhost:5000/uploads/{output_filename}",
-            'type': 'png',
-            'size': os.path.getsize(output_path),
-            'source': 'local_selenium',
-            'stored_filename': output_filename
-            # NO job_id for sync tasks!
-        }
+    viewports = options.pop('viewports', None) or [{'width': width, 'height': height}]
 
+    try:
+        # Browser aus dem Pool statt Start + fester sleep(2) pro Screenshot
+        return capture_webpage(url, viewports=viewports, **options)
     except Exception as e:
         logger.error(f"❌ Screenshot failed: {e}")
         raise Exception(f"Failed to create screenshot: {str(e)}")
@@ -86,29 +76,31 @@ def local_audio_mixing(video_url, audio_url):
     if not os.path.exists(audio_path):
         raise FileNotFoundError(f"Audio file not found: {audio_path}")
 
-    output_filename = f"{uuid.uuid4()}_local_mixed.mp4"
-    output_path = os.path.join(UPLOAD_FOLDER, output_filename)
+    # libfdk_aac ist schneller und besser als der eingebaute AAC-Encoder, aber nicht überall gebaut
+    audio_encoder = get_capabilities().pick_encoder('libfdk_aac', 'aac') or 'aac'
     
-    # Command: ffmpeg -i video.mp4 -i audio.mp3 -c:v copy -map 0:v:0 -map 1:a:0 -shortest output.mp4
-    cmd = [
-        'ffmpeg', '-y',
-        '-i', video_path,
-        '-i', audio_path,
-        '-c:v', 'copy',
-        '-map', '0:v:0',
-        '-map', '1:a:0',
-        '-shortest',
-        output_path
-    ]
-    
-    logger.info(f"🎬 Running Local FFmpeg: {' '.join(cmd)}")
+    def produce(output_path):
+        # Command: ffmpeg -i video.mp4 -i audio.mp3 -c:v copy -map 0:v:0 -map 1:a:0 -shortest output.mp4
+        cmd = ffmpeg_command(
+            '-y',
+            '-i', video_path,
+            '-i', audio_path,
+            '-c:v', 'copy',
+            '-c:a', audio_encoder,
+            '-map', '0:v:0',
+            '-map', '1:a:0',
+            '-shortest',
+            output_path
+        )
+        logger.info(f"🎬 Running Local FFmpeg: {' '.join(cmd)}")
+        _run_ffmpeg(cmd, "FFmpeg fehlgeschlagen")
     
     try:
-        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        if result.returncode != 0:
-            logger.error(f"FFmpeg Error: {result.stderr}")
-            raise Exception(f"FFmpeg fehlgeschlagen: {result.stderr[:200]}")
-            
+        output_filename, cached = _derive(
+            'audio_mixing:v1', {'audio_encoder': audio_encoder}, [video_path, audio_path], 'mp4',
+            produce, f"{uuid.uuid4()}_local_mixed.mp4"
+        )
+        output_path = os.path.join(UPLOAD_FOLDER, output_filename)
         logger.info(f"✅ Local FFmpeg success: {output_path}")
         
         file_size = os.path.getsize(output_path)
@@ -123,7 +115,7 @@ def local_audio_mixing(video_url, audio_url):
              'type': 'mp4',
              'size': file_size,
              'source': 'local_ffmpeg',
-             'source': 'local_ffmpeg'
+             'cached': cached
              # 'job_id': str(uuid.uuid4()) # REMOVED: Sync tasks should not trigger polling
         }
         
@@ -131,34 +123,42 @@ def local_audio_mixing(video_url, audio_url):
         logger.exception("Local processing failed")
         raise e
 
-def create_thumbnail(video_url, time_offset="00:00:01"):
+def create_thumbnail(video_url, time_offset="00:00:01", **options):
     """
-    Creates a thumbnail from a video file using local FFmpeg.
+    Creates thumbnails from a video file using local FFmpeg (fast input seek).
+    Ohne options ein Frame bei time_offset; mit offsets/count/mode/output siehe thumbnails.create_thumbnails.
     """
     video_path = url_to_path(video_url)
-    if not os.path.exists(video_path):
-        raise FileNotFoundError(f"Video file not found: {video_path}")
+    if not options:
+        options = {'offsets': [time_offset]}
+    try:
+        return create_thumbnails(video_path, **options)
+    except Exception as e:
+        logger.exception("Thumbnail generation failed")
+        raise e
 
-    # Output filename
-    output_filename = f"{uuid.uuid4()}_thumbnail.jpg"
-    output_path = os.path.join(UPLOAD_FOLDER, output_filename)
+def local_audio_concat(audio_urls, repeat=1):
+    """
+    Concatenates multiple audio files locally using FFmpeg.
+    repeat spielt die ganze Folge mehrfach ab (Loop statt doppelter Eingaben).
+    """
+    audio_paths = [url_to_path(url) for url in audio_urls]
+    for p in audio_paths:
+        if not os.path.exists(p):
+            raise FileNotFoundError(f"Audio file not found: {p}")
 
-    # ffmpeg -i input.mp4 -ss 00:00:01 -vframes 1 output.jpg
-    cmd = [
-        'ffmpeg', '-y',
-        '-i', video_path,
-        '-ss', time_offset,
-        '-vframes', '1',
-        output_path
-    ]
+    concat_info = {}
 
-    logger.info(f"📸 Generating Thumbnail: {' '.join(cmd)}")
+    def produce(output_path):
+        # Stream-Copy wenn alle Eingaben gleich kodiert sind, sonst nur die abweichenden umkodieren
+        concat_info.update(concat_audio(audio_paths, output_path, 'mp3', repeat=repeat))
 
     try:
-        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        if result.returncode != 0:
-            logger.error(f"FFmpeg Error: {result.stderr}")
-            raise Exception(f"Thumbnail generation failed: {result.stderr[:200]}")
+        output_filename, cached = _derive(
+            'audio_concat:v2', {'format': 'mp3', 'repeat': int(repeat or 1)}, audio_paths, 'mp3',
+            produce, f"concat_{uuid.uuid4().hex[:8]}.mp3"
+        )
+        output_path = os.path.join(UPLOAD_FOLDER, output_filename)
 
         file_size = os.path.getsize(output_path)
         file_url = f"http://localhost:5000/uploads/{output_filename}"
@@ -167,48 +167,46 @@ def create_thumbnail(video_url, time_offset="00:00:01"):
              'filename': output_filename,
              'stored_filename': output_filename,
              'url': file_url,
-             'type': 'jpg',
+             'type': 'mp3',
              'size': file_size,
              'source': 'local_ffmpeg',
-             'source': 'local_ffmpeg'
-             # 'job_id': str(uuid.uuid4()) # REMOVED: Sync tasks should not trigger polling
+             'cached': cached,
+             'concat_mode': concat_info.get('mode')  # None bei Cache-Treffer
         }
     except Exception as e:
-        logger.exception("Thumbnail generation failed")
+        logger.exception("Audio concatenation failed")
         raise e
-def local_audio_concat(audio_urls):
+
+def local_upload_paths(urls):
+    """Lokale Pfade, wenn alle URLs auf Dateien im Upload-Ordner zeigen - sonst None"""
+    if not urls:
+        return None
+    paths = [url_to_path(url) for url in urls if isinstance(url, str) and '/uploads/' in url]
+    if len(paths) != len(urls) or not all(os.path.isfile(p) for p in paths):
+        return None
+    return paths
+
+def local_video_concat(video_urls, repeat=1):
     """
-    Concatenates multiple audio files locally using FFmpeg.
+    Concatenates videos locally using FFmpeg.
+    Passende Eingaben werden kopiert, abweichende parallel normalisiert, dann per Stream-Copy verbunden.
     """
-    audio_paths = [url_to_path(url) for url in audio_urls]
-    for p in audio_paths:
+    video_paths = [url_to_path(url) for url in video_urls]
+    for p in video_paths:
         if not os.path.exists(p):
-            raise FileNotFoundError(f"Audio file not found: {p}")
+            raise FileNotFoundError(f"Video file not found: {p}")
 
-    output_filename = f"concat_{uuid.uuid4().hex[:8]}.mp3"
-    output_path = os.path.join(UPLOAD_FOLDER, output_filename)
+    concat_info = {}
 
-    # Use concat demuxer if many files, or simple concat filter
-    # For now, let's use the complex filter or simple concat protocol
-    # Simple approach for a few files:
-    # ffmpeg -i i1.mp3 -i i2.mp3 -filter_complex "[0:a][1:a]concat=n=2:v=0:a=1" out.mp3
-    
-    inputs = []
-    for p in audio_paths:
-        inputs.extend(['-i', p])
-    
-    filter_complex = "".join([f"[{i}:a]" for i in range(len(audio_paths))])
-    filter_complex += f"concat=n={len(audio_paths)}:v=0:a=1[out]"
-    
-    cmd = ['ffmpeg', '-y'] + inputs + ['-filter_complex', filter_complex, '-map', '[out]', output_path]
-
-    logger.info(f"🎤 Concatenating Audio: {' '.join(cmd)}")
+    def produce(output_path):
+        concat_info.update(concat_video(video_paths, output_path, repeat=repeat))
 
     try:
-        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        if result.returncode != 0:
-            logger.error(f"FFmpeg Error: {result.stderr}")
-            raise Exception(f"Audio concatenation failed: {result.stderr[:200]}")
+        output_filename, cached = _derive(
+            'video_concat:v1', {'repeat': int(repeat or 1)}, video_paths, 'mp4',
+            produce, f"concat_{uuid.uuid4().hex[:8]}.mp4"
+        )
+        output_path = os.path.join(UPLOAD_FOLDER, output_filename)
 
         file_size = os.path.getsize(output_path)
         file_url = f"http://localhost:5000/uploads/{output_filename}"
@@ -217,10 +215,12 @@ def local_audio_concat(audio_urls):
              'filename': output_filename,
              'stored_filename': output_filename,
              'url': file_url,
-             'type': 'mp3',
+             'type': 'mp4',
              'size': file_size,
-             'source': 'local_ffmpeg'
+             'source': 'local_ffmpeg',
+             'cached': cached,
+             'concat_mode': concat_info.get('mode')  # None bei Cache-Treffer
         }
     except Exception as e:
-        logger.exception("Audio concatenation failed")
+        logger.exception("Video concatenation failed")
         raise e
@@ -0,0 +1,101 @@
+"""
+Media Probe - Stream-Informationen über ffprobe
+Dauer, Auflösung, Codecs und Audio-Parameter einer Datei; gemerkt nach (Pfad, Größe, mtime).
+"""
+
+import os
+import json
+import logging
+import threading
+from ffmpeg_capabilities import get_capabilities, ffprobe_command
+from ffmpeg_scheduler import run_ffmpeg, PRIORITY_INTERACTIVE
+
+logger = logging.getLogger(__name__)
+
+FFPROBE_TIMEOUT = 30
+
+_probe_memo = {}  # path -> (size, mtime, info)
+_probe_memo_lock = threading.Lock()
+
+
+def _fraction(value):
+    """'30000/1001' → 29.97"""
+    try:
+        num, _, den = str(value).partition('/')
+        den = float(den or 1)
+        return round(float(num) / den, 3) if den else None
+    except ValueError:
+        return None
+
+
+def probe_media(path):
+    """
+    Liest die Stream-Parameter einer Mediendatei
+
+    Returns:
+        {
+            'duration': 123.4, 'format': 'mov,mp4,...',
+            'video': {'codec', 'width', 'height', 'pix_fmt', 'fps', 'time_base',
+                      'profile', 'level', 'extradata_hash'} oder None,
+            'audio': {'codec', 'sample_rate', 'channels', 'channel_layout'} oder None
+        }
+        oder None, wenn ffprobe fehlt oder die Datei nicht lesbar ist
+    """
+    if not get_capabilities().ffprobe_available or not os.path.isfile(path):
+        return None
+
+    stat = os.stat(path)
+    with _probe_memo_lock:
+        memo = _probe_memo.get(path)
+        if memo and memo[0] == stat.st_size and memo[1] == stat.st_mtime:
+            return memo[2]
+
+    cmd = ffprobe_command(
+        '-v', 'error',
+        '-print_format', 'json',
+        '-show_format', '-show_streams',
+        '-show_data_hash', 'sha256',  # extradata_hash (SPS/PPS) für den Stream-Copy-Vergleich
+        path
+    )
+    result = run_ffmpeg(cmd, priority=PRIORITY_INTERACTIVE, timeout=FFPROBE_TIMEOUT, threads=False, label='ffprobe')
+    if result.returncode != 0:
+        logger.warning(f"ffprobe failed for {path}: {result.stderr[:200]}")
+        return None
+    try:
+        data = json.loads(result.stdout or '{}')
+    except ValueError:
+        return None
+
+    info = {
+        'duration': float(data.get('format', {}).get('duration') or 0) or None,
+        'format': data.get('format', {}).get('format_name'),
+        'video': None,
+        'audio': None
+    }
+    for stream in data.get('streams', []):
+        kind = stream.get('codec_type')
+        if kind == 'video' and info['video'] is None and not stream.get('disposition', {}).get('attached_pic'):
+            info['video'] = {
+                'codec': stream.get('codec_name'),
+                'width': stream.get('width'),
+                'height': stream.get('height'),
+                'pix_fmt': stream.get('pix_fmt'),
+                'fps': _fraction(stream.get('avg_frame_rate') or stream.get('r_frame_rate')),
+                'time_base': stream.get('time_base'),
+                'profile': stream.get('profile'),
+                'level': stream.get('level'),
+                'extradata_hash': stream.get('extradata_hash')
+            }
+        elif kind == 'audio' and info['audio'] is None:
+            info['audio'] = {
+                'codec': stream.get('codec_name'),
+                'sample_rate': int(stream.get('sample_rate') or 0) or None,
+                'channels': stream.get('channels'),
+                'channel_layout': stream.get('channel_layout')
+            }
+        if info['duration'] is None and stream.get('duration'):
+            info['duration'] = float(stream['duration'])
+
+    with _probe_memo_lock:
+        _probe_memo[path] = (stat.st_size, stat.st_mtime, info)
+    return info
@@ -0,0 +1,169 @@
+"""
+NCA Client - Gemeinsamer HTTP-Client für den NCA Toolkit Container
+Keep-Alive Connection-Pool, getrennte Connect/Read-Timeouts pro Endpunkt, Pool-Statistiken
+"""
+
+import os
+import time
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Konfiguration
+NCA_API_URL = os.getenv('NCA_API_URL', 'http://localhost:8080')
+NCA_API_KEY = os.getenv('NCA_API_KEY', '343534sfklsjf343423')
+# Der Container bearbeitet GUNICORN_WORKERS Requests parallel - mehr offene Verbindungen bringen nichts
+NCA_POOL_SIZE = int(os.getenv('NCA_POOL_SIZE', os.getenv('GUNICORN_WORKERS', 4)))
+NCA_CONNECT_TIMEOUT = float(os.getenv('NCA_CONNECT_TIMEOUT', 3.05))
+NCA_READ_TIMEOUT = float(os.getenv('NCA_READ_TIMEOUT', 300))
+# /api/proxy reicht beliebige Endpunkte durch (auch lange Jobs) - nie kürzer als früher (10 Min)
+NCA_PROXY_READ_TIMEOUT = float(os.getenv('NCA_PROXY_READ_TIMEOUT', 600))
+
+# Read-Timeouts pro Endpunkt (Sekunden); alles andere nutzt NCA_READ_TIMEOUT
+ENDPOINT_READ_TIMEOUTS = {
+    '/': 2,
+    '/authenticate': 5,
+    '/v1/toolkit/authenticate': 5,
+    '/v1/tools/list': 5,
+    '/media-to-mp3': 300,
+    '/audio-mixing': 300,
+    '/combine-videos': 600,
+    '/transcribe': 600,
+    '/v1/video/add/captions': 600,
+}
+
+
+class NCAClient:
+    """
+    Thread-sicherer Client mit einem Keep-Alive Pool pro Prozess
+
+    Die Verbindungen verwaltet urllib3 (thread-safe); die Session wird nur
+    zum Wiederverwenden des Pools genutzt, Cookies spielen keine Rolle.
+    """
+
+    def __init__(self, base_url=NCA_API_URL, api_key=NCA_API_KEY, pool_size=NCA_POOL_SIZE):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.pool_size = pool_size
+
+        self._adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            pool_block=False,  # Health-Checks nie hinter langen Jobs warten lassen
+            max_retries=0
+        )
+        self._session = requests.Session()
+        self._session.mount('http://', self._adapter)
+        self._session.mount('https://', self._adapter)
+        self._session.headers.update({'x-api-key': api_key})
+
+        self._stats_lock = threading.Lock()
+        self._in_flight = 0
+        self._endpoint_stats = {}  # endpoint -> {'requests', 'errors', 'total_seconds'}
+
+    def timeout_for(self, endpoint, read_timeout=None):
+        """(connect, read) Timeout-Tupel für einen Endpunkt"""
+        if read_timeout is None:
+            read_timeout = ENDPOINT_READ_TIMEOUTS.get(endpoint, NCA_READ_TIMEOUT)
+        return (NCA_CONNECT_TIMEOUT, read_timeout)
+
+    def request(self, method, endpoint, json=None, headers=None, read_timeout=None):
+        """
+        Sendet einen Request an den Container
+
+        Args:
+            method: 'GET' oder 'POST'
+            endpoint: Pfad, z.B. '/media-to-mp3'
+            json: JSON-Body (optional)
+            headers: Zusätzliche Header (optional)
+            read_timeout: Überschreibt den Read-Timeout des Endpunkts
+
+        Returns:
+            requests.Response (Exceptions von requests werden durchgereicht)
+        """
+        url = f"{self.base_url}{endpoint}"
+        timeout = self.timeout_for(endpoint, read_timeout)
+
+        with self._stats_lock:
+            self._in_flight += 1
+
+        start = time.time()
+        failed = False
+        try:
+            return self._session.request(method, url, json=json, headers=headers, timeout=timeout)
+        except requests.exceptions.RequestException:
+            failed = True
+            raise
+        finally:
+            elapsed = time.time() - start
+            with self._stats_lock:
+                self._in_flight -= 1
+                stats = self._endpoint_stats.setdefault(endpoint, {
+                    'requests': 0,
+                    'errors': 0,
+                    'total_seconds': 0.0
+                })
+                stats['requests'] += 1
+                stats['total_seconds'] += elapsed
+                if failed:
+                    stats['errors'] += 1
+
+    def get(self, endpoint, **kwargs):
+        return self.request('GET', endpoint, **kwargs)
+
+    def post(self, endpoint, json=None, **kwargs):
+        return self.request('POST', endpoint, json=json, **kwargs)
+
+    def stats(self):
+        """Pool- und Request-Statistiken für das Monitoring"""
+        pools = []
+        poolmanager = self._adapter.poolmanager
+        for key in list(poolmanager.pools.keys()):
+            pool = poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            pools.append({
+                'host': f"{pool.scheme}://{pool.host}:{pool.port}",
+                'connections_created': pool.num_connections,
+                'requests': pool.num_requests,
+                # Die Queue ist mit None-Platzhaltern vorbelegt
+                'idle_connections': sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0
+            })
+
+        with self._stats_lock:
+            endpoints = {
+                endpoint: {
+                    'requests': s['requests'],
+                    'errors': s['errors'],
+                    'avg_seconds': round(s['total_seconds'] / s['requests'], 3) if s['requests'] else 0
+                }
+                for endpoint, s in self._endpoint_stats.items()
+            }
+            in_flight = self._in_flight
+
+        return {
+            'base_url': self.base_url,
+            'pool_size': self.pool_size,
+            'in_flight': in_flight,
+            'pools': pools,
+            'endpoints': endpoints
+        }
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_nca_client():
+    """Gibt den Client des aktuellen Prozesses zurück (Worker-Prozesse bekommen einen eigenen Pool)"""
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = NCAClient()
+            _client_pid = os.getpid()
+            logger.info(f"🔌 NCA client pool: {_client.pool_size} connections to {_client.base_url}")
+        return _client
@@ -0,0 +1,258 @@
+"""
+Screenshots - Mehrere Aufnahmen einer Webseite aus einem Seitenaufruf
+Viewports (Desktop/Tablet/Mobile oder frei), ganze Seite und einzelne Elemente (CSS-Selektor)
+werden nacheinander im selben geladenen Dokument aufgenommen. Jede Aufnahme liegt mit TTL im
+Screenshot-Cache (normalisierte URL + Viewport + Art); nur fehlende Aufnahmen öffnen den Browser.
+"""
+
+import os
+import time
+import uuid
+import base64
+import logging
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from file_handler import UPLOAD_FOLDER, BASE_DIR
+from derivation_cache import DerivationCache, make_key
+from browser_pool import get_browser_pool
+
+logger = logging.getLogger(__name__)
+
+# Konfiguration
+SCREENSHOT_MAX_HEIGHT = int(os.getenv('SCREENSHOT_MAX_HEIGHT', 16384))  # Obergrenze für Full-Page (px)
+SCREENSHOT_MAX_CAPTURES = 20
+RELAYOUT_TIMEOUT = 3  # Sekunden Netzwerk-Ruhe nach Viewport-Wechsel (nachgeladene Bilder)
+
+SCREENSHOT_CACHE_ENABLED = os.getenv('SCREENSHOT_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+SCREENSHOT_CACHE_TTL = float(os.getenv('SCREENSHOT_CACHE_TTL', 300))  # Sekunden; pro Anfrage über max_age änderbar
+SCREENSHOT_CACHE_MAX_MB = float(os.getenv('SCREENSHOT_CACHE_MAX_MB', 512))
+SCREENSHOT_CACHE_MAX_ENTRIES = int(os.getenv('SCREENSHOT_CACHE_MAX_ENTRIES', 2000))
+SCREENSHOT_CACHE_PATH = os.getenv('SCREENSHOT_CACHE_PATH', os.path.join(BASE_DIR, 'screenshot_cache.json'))
+
+VIEWPORT_PRESETS = {
+    'desktop': {'width': 1920, 'height': 1080, 'device_scale_factor': 1, 'mobile': False},
+    'laptop': {'width': 1366, 'height': 768, 'device_scale_factor': 1, 'mobile': False},
+    'tablet': {'width': 768, 'height': 1024, 'device_scale_factor': 2, 'mobile': True},
+    'mobile': {'width': 390, 'height': 844, 'device_scale_factor': 3, 'mobile': True}
+}
+
+# Position eines Elements im Dokument (nicht im Viewport), damit der Clip auch außerhalb des Sichtbereichs passt
+ELEMENT_RECT_JS = """
+const el = document.querySelector(arguments[0]);
+if (!el) return null;
+const r = el.getBoundingClientRect();
+return {x: r.left + window.scrollX, y: r.top + window.scrollY, width: r.width, height: r.height};
+"""
+
+
+# Eigene Instanz: Screenshots verdrängen keine FFmpeg-Ergebnisse (und umgekehrt)
+screenshot_cache = DerivationCache(
+    max_bytes=SCREENSHOT_CACHE_MAX_MB * 1024 * 1024,
+    max_entries=SCREENSHOT_CACHE_MAX_ENTRIES,
+    path=SCREENSHOT_CACHE_PATH
+) if SCREENSHOT_CACHE_ENABLED else None
+
+
+def normalize_url(url):
+    """
+    Gleiche Seite → gleicher Key: Schema/Host klein, Standard-Port und Fragment weg,
+    leerer Pfad = '/', Query-Parameter sortiert
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and not (scheme == 'http' and parts.port == 80 or scheme == 'https' and parts.port == 443):
+        host = f"{host}:{parts.port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or '/', query, ''))
+
+
+def _cache_key(url, kind, viewport, selector=None):
+    params = {
+        'url': url,
+        'kind': kind,
+        'width': viewport['width'],
+        'height': viewport['height'],
+        'device_scale_factor': viewport['device_scale_factor'],
+        'mobile': viewport['mobile']
+    }
+    if selector:
+        params['selector'] = selector
+    return make_key('screenshot:v1', params)
+
+
+def normalize_viewport(viewport):
+    """'mobile' / {'width': 800, 'height': 600} / [800, 600] → vollständiges Viewport-Dict"""
+    if isinstance(viewport, str):
+        preset = VIEWPORT_PRESETS.get(viewport.lower())
+        if not preset:
+            raise ValueError(f"Unbekannter Viewport: {viewport} (bekannt: {', '.join(VIEWPORT_PRESETS)})")
+        viewport = dict(preset, name=viewport.lower())
+    if isinstance(viewport, (list, tuple)):
+        viewport = {'width': viewport[0], 'height': viewport[1]}
+    width, height = int(viewport['width']), int(viewport['height'])
+    return {
+        'name': viewport.get('name') or f"{width}x{height}",
+        'width': width,
+        'height': height,
+        'device_scale_factor': float(viewport.get('device_scale_factor') or 1),
+        'mobile': bool(viewport.get('mobile', False))
+    }
+
+
+def _save_png(data, suffix):
+    """Speichert base64-PNG aus DevTools im Upload-Ordner"""
+    stored_filename = f"screenshot_{uuid.uuid4().hex[:8]}_{suffix}.png"
+    output_path = os.path.join(UPLOAD_FOLDER, stored_filename)
+    with open(output_path, 'wb') as f:
+        f.write(base64.b64decode(data))
+    return stored_filename
+
+
+def _capture(driver, clip=None):
+    """Page.captureScreenshot - mit clip auch über den Viewport hinaus (Full-Page, Elemente)"""
+    params = {'format': 'png'}
+    if clip:
+        params['clip'] = dict(clip, scale=1)
+        params['captureBeyondViewport'] = True
+    return driver.execute_cdp_cmd('Page.captureScreenshot', params)['data']
+
+
+def _capture_info(stored_filename, kind, **extra):
+    return dict({
+        'kind': kind,
+        'stored_filename': stored_filename,
+        'url': f"http://localhost:5000/uploads/{stored_filename}",
+        'size': os.path.getsize(os.path.join(UPLOAD_FOLDER, stored_filename))
+    }, **extra)
+
+
+def capture_webpage(url, viewports=None, full_page=False, elements=None, max_age=None):
+    """
+    Lädt url einmal und nimmt alle gewünschten Screenshots auf
+
+    Args:
+        url: Webseite
+        viewports: Liste aus Presets ('desktop', 'tablet', 'mobile', 'laptop'),
+                   {'width', 'height', optional 'device_scale_factor', 'mobile'} oder [w, h]
+                   (Default: ['desktop'])
+        full_page: Zusätzlich die ganze Seite im ersten Viewport
+        elements: CSS-Selektoren, jeweils als Ausschnitt im ersten Viewport
+        max_age: Maximales Alter gecachter Aufnahmen in Sekunden (Default: SCREENSHOT_CACHE_TTL, 0 = frisch)
+
+    Returns:
+        file_info der ersten Aufnahme + 'screenshots': [{'kind', 'url', 'width', 'height', 'cached', ...}]
+    """
+    viewports = [normalize_viewport(v) for v in (viewports or ['desktop'])]
+    elements = list(elements or [])
+    if len(viewports) + len(elements) + (1 if full_page else 0) > SCREENSHOT_MAX_CAPTURES:
+        raise ValueError(f"Höchstens {SCREENSHOT_MAX_CAPTURES} Aufnahmen pro Seitenaufruf")
+    max_age = SCREENSHOT_CACHE_TTL if max_age is None else float(max_age)
+
+    # Angefragte Aufnahmen in Ausgabe-Reihenfolge: Viewports, dann Full-Page, dann Elemente
+    primary = viewports[0]
+    normalized_url = normalize_url(url)
+    specs = [{'kind': 'viewport', 'viewport': viewport} for viewport in viewports]
+    if full_page:
+        specs.append({'kind': 'full_page', 'viewport': primary})
+    specs += [{'kind': 'element', 'viewport': primary, 'selector': selector} for selector in elements]
+
+    first_by_key = {}
+    for spec in specs:
+        spec['key'] = _cache_key(normalized_url, spec['kind'], spec['viewport'], spec.get('selector'))
+        if spec['key'] in first_by_key:
+            # Doppelt angefragt (z.B. zweimal 'desktop') - nur einmal aufnehmen
+            spec['same_as'] = first_by_key[spec['key']]
+            continue
+        first_by_key[spec['key']] = spec
+        if screenshot_cache and max_age > 0:
+            stored_filename, meta = screenshot_cache.get(spec['key'], max_age=max_age, with_meta=True)
+            if stored_filename:
+                spec['result'] = _capture_info(
+                    stored_filename, spec['kind'], cached=True,
+                    age_seconds=round(time.time() - meta.pop('created_at'), 1), **meta
+                )
+
+    missing = [spec for spec in specs if 'result' not in spec and 'same_as' not in spec]
+    logger.info(
+        f"📸 Capturing {url}: {[v['name'] for v in viewports]}, full_page={full_page}, elements={elements} "
+        f"({len(specs) - len(missing)} cached)"
+    )
+    if missing:
+        _capture_missing(url, primary, missing)
+
+    captures = [spec['same_as']['result'] if 'same_as' in spec else spec['result'] for spec in specs]
+    first = captures[0]
+    return {
+        'filename': first['stored_filename'],
+        'stored_filename': first['stored_filename'],
+        'url': first['url'],
+        'type': 'png',
+        'size': first['size'],
+        'screenshots': captures,
+        'source': 'local_selenium',
+        'cached': not missing
+        # NO job_id for sync tasks!
+    }
+
+
+def _capture_missing(url, primary, specs):
+    """Ein Seitenaufruf für alle fehlenden Aufnahmen; Ergebnisse landen in spec['result'] und im Cache"""
+    start = time.time()
+    viewport_specs = [spec for spec in specs if spec['kind'] == 'viewport']
+    page_specs = [spec for spec in specs if spec['kind'] != 'viewport']
+
+    # Zuerst die anderen Viewports, zuletzt der erste - dann stimmt das Layout für Full-Page/Elemente
+    ordered = [spec for spec in viewport_specs if spec['viewport'] is not primary]
+    primary_spec = next((spec for spec in viewport_specs if spec['viewport'] is primary), None)
+    if primary_spec or page_specs:
+        ordered.append(primary_spec or {'viewport': primary})
+
+    with get_browser_pool().session() as browser:
+        driver = browser.driver
+        load_seconds = None
+        for spec in ordered:
+            viewport = spec['viewport']
+            browser.set_viewport(viewport['width'], viewport['height'], viewport['device_scale_factor'], viewport['mobile'])
+            if load_seconds is None:
+                load_seconds = browser.navigate(url)
+            else:
+                # Kein neuer Seitenaufruf: nur Re-Layout und evtl. nachgeladene Bilder abwarten
+                browser.wait_until_ready(RELAYOUT_TIMEOUT)
+            if 'key' not in spec:
+                continue  # Nur Layout für Full-Page/Elemente, Viewport-Aufnahme kam aus dem Cache
+            _store(spec, _save_png(_capture(driver), viewport['name']), {
+                'name': viewport['name'], 'width': viewport['width'], 'height': viewport['height'],
+                'device_scale_factor': viewport['device_scale_factor']
+            })
+
+        for index, spec in enumerate(page_specs):
+            if spec['kind'] == 'full_page':
+                metrics = driver.execute_cdp_cmd('Page.getLayoutMetrics', {})
+                content = metrics.get('cssContentSize') or metrics['contentSize']
+                height = min(int(content['height']), SCREENSHOT_MAX_HEIGHT)
+                clip = {'x': 0, 'y': 0, 'width': int(content['width']), 'height': height}
+                _store(spec, _save_png(_capture(driver, clip), 'full'), {
+                    'width': clip['width'], 'height': height,
+                    'truncated': int(content['height']) > SCREENSHOT_MAX_HEIGHT
+                })
+                continue
+
+            selector = spec['selector']
+            rect = driver.execute_script(ELEMENT_RECT_JS, selector)
+            if not rect or rect['width'] < 1 or rect['height'] < 1:
+                spec['result'] = {'kind': 'element', 'selector': selector, 'error': 'Element nicht gefunden oder unsichtbar'}
+                continue
+            _store(spec, _save_png(_capture(driver, rect), f"element{index}"), {
+                'selector': selector, 'width': round(rect['width']), 'height': round(rect['height'])
+            })
+
+    logger.info(f"✅ {len(specs)} screenshots from one page load (ready after {load_seconds}s)")
+    seconds = (time.time() - start) / max(1, len(specs))
+    for spec in specs:
+        if screenshot_cache and 'stored_filename' in spec['result']:
+            meta = {k: v for k, v in spec['result'].items() if k not in ('kind', 'stored_filename', 'url', 'size', 'cached')}
+            screenshot_cache.put(spec['key'], spec['result']['stored_filename'], 'screenshot:v1', seconds, meta)
+
+
+def _store(spec, stored_filename, meta):
+    spec['result'] = _capture_info(stored_filename, spec['kind'], cached=False, **meta)
@@ -8,7 +8,9 @@ print("Testing message:", msg)
 result = extract_intent_and_params(msg, files)
 print(json.dumps(result, indent=2))
 
-if result['endpoint'] == '/combine-videos' and len(result['params']['media_urls']) == 3:
+# Wiederholung kommt als repeat (eine Datei, lokal geloopt) statt als dreifache URL-Liste
+plays = len(result['params']['media_urls']) * result['params'].get('repeat', 1)
+if result['endpoint'] == '/combine-videos' and plays == 3:
     print("SUCCESS: Logic verified!")
 else:
     print("FAILURE: Logic failed.")
@@ -0,0 +1,341 @@
+"""
+Thumbnails - Mehrere Vorschaubilder oder ein Sprite-Sheet mit wenigen FFmpeg-Aufrufen
+Feste Zeitpunkte, gleichmäßig verteilte Frames oder Szenenwechsel; Ausgabe als einzelne JPEGs
+oder als Sprite/Contact-Sheet mit WebVTT-Index (für Scrubbing-Vorschau im Player).
+"""
+
+import os
+import re
+import math
+import time
+import uuid
+import logging
+from contextlib import nullcontext
+from file_handler import UPLOAD_FOLDER
+from derivation_cache import derivation_cache, make_key
+from ffmpeg_capabilities import ffmpeg_command
+from ffmpeg_scheduler import run_ffmpeg, PRIORITY_INTERACTIVE
+from media_probe import probe_media
+from concat_engine import work_directory, write_list_file
+
+logger = logging.getLogger(__name__)
+
+# Konfiguration
+MAX_THUMBNAILS = int(os.getenv('MAX_THUMBNAILS', 100))
+THUMBNAIL_INPUTS_PER_CALL = int(os.getenv('THUMBNAIL_INPUTS_PER_CALL', 16))  # -ss/-i-Inputs je FFmpeg-Aufruf
+THUMBNAIL_WIDTH = 320
+THUMBNAIL_HEIGHT = 180
+SCENE_THRESHOLD = 0.4
+SPRITE_MAX_COLUMNS = 10
+
+SHOWINFO_PTS_RE = re.compile(r'pts_time:\s*([0-9.]+)')
+
+
+def normalize_time_offset(time_offset):
+    """'00:00:01', '1', 1.0 → 1.0 (Sekunden), damit gleiche Zeitpunkte denselben Cache-Key haben"""
+    if isinstance(time_offset, (int, float)):
+        return float(time_offset)
+    seconds = 0.0
+    for part in str(time_offset).strip().split(':'):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def _format_vtt_time(seconds):
+    hours, rest = divmod(max(seconds, 0.0), 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{secs:06.3f}"
+
+
+def _local_url(filename):
+    return f"http://localhost:5000/uploads/{filename}"
+
+
+def _frame_info(stored_filename, offset, cached):
+    return {
+        'time': offset,
+        'stored_filename': stored_filename,
+        'url': _local_url(stored_filename),
+        'size': os.path.getsize(os.path.join(UPLOAD_FOLDER, stored_filename)),
+        'cached': cached
+    }
+
+
+def _scale_filter(width, height):
+    """Skaliert in eine feste Kachelgröße (Seitenverhältnis bleibt, Rest wird aufgefüllt)"""
+    return (
+        f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+        f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1"
+    )
+
+
+def _evenly_spaced(video_path, count):
+    """count Zeitpunkte jeweils in der Mitte gleich langer Abschnitte"""
+    info = probe_media(video_path)
+    if not info or not info.get('duration'):
+        raise Exception("Gleichmäßig verteilte Thumbnails brauchen ffprobe (Videodauer unbekannt)")
+    duration = info['duration']
+    return [round(duration * (i + 0.5) / count, 3) for i in range(count)], duration
+
+
+def _run(cmd, error_message):
+    logger.info(f"📸 Generating Thumbnails: {' '.join(cmd)}")
+    result = run_ffmpeg(cmd, priority=PRIORITY_INTERACTIVE, label='thumbnails')
+    if result.returncode != 0:
+        logger.error(f"FFmpeg Error: {result.stderr}")
+        raise Exception(f"{error_message}: {result.stderr[:200]}")
+    return result
+
+
+def _seek_inputs(video_path, offsets):
+    """Je Zeitpunkt ein Input mit schnellem Input-Seek (-ss vor -i: springt zum Keyframe statt alles zu dekodieren)"""
+    args = []
+    for offset in offsets:
+        args.extend(['-ss', f"{offset:.3f}", '-i', video_path])
+    return args
+
+
+def _extract_frames(video_path, offsets, width=None, height=None):
+    """
+    Einzelne JPEGs zu festen Zeitpunkten - fehlende Frames gebündelt, je FFmpeg-Aufruf
+    höchstens THUMBNAIL_INPUTS_PER_CALL Inputs (jeder Input öffnet Datei und Decoder)
+
+    Jeder Frame ist einzeln im Derivation Cache, damit sich Anfragen mit
+    überlappenden Zeitpunkten die Ergebnisse teilen.
+    """
+    params_for = lambda offset: {'time_offset': offset, 'width': width, 'height': height}
+    keys = [
+        make_key('thumbnail:v2', params_for(offset), [video_path]) if derivation_cache else None
+        for offset in offsets
+    ]
+
+    # Dieselben Locks wie derivation_cache.run(): gleiche Frames werden nie doppelt erzeugt
+    with derivation_cache.locked(*keys) if derivation_cache else nullcontext():
+        frames = []
+        missing = []
+        for offset, key in zip(offsets, keys):
+            stored_filename = derivation_cache.get(key) if derivation_cache else None
+            cached = stored_filename is not None
+            if not cached:
+                stored_filename = (
+                    derivation_cache.output_filename('thumbnail:v2', key, 'jpg') if derivation_cache
+                    else f"{uuid.uuid4()}_thumbnail.jpg"
+                )
+                missing.append((len(frames), key, stored_filename))
+            frames.append({'time': offset, 'stored_filename': stored_filename, 'cached': cached})
+
+        for start in range(0, len(missing), THUMBNAIL_INPUTS_PER_CALL):
+            batch = missing[start:start + THUMBNAIL_INPUTS_PER_CALL]
+            cmd = ffmpeg_command('-y', *_seek_inputs(video_path, [frames[i]['time'] for i, _, _ in batch]))
+            for input_index, (_, _, stored_filename) in enumerate(batch):
+                cmd += ['-map', f'{input_index}:v:0', '-frames:v', '1']
+                if width and height:
+                    cmd += ['-vf', _scale_filter(width, height)]
+                cmd.append(os.path.join(UPLOAD_FOLDER, stored_filename))
+            _run(cmd, "Thumbnail generation failed")
+
+            for _, key, stored_filename in batch:
+                if derivation_cache:
+                    derivation_cache.put(key, stored_filename, 'thumbnail:v2')
+
+    for frame in frames:
+        frame['url'] = _local_url(frame['stored_filename'])
+        frame['size'] = os.path.getsize(os.path.join(UPLOAD_FOLDER, frame['stored_filename']))
+    return frames
+
+
+def _extract_scene_frames(video_path, count, threshold, width=None, height=None):
+    """
+    Szenenwechsel-Frames (plus erster Frame) in einem Dekodier-Durchlauf; Zeitpunkte über showinfo
+
+    Alle Frames eines Aufrufs sind EIN Eintrag im Derivation Cache (Key wie bei den
+    Offset-Thumbnails aus Video-Inhalt und Parametern); Dateinamen und Zeitpunkte stehen in meta.
+    """
+    operation = 'thumbnail_scene:v1'
+    params = {'count': count, 'threshold': threshold, 'width': width, 'height': height}
+    key = make_key(operation, params, [video_path]) if derivation_cache else None
+
+    with derivation_cache.locked(key) if derivation_cache else nullcontext():
+        if derivation_cache:
+            stored_filename, meta = derivation_cache.get(key, with_meta=True)
+            cached_frames = (meta or {}).get('frames') or []
+            if stored_filename and all(os.path.isfile(os.path.join(UPLOAD_FOLDER, name)) for _, name in cached_frames):
+                return [_frame_info(name, offset, cached=True) for offset, name in cached_frames]
+            prefix = derivation_cache.output_filename(operation, key, 'jpg').rsplit('.', 1)[0]
+        else:
+            prefix = f"scene_{uuid.uuid4().hex[:8]}"
+
+        pattern = os.path.join(UPLOAD_FOLDER, f"{prefix}_%03d.jpg")
+        vf = f"select='eq(n\\,0)+gt(scene\\,{threshold})',showinfo"
+        if width and height:
+            vf += ',' + _scale_filter(width, height)
+
+        start = time.time()
+        cmd = ffmpeg_command('-y', '-i', video_path, '-vf', vf, '-vsync', 'vfr', '-frames:v', str(count), pattern)
+        result = _run(cmd, "Scene thumbnail generation failed")
+
+        times = [round(float(t), 3) for t in SHOWINFO_PTS_RE.findall(result.stderr)]
+        frames = []
+        for index in range(count):
+            stored_filename = f"{prefix}_{index + 1:03d}.jpg"
+            if not os.path.isfile(os.path.join(UPLOAD_FOLDER, stored_filename)):
+                break
+            frames.append(_frame_info(stored_filename, times[index] if index < len(times) else None, cached=False))
+
+        if derivation_cache and frames:
+            derivation_cache.put(
+                key, frames[0]['stored_filename'], operation, time.time() - start,
+                meta={'frames': [[frame['time'], frame['stored_filename']] for frame in frames]}
+            )
+    return frames
+
+
+def _build_sprite(video_path, offsets, mode, count, threshold, width, height, columns, duration):
+    """Sprite-Sheet + WebVTT; beide zusammen im Derivation Cache"""
+    rows = math.ceil(count / columns)
+    params = {
+        'mode': mode, 'offsets': offsets, 'count': count, 'threshold': threshold,
+        'width': width, 'height': height, 'columns': columns
+    }
+    times = {}
+
+    def produce(output_path):
+        tile = f"tile={columns}x{rows}"
+        if mode == 'scene':
+            vf = f"select='eq(n\\,0)+gt(scene\\,{threshold})',showinfo,{_scale_filter(width, height)},{tile}"
+            cmd = ffmpeg_command('-y', '-i', video_path, '-vf', vf, '-frames:v', '1', output_path)
+            result = _run(cmd, "Sprite generation failed")
+            times['list'] = [round(float(t), 3) for t in SHOWINFO_PTS_RE.findall(result.stderr)][:count]
+        else:
+            # Kacheln als (gecachte) Einzelframes in Kachelgröße, dann über den concat demuxer
+            # als EIN Input gekachelt - statt je Zeitpunkt einen -ss/-i-Input im selben Aufruf
+            tiles = _extract_frames(video_path, offsets, width, height)
+            with work_directory() as work_dir:
+                list_path = os.path.join(work_dir, 'tiles.txt')
+                write_list_file(list_path, [os.path.join(UPLOAD_FOLDER, frame['stored_filename']) for frame in tiles])
+                cmd = ffmpeg_command(
+                    '-y', '-f', 'concat', '-safe', '0', '-i', list_path,
+                    '-vf', tile, '-frames:v', '1', output_path
+                )
+                _run(cmd, "Sprite generation failed")
+            times['list'] = list(offsets)
+
+        # WebVTT neben dem Sprite: jede Kachel gilt bis zum nächsten Zeitpunkt
+        sprite_name = os.path.basename(output_path)
+        cue_times = times['list']
+        end = duration or (cue_times[-1] + 1 if cue_times else 0)
+        lines = ['WEBVTT', '']
+        for index, start in enumerate(cue_times):
+            stop = cue_times[index + 1] if index + 1 < len(cue_times) else max(end, start + 0.001)
+            x, y = (index % columns) * width, (index // columns) * height
+            lines += [
+                f"{_format_vtt_time(start)} --> {_format_vtt_time(stop)}",
+                f"{sprite_name}#xywh={x},{y},{width},{height}",
+                ''
+            ]
+        with open(_vtt_path(output_path), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines))
+
+    if derivation_cache:
+        sprite_filename, cached = derivation_cache.run('thumbnail_sprite:v1', params, [video_path], 'jpg', produce)
+        if cached and not os.path.isfile(_vtt_path(os.path.join(UPLOAD_FOLDER, sprite_filename))):
+            # VTT fehlt (manuell gelöscht) - Sprite neu bauen
+            produce(os.path.join(UPLOAD_FOLDER, sprite_filename))
+    else:
+        sprite_filename, cached = f"sprite_{uuid.uuid4().hex[:8]}.jpg", False
+        produce(os.path.join(UPLOAD_FOLDER, sprite_filename))
+
+    sprite_path = os.path.join(UPLOAD_FOLDER, sprite_filename)
+    vtt_filename = os.path.basename(_vtt_path(sprite_path))
+    return {
+        'filename': sprite_filename,
+        'stored_filename': sprite_filename,
+        'url': _local_url(sprite_filename),
+        'type': 'jpg',
+        'size': os.path.getsize(sprite_path),
+        'vtt_url': _local_url(vtt_filename),
+        'columns': columns,
+        'rows': rows,
+        'tile_width': width,
+        'tile_height': height,
+        'source': 'local_ffmpeg',
+        'cached': cached
+    }
+
+
+def _vtt_path(sprite_path):
+    return sprite_path.rsplit('.', 1)[0] + '.vtt'
+
+
+def create_thumbnails(video_path, offsets=None, count=None, mode=None, output='frames',
+                      width=None, height=None, columns=None, scene_threshold=SCENE_THRESHOLD):
+    """
+    Erstellt mehrere Thumbnails aus einem Video mit möglichst wenigen FFmpeg-Aufrufen
+
+    Args:
+        video_path: Lokaler Pfad der Videodatei
+        offsets: Feste Zeitpunkte (Sekunden oder 'hh:mm:ss') - Modus 'offsets'
+        count: Anzahl Frames für 'interval' (gleichmäßig verteilt) bzw. Maximum für 'scene'
+        mode: 'offsets', 'interval' oder 'scene' (Default: 'offsets' wenn offsets gesetzt, sonst 'interval')
+        output: 'frames' (einzelne JPEGs) oder 'sprite' (Sprite-Sheet + WebVTT)
+        width, height: Kachelgröße; bei 'frames' optional (sonst Originalgröße)
+        columns: Spalten im Sprite (Default: Quadratwurzel der Anzahl, max. 10)
+        scene_threshold: Schwelle für Szenenwechsel (0-1)
+
+    Returns:
+        'frames': file_info des ersten Frames + 'frames': [{'time', 'url', ...}]
+        'sprite': file_info des Sprites + 'vtt_url', 'columns', 'rows', 'tile_width', 'tile_height'
+    """
+    if not os.path.exists(video_path):
+        raise FileNotFoundError(f"Video file not found: {video_path}")
+
+    mode = mode or ('offsets' if offsets else 'interval')
+    if mode not in ('offsets', 'interval', 'scene'):
+        raise ValueError(f"Unbekannter Thumbnail-Modus: {mode}")
+    if output not in ('frames', 'sprite'):
+        raise ValueError(f"Unbekannte Thumbnail-Ausgabe: {output}")
+
+    duration = None
+    if mode == 'offsets':
+        offsets = [round(normalize_time_offset(offset), 3) for offset in (offsets or [1.0])]
+        count = len(offsets)
+    else:
+        count = int(count or 10)
+    if not 0 < count <= MAX_THUMBNAILS:
+        raise ValueError(f"Anzahl Thumbnails muss zwischen 1 und {MAX_THUMBNAILS} liegen")
+    if mode == 'interval':
+        offsets, duration = _evenly_spaced(video_path, count)
+
+    if output == 'sprite':
+        width = int(width or THUMBNAIL_WIDTH)
+        height = int(height or THUMBNAIL_HEIGHT)
+        columns = int(columns or min(SPRITE_MAX_COLUMNS, math.ceil(math.sqrt(count))))
+        if duration is None:
+            info = probe_media(video_path)
+            duration = info.get('duration') if info else None
+        return _build_sprite(
+            video_path, offsets if mode != 'scene' else None, mode, count,
+            scene_threshold if mode == 'scene' else None, width, height, columns, duration
+        )
+
+    # Ohne width: Frames in Originalgröße
+    width = int(width) if width else None
+    height = int(height or THUMBNAIL_HEIGHT) if width else None
+    if mode == 'scene':
+        frames = _extract_scene_frames(video_path, count, scene_threshold, width, height)
+    else:
+        frames = _extract_frames(video_path, offsets, width, height)
+    if not frames:
+        raise Exception("Keine Frames erzeugt")
+
+    first = frames[0]
+    return {
+        'filename': first['stored_filename'],
+        'stored_filename': first['stored_filename'],
+        'url': first['url'],
+        'type': 'jpg',
+        'size': first['size'],
+        'frames': frames,
+        'source': 'local_ffmpeg',
+        'cached': all(frame['cached'] for frame in frames)
+    }
@@ -0,0 +1,318 @@
+"""
+Upload Sessions - Fortsetzbare Chunk-Uploads für große Mediendateien
+Session anlegen → Byte-Bereiche per PUT senden → finalisieren. Die Teile landen direkt
+im Upload-Ordner (.partial/), nach einem Verbindungsabbruch geht es am letzten Offset weiter.
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from werkzeug.utils import secure_filename
+from file_handler import (
+    UPLOAD_FOLDER, MAX_FILE_SIZE, HASH_CHUNK_SIZE, SHA256_PATTERN,
+    allowed_file, get_file_size_mb, lookup_upload, commit_file
+)
+
+logger = logging.getLogger(__name__)
+
+# Konfiguration
+UPLOAD_CHUNK_MAX_SIZE = int(os.getenv('UPLOAD_CHUNK_MAX_SIZE', 64 * 1024 * 1024))  # 64MB pro PUT
+UPLOAD_SESSION_TTL_HOURS = float(os.getenv('UPLOAD_SESSION_TTL_HOURS', 24))
+
+# Im Upload-Ordner, damit finalize ein os.replace statt einer Kopie ist
+PARTIAL_FOLDER = os.path.join(UPLOAD_FOLDER, '.partial')
+
+CONTENT_RANGE_PATTERN = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class UploadSessionError(Exception):
+    """Fehler mit HTTP-Status für die Upload-API"""
+
+    def __init__(self, message, status_code=400, offset=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.offset = offset
+
+
+class UploadSession:
+    """Eine laufende Chunk-Upload-Session (Metadaten liegen als JSON neben der .part-Datei)"""
+
+    def __init__(self, session_id, filename, size, sha256=None, offset=0, created_at=None):
+        self.id = session_id
+        self.filename = filename
+        self.size = size
+        self.sha256 = sha256
+        self.offset = offset
+        self.created_at = created_at or time.time()
+        self.updated_at = time.time()
+        self.lock = threading.Lock()
+        self._digest = None  # Hash-Zustand; nach Neustart aus der .part-Datei rekonstruiert
+
+    @property
+    def part_path(self):
+        return os.path.join(PARTIAL_FOLDER, f"{self.id}.part")
+
+    @property
+    def meta_path(self):
+        return os.path.join(PARTIAL_FOLDER, f"{self.id}.json")
+
+    def to_dict(self):
+        return {
+            'upload_id': self.id,
+            'filename': self.filename,
+            'size': self.size,
+            'offset': self.offset,
+            'complete': self.offset == self.size,
+            'upload_url': f'/api/uploads/sessions/{self.id}'
+        }
+
+    def save_meta(self):
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'id': self.id,
+                'filename': self.filename,
+                'size': self.size,
+                'sha256': self.sha256,
+                'created_at': self.created_at
+            }, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def digest(self):
+        """Laufender SHA-256 über die bisher empfangenen Bytes"""
+        if self._digest is None:
+            self._digest = hashlib.sha256()
+            with open(self.part_path, 'rb') as f:
+                remaining = self.offset
+                while remaining > 0:
+                    chunk = f.read(min(HASH_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    self._digest.update(chunk)
+                    remaining -= len(chunk)
+        return self._digest
+
+    def remove_files(self):
+        for path in (self.part_path, self.meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+_sessions = {}  # upload_id -> UploadSession
+_sessions_lock = threading.Lock()
+
+
+def parse_content_range(header):
+    """'bytes 0-1048575/5242880' → (start, end, total)"""
+    match = CONTENT_RANGE_PATTERN.match((header or '').strip())
+    if not match:
+        raise UploadSessionError("Content-Range Header fehlt oder ist ungültig (bytes start-end/total)")
+    start, end, total = (int(value) for value in match.groups())
+    if end < start:
+        raise UploadSessionError("Content-Range: end < start", 416)
+    return start, end, total
+
+
+def create_session(filename, size, sha256=None):
+    """
+    Legt eine Upload-Session an (Größe und Typ werden sofort geprüft)
+
+    Ist sha256 angegeben und die Datei schon auf dem Server, wird keine Session
+    angelegt, sondern direkt die vorhandene Datei zurückgegeben.
+
+    Returns:
+        {'upload_id', 'offset', ...} oder {'complete': True, 'file': file_info}
+    """
+    if not allowed_file(filename or ''):
+        raise UploadSessionError(f"Dateityp nicht erlaubt: {filename}")
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadSessionError("size fehlt oder ist keine Zahl")
+    if size <= 0:
+        raise UploadSessionError("Leere Datei")
+    if size > MAX_FILE_SIZE:
+        raise UploadSessionError(
+            f"Datei zu groß: {get_file_size_mb(size)}MB (max: {get_file_size_mb(MAX_FILE_SIZE)}MB)", 413
+        )
+    if sha256:
+        sha256 = sha256.lower()
+        if not SHA256_PATTERN.match(sha256):
+            raise UploadSessionError("Ungültiger SHA-256 Hash")
+        existing = lookup_upload(sha256, filename)
+        if existing:
+            return {'complete': True, 'file': existing}
+
+    cleanup_stale_sessions()
+    os.makedirs(PARTIAL_FOLDER, exist_ok=True)
+
+    session = UploadSession(str(uuid.uuid4()), secure_filename(filename), size, sha256)
+    open(session.part_path, 'wb').close()
+    session.save_meta()
+    with _sessions_lock:
+        _sessions[session.id] = session
+
+    logger.info(f"📤 Upload session {session.id}: {session.filename} ({get_file_size_mb(size)}MB)")
+    return session.to_dict()
+
+
+def get_session(upload_id):
+    """Session aus dem Speicher oder (nach Neustart/anderem Worker) von der Platte"""
+    with _sessions_lock:
+        session = _sessions.get(upload_id)
+        if session:
+            return session
+
+        if not re.match(r'^[0-9a-f-]{36}$', upload_id or ''):
+            raise UploadSessionError("Upload-Session nicht gefunden", 404)
+        meta_path = os.path.join(PARTIAL_FOLDER, f"{upload_id}.json")
+        part_path = os.path.join(PARTIAL_FOLDER, f"{upload_id}.part")
+        if not (os.path.exists(meta_path) and os.path.exists(part_path)):
+            raise UploadSessionError("Upload-Session nicht gefunden", 404)
+
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        session = UploadSession(
+            meta['id'], meta['filename'], meta['size'], meta.get('sha256'),
+            offset=min(os.path.getsize(part_path), meta['size']),
+            created_at=meta.get('created_at')
+        )
+        _sessions[session.id] = session
+        return session
+
+
+def write_chunk(upload_id, content_range, stream, content_length=None):
+    """
+    Schreibt einen Byte-Bereich in die Session
+
+    Bereits empfangene Bytes am Anfang des Bereichs werden übersprungen (Wiederholung
+    nach Abbruch); eine Lücke (start > offset) wird mit 409 + aktuellem Offset abgelehnt.
+
+    Returns:
+        Session-Status mit neuem 'offset'
+    """
+    session = get_session(upload_id)
+    start, end, total = parse_content_range(content_range)
+    length = end - start + 1
+
+    if total != session.size:
+        raise UploadSessionError(f"Content-Range total ({total}) passt nicht zur Session ({session.size})", 416)
+    if end >= session.size:
+        raise UploadSessionError("Content-Range über das Dateiende hinaus", 416)
+    if length > UPLOAD_CHUNK_MAX_SIZE:
+        raise UploadSessionError(f"Chunk zu groß (max: {get_file_size_mb(UPLOAD_CHUNK_MAX_SIZE)}MB)", 413)
+    if content_length is not None and content_length != length:
+        raise UploadSessionError("Content-Length passt nicht zur Content-Range")
+
+    if not session.lock.acquire(blocking=False):
+        raise UploadSessionError("Für diese Session läuft bereits ein Upload", 409, session.offset)
+    try:
+        if start > session.offset:
+            raise UploadSessionError("Lücke im Upload - bitte ab offset fortsetzen", 409, session.offset)
+
+        skip = session.offset - start
+        digest = session.digest()
+        received = 0
+        with open(session.part_path, 'r+b') as f:
+            f.seek(session.offset)
+            while received < length:
+                chunk = stream.read(min(HASH_CHUNK_SIZE, length - received))
+                if not chunk:
+                    break
+                received += len(chunk)
+                if skip >= len(chunk):
+                    skip -= len(chunk)
+                    continue
+                chunk = chunk[skip:]
+                skip = 0
+                f.write(chunk)
+                digest.update(chunk)
+                session.offset += len(chunk)
+        session.updated_at = time.time()
+    finally:
+        session.lock.release()
+
+    if received < length:
+        # Verbindung abgebrochen - der Client setzt am gemeldeten Offset fort
+        raise UploadSessionError("Chunk unvollständig empfangen", 400, session.offset)
+
+    return session.to_dict()
+
+
+def finalize_session(upload_id):
+    """
+    Schließt die Session ab und übernimmt die Datei inhaltsadressiert in den Upload-Ordner
+
+    Returns:
+        {'complete': True, 'file': file_info, 'file_ref': {'sha256', 'filename'}}
+    """
+    session = get_session(upload_id)
+    with session.lock:
+        if session.offset != session.size:
+            raise UploadSessionError(
+                f"Upload unvollständig: {session.offset}/{session.size} Bytes", 409, session.offset
+            )
+        sha256 = session.digest().hexdigest()
+        if session.sha256 and session.sha256 != sha256:
+            session.remove_files()
+            with _sessions_lock:
+                _sessions.pop(session.id, None)
+            raise UploadSessionError("SHA-256 stimmt nicht überein - Datei verworfen", 422)
+
+        file_info = commit_file(session.part_path, session.filename, sha256, session.size)
+        if os.path.exists(session.meta_path):
+            os.remove(session.meta_path)
+        with _sessions_lock:
+            _sessions.pop(session.id, None)
+
+    logger.info(f"✅ Upload session {session.id} finalized: {file_info['stored_filename']}")
+    return {
+        'complete': True,
+        'file': file_info,
+        'file_ref': {'sha256': sha256, 'filename': session.filename}
+    }
+
+
+def abort_session(upload_id):
+    """Bricht eine Session ab und löscht die Teil-Datei"""
+    session = get_session(upload_id)
+    with session.lock:
+        session.remove_files()
+    with _sessions_lock:
+        _sessions.pop(session.id, None)
+
+
+def cleanup_stale_sessions(max_age_hours=UPLOAD_SESSION_TTL_HOURS):
+    """Löscht Sessions, deren Teil-Datei seit max_age_hours keine Daten mehr bekommen hat"""
+    if not os.path.isdir(PARTIAL_FOLDER):
+        return
+    cutoff = time.time() - max_age_hours * 3600
+    for filename in os.listdir(PARTIAL_FOLDER):
+        upload_id, ext = os.path.splitext(filename)
+        part_path = os.path.join(PARTIAL_FOLDER, f"{upload_id}.part")
+        try:
+            # .json ohne .part (abgebrochen) oder .part ohne Aktivität
+            if ext == '.part' and os.path.getmtime(part_path) >= cutoff:
+                continue
+            if ext != '.part' and os.path.exists(part_path):
+                continue
+            os.remove(os.path.join(PARTIAL_FOLDER, filename))
+            with _sessions_lock:
+                _sessions.pop(upload_id, None)
+            logger.info(f"Deleted stale upload part: {filename}")
+        except OSError:
+            pass
+
+
+def session_stats():
+    with _sessions_lock:
+        active = list(_sessions.values())
+    return {
+        'active_sessions': len(active),
+        'bytes_pending': sum(s.size - s.offset for s in active)
+    }
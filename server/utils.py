@@ -1,8 +1,47 @@
+import os
+import time
 import socket
 import logging
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
 logger = logging.getLogger(__name__)
 
+
+@contextmanager
+def file_lock(path):
+    """
+    Exklusiver Lock über die Datei <path>.lock - gilt zwischen Prozessen und Threads
+
+    Für JSON-Indizes, die mehrere Server-Prozesse gemeinsam lesen und schreiben.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(f"{path}.lock", 'a+b') as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.05)  # LK_LOCK gibt nach ~10s auf - weiter warten
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
 def get_lan_ip():
     """
     Detects the local LAN IP address of the host.
@@ -1,22 +1,82 @@
 """
 YouTube Download Service
 Downloads YouTube videos using yt-dlp
+Downloads werden nach (Video-ID, Format) gecacht (LRU, Index auf der Platte); gleichzeitige
+Anfragen für dasselbe Video teilen sich einen Download.
 """
 
 import os
+import re
+import time
 import logging
+import threading
 import uuid
 from pathlib import Path
 from utils import get_lan_ip
+from file_handler import UPLOAD_FOLDER, BASE_DIR
+from derivation_cache import DerivationCache, make_key
 
 logger = logging.getLogger(__name__)
 
-UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
+# Konfiguration
+YOUTUBE_CACHE_ENABLED = os.getenv('YOUTUBE_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+YOUTUBE_CACHE_MAX_MB = float(os.getenv('YOUTUBE_CACHE_MAX_MB', 10240))
+YOUTUBE_CACHE_MAX_ENTRIES = int(os.getenv('YOUTUBE_CACHE_MAX_ENTRIES', 500))
+YOUTUBE_CACHE_PATH = os.getenv('YOUTUBE_CACHE_PATH', os.path.join(BASE_DIR, 'youtube_cache.json'))
+YOUTUBE_DOWNLOAD_TIMEOUT = float(os.getenv('YOUTUBE_DOWNLOAD_TIMEOUT', 1800))  # Max. Wartezeit auf einen laufenden Download
+
+# watch?v=ID, youtu.be/ID, /shorts/ID, /embed/ID, /live/ID
+VIDEO_ID_PATTERN = re.compile(
+    r'(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/|v/)|youtu\.be/)([A-Za-z0-9_-]{11})'
+)
+
+# Eigene Instanz: große Videos verdrängen keine FFmpeg-Ergebnisse (und umgekehrt)
+youtube_cache = DerivationCache(
+    max_bytes=YOUTUBE_CACHE_MAX_MB * 1024 * 1024,
+    max_entries=YOUTUBE_CACHE_MAX_ENTRIES,
+    path=YOUTUBE_CACHE_PATH
+) if YOUTUBE_CACHE_ENABLED else None
+
+
+class _Download:
+    """Ein laufender Download, auf den weitere Anfragen warten (Single-Flight)"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_in_flight = {}  # cache key -> _Download
+_in_flight_lock = threading.Lock()
+_stats = {'downloads': 0, 'coalesced': 0, 'failed': 0}
+
 
 def is_youtube_url(url):
     """Check if URL is a YouTube URL"""
     return 'youtube.com' in url or 'youtu.be' in url
 
+def extract_video_id(url):
+    """Video-ID (11 Zeichen) aus allen gängigen YouTube-URL-Formen oder None"""
+    match = VIDEO_ID_PATTERN.search(url or '')
+    return match.group(1) if match else None
+
+def _build_result(path, title, duration, cached=False):
+    # Generate URL that Docker container can access
+    basename = os.path.basename(path)
+    host_ip = get_lan_ip()
+    size = os.path.getsize(path)
+    return {
+        'filename': basename,
+        'path': path,
+        'url': f"http://{host_ip}:5000/uploads/{basename}",
+        'title': title,
+        'duration': duration,
+        'size': size,
+        'size_mb': round(size / (1024 * 1024), 2),
+        'cached': cached
+    }
+
 def download_youtube_video(url, format='best'):
     """
     Download YouTube video using yt-dlp Python API
@@ -31,14 +91,75 @@ def download_youtube_video(url, format='best'):
             'path': '/path/to/video.mp4',
             'url': 'http://localhost:5000/uploads/video.mp4',
             'title': 'Video Title',
-            'duration': 123.45
+            'duration': 123.45,
+            'cached': False
         }
     """
+    video_id = extract_video_id(url)
+    if not youtube_cache or not video_id:
+        return _download(url, format, str(uuid.uuid4()))
+
+    key = make_key('youtube:v1', {'video_id': video_id, 'format': format})
+    stored_filename, meta = youtube_cache.get(key, with_meta=True)
+    if stored_filename:
+        logger.info(f"⚡ YouTube cache hit: {video_id} ({format}) → {stored_filename}")
+        return _build_result(os.path.join(UPLOAD_FOLDER, stored_filename), meta.get('title'), meta.get('duration'), cached=True)
+
+    with _in_flight_lock:
+        flight = _in_flight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _in_flight[key] = _Download()
+        else:
+            _stats['coalesced'] += 1
+
+    if not leader:
+        # Derselbe Download läuft schon - auf dessen Ergebnis warten statt erneut zu laden
+        logger.info(f"⏳ Waiting for running download of {video_id} ({format})")
+        if not flight.done.wait(YOUTUBE_DOWNLOAD_TIMEOUT):
+            raise RuntimeError(f"YouTube-Download von {video_id} dauert zu lange")
+        if flight.error:
+            raise RuntimeError(f"YouTube-Download fehlgeschlagen: {flight.error}")
+        return dict(flight.result, cached=True)
+
+    try:
+        # Ein anderer Download kann zwischen Lookup und Lock fertig geworden sein
+        stored_filename, meta = youtube_cache.get(key, with_meta=True)
+        if stored_filename:
+            flight.result = _build_result(os.path.join(UPLOAD_FOLDER, stored_filename), meta.get('title'), meta.get('duration'), cached=True)
+            return flight.result
+
+        start = time.time()
+        # Fester Name pro (ID, Format) - yt-dlp überspringt bereits vorhandene Dateien
+        format_slug = re.sub(r'[^A-Za-z0-9]+', '-', format).strip('-')[:40] or 'default'
+        result = _download(url, format, f"yt_{video_id}_{format_slug}")
+        youtube_cache.put(
+            key, result['filename'], 'youtube:v1', time.time() - start,
+            meta={'video_id': video_id, 'title': result['title'], 'duration': result['duration']}
+        )
+        flight.result = result
+        return result
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        flight.done.set()
+        with _in_flight_lock:
+            _in_flight.pop(key, None)
+
+def youtube_cache_stats():
+    """Cache- und Single-Flight-Statistiken für /api/metrics"""
+    with _in_flight_lock:
+        stats = dict(_stats, in_flight=len(_in_flight))
+    if youtube_cache:
+        stats.update(youtube_cache.stats())
+    return stats
+
+def _download(url, format, name):
+    """Lädt mit yt-dlp nach UPLOAD_FOLDER/<name>.<ext>"""
     logger.info(f"📥 Downloading YouTube video: {url}")
     
-    # Generate unique filename
-    video_id = str(uuid.uuid4())
-    output_template = os.path.join(UPLOAD_FOLDER, f"{video_id}.%(ext)s")
+    output_template = os.path.join(UPLOAD_FOLDER, f"{name}.%(ext)s")
     
     try:
         import yt_dlp
@@ -69,28 +190,21 @@ def download_youtube_video(url, format='best'):
             
             logger.info(f"✅ Downloaded: {title} ({duration}s)")
             logger.info(f"📁 Saved to: {filename}")
+            with _in_flight_lock:
+                _stats['downloads'] += 1
             
-            # Generate URL that Docker container can access
-            basename = os.path.basename(filename)
-            host_ip = get_lan_ip()
-            file_url = f"http://{host_ip}:5000/uploads/{basename}"
-            
-            return {
-                'filename': basename,
-                'path': filename,
-                'url': file_url,
-                'title': title,
-                'duration': duration,
-                'size': os.path.getsize(filename),
-                'size_mb': round(os.path.getsize(filename) / (1024 * 1024), 2)
-            }
+            return _build_result(filename, title, duration)
         
     except ImportError:
         logger.error("yt-dlp ist nicht installiert")
+        with _in_flight_lock:
+            _stats['failed'] += 1
         raise RuntimeError("yt-dlp ist nicht installiert. Bitte installieren Sie es mit: pip install yt-dlp")
     
     except Exception as e:
         logger.exception("💥 YouTube download failed")
+        with _in_flight_lock:
+            _stats['failed'] += 1
         raise RuntimeError(f"YouTube-Download fehlgeschlagen: {str(e)}")
 
 
@@ -169,17 +169,186 @@ function copyLogsToClipboard() {
 }
 
 
+// ===== Hash-Vorabprüfung: Dateien, die der Server schon hat, nicht erneut hochladen =====
+const SHA256_K = new Uint32Array([
+    0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
+    0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174,
+    0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+    0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967,
+    0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+    0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+    0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3,
+    0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2
+]);
+
+// Inkrementelles SHA-256: crypto.subtle hasht nur ganze Puffer - große Dateien würden komplett im Speicher landen
+class Sha256 {
+    constructor() {
+        this.h = new Uint32Array([0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a, 0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19]);
+        this.w = new Uint32Array(64);
+        this.block = new Uint8Array(64);
+        this.blockLength = 0;
+        this.bytes = 0;
+    }
+
+    update(data) {
+        let pos = 0;
+        this.bytes += data.length;
+        if (this.blockLength > 0) {
+            pos = Math.min(64 - this.blockLength, data.length);
+            this.block.set(data.subarray(0, pos), this.blockLength);
+            this.blockLength += pos;
+            if (this.blockLength < 64) return;
+            this.compress(this.block, 0);
+            this.blockLength = 0;
+        }
+        for (; pos + 64 <= data.length; pos += 64) this.compress(data, pos);
+        if (pos < data.length) {
+            this.block.set(data.subarray(pos));
+            this.blockLength = data.length - pos;
+        }
+    }
+
+    hex() {
+        const bytes = this.bytes;
+        const padLength = (this.blockLength < 56 ? 56 : 120) - this.blockLength;
+        const pad = new Uint8Array(padLength + 8);
+        const view = new DataView(pad.buffer);
+        pad[0] = 0x80;
+        view.setUint32(padLength, Math.floor(bytes / 0x20000000));
+        view.setUint32(padLength + 4, (bytes * 8) >>> 0);
+        this.update(pad);
+        return Array.from(this.h).map(x => x.toString(16).padStart(8, '0')).join('');
+    }
+
+    compress(data, offset) {
+        const w = this.w;
+        const h = this.h;
+        for (let i = 0; i < 16; i++) {
+            const j = offset + i * 4;
+            w[i] = (data[j] << 24) | (data[j + 1] << 16) | (data[j + 2] << 8) | data[j + 3];
+        }
+        for (let i = 16; i < 64; i++) {
+            const x = w[i - 15];
+            const y = w[i - 2];
+            const s0 = ((x >>> 7) | (x << 25)) ^ ((x >>> 18) | (x << 14)) ^ (x >>> 3);
+            const s1 = ((y >>> 17) | (y << 15)) ^ ((y >>> 19) | (y << 13)) ^ (y >>> 10);
+            w[i] = w[i - 16] + s0 + w[i - 7] + s1;
+        }
+        let [a, b, c, d, e, f, g, k] = h;
+        for (let i = 0; i < 64; i++) {
+            const S1 = ((e >>> 6) | (e << 26)) ^ ((e >>> 11) | (e << 21)) ^ ((e >>> 25) | (e << 7));
+            const t1 = (k + S1 + ((e & f) ^ (~e & g)) + SHA256_K[i] + w[i]) | 0;
+            const S0 = ((a >>> 2) | (a << 30)) ^ ((a >>> 13) | (a << 19)) ^ ((a >>> 22) | (a << 10));
+            const t2 = (S0 + ((a & b) ^ (a & c) ^ (b & c))) | 0;
+            k = g; g = f; f = e; e = (d + t1) | 0; d = c; c = b; b = a; a = (t1 + t2) | 0;
+        }
+        h[0] += a; h[1] += b; h[2] += c; h[3] += d; h[4] += e; h[5] += f; h[6] += g; h[7] += k;
+    }
+}
+
+async function sha256Hex(file) {
+    // Kleine Dateien nativ (schnell), große stückweise - nie die ganze Datei im Speicher
+    if (file.size <= CHUNKED_UPLOAD_THRESHOLD && window.crypto && crypto.subtle) {
+        const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+        return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+    }
+    const hash = new Sha256();
+    for (let offset = 0; offset < file.size; offset += UPLOAD_CHUNK_SIZE) {
+        hash.update(new Uint8Array(await file.slice(offset, offset + UPLOAD_CHUNK_SIZE).arrayBuffer()));
+    }
+    return hash.hex();
+}
+
+async function precheckUpload(file) {
+    try {
+        const sha256 = await sha256Hex(file);
+        const response = await fetch(`${CONFIG.apiUrl}/api/uploads/check`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ sha256, filename: file.name })
+        });
+        const data = await response.json();
+        return data.exists ? { sha256, filename: file.name } : null;
+    } catch (error) {
+        console.warn('Upload pre-check failed:', error);
+        return null;
+    }
+}
+
+
+// ===== Fortsetzbarer Chunk-Upload für große Dateien (/api/uploads/sessions) =====
+const CHUNKED_UPLOAD_THRESHOLD = 32 * 1024 * 1024;
+const UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024;
+const UPLOAD_CHUNK_RETRIES = 5;
+
+async function uploadInChunks(file) {
+    const createResponse = await fetch(`${CONFIG.apiUrl}/api/uploads/sessions`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ filename: file.name, size: file.size })
+    });
+    const session = await createResponse.json();
+    if (!createResponse.ok) throw new Error(session.error || `HTTP ${createResponse.status}`);
+
+    let offset = session.offset;
+    let failures = 0;
+    while (offset < file.size) {
+        const end = Math.min(offset + UPLOAD_CHUNK_SIZE, file.size) - 1;
+        try {
+            const response = await fetch(`${CONFIG.apiUrl}${session.upload_url}`, {
+                method: 'PUT',
+                headers: { 'Content-Range': `bytes ${offset}-${end}/${file.size}` },
+                body: file.slice(offset, end + 1)
+            });
+            const data = await response.json();
+            if (data.offset === undefined) throw new Error(data.error || `HTTP ${response.status}`);
+            // Der Server meldet immer den echten Stand - bei 409 dort weitermachen
+            offset = data.offset;
+            failures = 0;
+            addLogMessage(`📤 ${file.name}: ${Math.round(offset / file.size * 100)}%`, 'info');
+        } catch (error) {
+            failures++;
+            if (failures > UPLOAD_CHUNK_RETRIES) throw error;
+            addLogMessage(`⚠️ Chunk-Upload unterbrochen, neuer Versuch (${failures}/${UPLOAD_CHUNK_RETRIES})...`, 'warning');
+            await new Promise(resolve => setTimeout(resolve, 1000 * failures));
+            const status = await fetch(`${CONFIG.apiUrl}${session.upload_url}`).then(r => r.json()).catch(() => null);
+            if (status && status.offset !== undefined) offset = status.offset;
+        }
+    }
+
+    const finalizeResponse = await fetch(`${CONFIG.apiUrl}${session.upload_url}/finalize`, { method: 'POST' });
+    const result = await finalizeResponse.json();
+    if (!finalizeResponse.ok) throw new Error(result.error || `HTTP ${finalizeResponse.status}`);
+    return result.file_ref;
+}
+
+
 // ===== API Call with new /api/process endpoint =====
 async function processRequest(message, files) {
     addLogMessage(`📨 Sende Request: "${message.substring(0, 50)}..."`);
 
     const formData = new FormData();
     formData.append('message', message);
+    // Job läuft im Worker-Pool, Fortschritt kommt über /api/jobs/<job_id>
+    formData.append('async', '1');
 
-    files.forEach((file, index) => {
-        formData.append('files', file);
+    const fileRefs = [];
+    for (const [index, file] of files.entries()) {
         addLogMessage(`📎 Datei ${index + 1}: ${file.name} (${(file.size / 1024 / 1024).toFixed(2)}MB, ${file.type})`, 'info');
-    });
+        const ref = await precheckUpload(file);
+        if (ref) {
+            fileRefs.push(ref);
+            addLogMessage(`♻️ ${file.name} liegt schon auf dem Server - Upload übersprungen`, 'success');
+        } else if (file.size > CHUNKED_UPLOAD_THRESHOLD) {
+            fileRefs.push(await uploadInChunks(file));
+        } else {
+            formData.append('files', file);
+        }
+    }
+    if (fileRefs.length > 0) {
+        formData.append('file_refs', JSON.stringify(fileRefs));
+    }
 
     try {
         const startTime = Date.now();
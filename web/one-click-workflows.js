@@ -306,8 +306,9 @@ class OneClickWorkflows {
 
             // Show result
             if (result.success) {
-                if (result.job_id) {
-                    await pollJobStatus(result.job_id, result);
+                if (result.job_id && !result.result) {
+                    const finalResult = await watchJobStatus(result.job_id, result);
+                    addMessage('assistant', '✅ Anfrage erfolgreich verarbeitet!', finalResult);
                 } else {
                     addMessage('assistant', '✅ Anfrage erfolgreich verarbeitet!', result);
                 }
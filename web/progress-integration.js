@@ -1,11 +1,91 @@
 /**
- * Enhanced Progress Integration with Job Polling
+ * Enhanced Progress Integration with Job Events (SSE) and Polling Fallback
  * Integrates progress tracking into the main flow
  */
 
 let currentProgressTracker = null;
 let currentProgressContainer = null;
 
+// Apply a job update (SSE event or poll result) to the progress tracker
+function applyJobProgress(data) {
+    if (!currentProgressTracker) return;
+
+    if (data.progress) {
+        if (data.progress >= 75) {
+            currentProgressTracker.nextStep(data.message || 'Fast fertig...');
+        } else if (data.progress >= 50) {
+            currentProgressTracker.updateStep(data.message || 'Verarbeitung läuft...');
+        }
+    }
+
+    if (data.message) {
+        currentProgressTracker.updateStep(data.message);
+    }
+}
+
+function finishProgressTracker() {
+    if (!currentProgressTracker) return;
+
+    currentProgressTracker.complete();
+    // Remove tracker after delay, but UI update is immediate
+    setTimeout(() => {
+        if (currentProgressContainer && currentProgressContainer.parentNode) {
+            currentProgressContainer.remove();
+        }
+        currentProgressTracker = null;
+    }, 1000);
+}
+
+// Follow job status via Server-Sent Events, falls back to polling
+function watchJobStatus(jobId, initialData) {
+    if (!window.EventSource) {
+        return pollJobStatus(jobId, initialData);
+    }
+
+    addLogMessage(`📡 Job-Events abonniert: ${jobId}`, 'info');
+
+    return new Promise((resolve, reject) => {
+        const source = new EventSource(`${CONFIG.apiUrl}/api/jobs/${jobId}/events`);
+        let finished = false;
+
+        const handleEvent = (event) => {
+            const data = JSON.parse(event.data);
+            if (initialData && initialData.intent && !data.intent) {
+                data.intent = initialData.intent;
+            }
+
+            applyJobProgress(data);
+
+            if (data.status === 'completed') {
+                finished = true;
+                source.close();
+                addLogMessage(`✅ Job abgeschlossen!`, 'success');
+                finishProgressTracker();
+                resolve({ ...initialData, ...data });
+            } else if (data.status === 'failed') {
+                finished = true;
+                source.close();
+                const message = data.message || 'Job fehlgeschlagen';
+                addLogMessage(`❌ Job fehlgeschlagen: ${message}`, 'error');
+                if (currentProgressTracker) {
+                    currentProgressTracker.error(message);
+                }
+                reject(new Error(message));
+            }
+        };
+
+        ['snapshot', 'progress', 'status'].forEach(type => source.addEventListener(type, handleEvent));
+
+        source.onerror = () => {
+            if (finished) return;
+            // Stream nicht verfügbar (Proxy, Netzwerk) - zurück zum Polling
+            source.close();
+            addLogMessage('⚠️ Event-Stream unterbrochen, wechsle zu Polling', 'info');
+            pollJobStatus(jobId, initialData).then(resolve, reject);
+        };
+    });
+}
+
 // Poll job status until complete
 async function pollJobStatus(jobId, initialData) {
     const maxAttempts = 120; // 10 minutes max (120 * 5 seconds)
@@ -16,7 +96,9 @@ async function pollJobStatus(jobId, initialData) {
     while (attempts < maxAttempts) {
         try {
             const response = await fetch(`${CONFIG.apiUrl}/api/jobs/${jobId}`);
-            const data = await response.json();
+            const payload = await response.json();
+            const data = { ...(payload.job || payload) };
+            data.error = data.error || (data.status === 'failed' ? data.message : undefined);
 
             // Critical Fix: Merge initial intent validation into polling data
             // The polling result often lacks the 'intent' field which createDataCard needs
@@ -24,37 +106,12 @@ async function pollJobStatus(jobId, initialData) {
                 data.intent = initialData.intent;
             }
 
-            if (currentProgressTracker) {
-                // Update progress based on job status
-                if (data.progress) {
-                    const progressPercent = data.progress;
-                    if (progressPercent >= 75) {
-                        currentProgressTracker.nextStep(data.message || 'Fast fertig...');
-                    } else if (progressPercent >= 50) {
-                        currentProgressTracker.updateStep(data.message || 'Verarbeitung läuft...');
-                    }
-                }
-
-                if (data.message) {
-                    currentProgressTracker.updateStep(data.message);
-                }
-            }
+            applyJobProgress(data);
 
             if (data.status === 'completed') {
                 addLogMessage(`✅ Job abgeschlossen!`, 'success');
-
-                if (currentProgressTracker) {
-                    currentProgressTracker.complete();
-                    // Remove tracker after delay, but UI update is immediate
-                    setTimeout(() => {
-                        if (currentProgressContainer && currentProgressContainer.parentNode) {
-                            currentProgressContainer.remove();
-                        }
-                        currentProgressTracker = null;
-                    }, 1000);
-                }
-
-                return data;
+                finishProgressTracker();
+                return { ...initialData, ...data };
             }
 
             if (data.status === 'failed') {
@@ -64,7 +121,9 @@ async function pollJobStatus(jobId, initialData) {
                     currentProgressTracker.error(data.error || 'Job fehlgeschlagen');
                 }
 
-                throw new Error(data.error || 'Job failed');
+                const jobError = new Error(data.error || 'Job failed');
+                jobError.jobFailed = true;
+                throw jobError;
             }
 
             // Wait 5 seconds before next poll
@@ -74,7 +133,7 @@ async function pollJobStatus(jobId, initialData) {
         } catch (error) {
             addLogMessage(`⚠️ Polling error: ${error.message}`, 'error');
 
-            if (attempts >= 3) {
+            if (error.jobFailed || attempts >= 3) {
                 throw error;
             }
 
@@ -133,7 +192,7 @@ if (typeof window.originalHandleSendMessage === 'undefined') {
                 // Poll for job status ONLY if job_id is returned AND no result yet
                 if (result.job_id && !result.result) {
                     currentProgressTracker.nextStep('Verarbeite...');
-                    const finalResult = await pollJobStatus(result.job_id, result);
+                    const finalResult = await watchJobStatus(result.job_id, result);
 
                     // Display result in chat
                     if (finalResult && finalResult.result) {
@@ -174,5 +233,6 @@ if (typeof window.originalHandleSendMessage === 'undefined') {
     };
 }
 
-// Make pollJobStatus globally available
+// Make job tracking globally available
 window.pollJobStatus = pollJobStatus;
+window.watchJobStatus = watchJobStatus;